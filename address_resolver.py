@@ -0,0 +1,170 @@
+import bisect
+import csv
+import difflib
+import os
+import re
+from collections import Counter
+from logger import logger
+from validators import validate_queue_format
+import constants
+
+# типы улиц, которые пользователи пишут как угодно (или не пишут вовсе)
+STREET_TYPES = {
+    'вул', 'вулиця', 'ул', 'улица', 'пров', 'провулок', 'переулок', 'пер',
+    'просп', 'проспект', 'пр', 'прт', 'бульв', 'бульвар', 'бул', 'пл', 'площа',
+    'площадь', 'майдан', 'туп', 'тупик', 'узвіз', 'шосе', 'мкр', 'мікрорайон',
+}
+_APOSTROPHES = str.maketrans({"'": '', '’': '', 'ʼ': '', '`': '', 'ё': 'е'})
+_TOKEN_RE = re.compile(r'[^\W_]+(?:/[^\W_]+)?')
+_HOUSE_RE = re.compile(r'^\d+[^\W\d_]?(?:/\d+[^\W\d_]?)?$')
+
+
+def normalize_address(text: str) -> tuple[str, str]:
+    """
+    Приводит адрес к ключу поиска: (улица, дом).
+    'вул. Тараса Шевченка, 12-А' -> ('тараса шевченка', '12а').
+    """
+    text = text.lower().translate(_APOSTROPHES)
+    # '12-а', '12 а' -> '12а'
+    text = re.sub(r'(\d)\s*-?\s*([^\W\d_])\b', r'\1\2', text)
+    street_tokens = []
+    house = ''
+    for token in _TOKEN_RE.findall(text):
+        if token in STREET_TYPES:
+            continue
+        if not house and _HOUSE_RE.match(token):
+            house = token
+            continue
+        street_tokens.append(token)
+    return ' '.join(street_tokens), house
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AddressResolver:
+    """
+    Поиск очереди по адресу.
+
+    Справочник (CSV 'улица;дом;очередь') загружается в отсортированный
+    массив нормализованных ключей 'улица дом'; поиск по префиксу — bisect.
+    Для многословных улиц дополнительно индексируются хвосты названия
+    ('тараса шевченка' находится и как 'шевченка'). Если префикс не найден,
+    название улицы подбирается нечётко: по общим триграммам выбираются
+    несколько кандидатов, и только они сравниваются difflib.
+    """
+
+    def __init__(self, path: str = constants.ADDRESS_BOOK_PATH):
+        self.path = path
+        self.entries = []  # [(улица, дом, очередь)] в исходном написании
+        self.houses = []   # нормализованный номер дома каждой записи
+        self.keys = []     # отсортированные ключи 'улица дом'
+        self.ids = []      # индекс записи в entries для каждого ключа
+        self.streets = []  # нормализованные названия улиц и их хвосты
+        self.trigrams = {}  # триграмма -> номера улиц в self.streets
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            logger.info(f"Справочник адресов {self.path} не найден, поиск по адресу отключён")
+            return
+        pairs = []
+        streets = set()
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.reader(f, delimiter=';'):
+                if len(row) < 3 or not validate_queue_format(row[2].strip()):
+                    continue  # заголовок или повреждённая строка
+                street, house, queue = (value.strip() for value in row[:3])
+                norm_street, norm_house = normalize_address(f"{street} {house}")
+                if not norm_street:
+                    continue
+                entry_id = len(self.entries)
+                self.entries.append((street, house, queue))
+                self.houses.append(norm_house)
+                streets.add(norm_street)
+                words = norm_street.split()
+                for i in range(len(words)):
+                    tail = ' '.join(words[i:])
+                    streets.add(tail)
+                    pairs.append((f"{tail} {norm_house}".rstrip(), entry_id))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.ids = [entry_id for _, entry_id in pairs]
+        self.streets = sorted(streets)
+        for street_id, street in enumerate(self.streets):
+            for trigram in _trigrams(street):
+                self.trigrams.setdefault(trigram, []).append(street_id)
+        logger.info(f"✓ Справочник адресов загружен: {len(self.entries)} адресов, "
+                    f"{len(self.streets)} названий улиц")
+
+    def _prefix(self, prefix: str, limit: int) -> list[int]:
+        """Номера записей, ключ которых начинается с prefix (без повторов)."""
+        found = []
+        idx = bisect.bisect_left(self.keys, prefix)
+        while idx < len(self.keys) and self.keys[idx].startswith(prefix):
+            entry_id = self.ids[idx]
+            if entry_id not in found:
+                found.append(entry_id)
+                if len(found) >= limit:
+                    break
+            idx += 1
+        return found
+
+    def _similar_streets(self, street: str, n: int = 3) -> list[str]:
+        """
+        Нечёткий подбор улицы: кандидаты — улицы с наибольшим числом общих
+        триграмм, точное сравнение difflib только среди них.
+        """
+        shared = Counter()
+        for trigram in _trigrams(street):
+            shared.update(self.trigrams.get(trigram, ()))
+        candidates = [self.streets[street_id] for street_id, _ in
+                      shared.most_common(constants.ADDRESS_FUZZY_CANDIDATES)]
+        return difflib.get_close_matches(street, candidates, n=n,
+                                         cutoff=constants.ADDRESS_FUZZY_CUTOFF)
+
+    def _lookup(self, street: str, house: str, limit: int) -> list[int]:
+        if not house:
+            return self._prefix(street, limit)
+        # '5а' сортируется после '59', поэтому просматриваем с запасом
+        scan = limit * 10
+        found = self._prefix(f"{street} {house}", scan)
+        if not found:
+            # неполное название улицы: 'шевч 12'
+            idx = bisect.bisect_left(self.streets, street)
+            while (idx < len(self.streets) and self.streets[idx].startswith(street)
+                   and len(found) < scan):
+                found.extend(self._prefix(f"{self.streets[idx]} {house}", scan))
+                idx += 1
+        # точный дом важнее корпусов и дробей ('12' -> '12а', '12/1'),
+        # а они — других домов с тем же началом номера ('12' -> '120')
+        exact = [i for i in found if self.houses[i] == house]
+        same_building = [i for i in found if not self.houses[i][len(house):][:1].isdigit()]
+        return (exact or same_building or found)[:limit]
+
+    def resolve(self, query: str, limit: int = 5) -> list[tuple[str, str, str]]:
+        """Возвращает до limit записей (улица, дом, очередь), подходящих под запрос."""
+        street, house = normalize_address(query)
+        if not street or not self.keys:
+            return []
+        found = self._lookup(street, house, limit)
+        if not found:
+            for candidate in self._similar_streets(street):
+                found.extend(i for i in self._lookup(candidate, house, limit) if i not in found)
+                if len(found) >= limit:
+                    break
+        return [self.entries[i] for i in found[:limit]]
+
+    def resolve_queue(self, query: str) -> tuple[str | None, list[tuple[str, str, str]]]:
+        """
+        Очередь по адресу: (очередь, совпадения). Очередь None, если
+        совпадений нет или они относятся к разным очередям.
+        """
+        matches = self.resolve(query)
+        queues = {queue for _, _, queue in matches}
+        return (queues.pop() if len(queues) == 1 else None), matches
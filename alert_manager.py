@@ -1,8 +1,18 @@
 import asyncio
 import hashlib
+import json
+import time
 import requests
 from logger import logger
 from datetime import datetime
+from tracing import STAGE_FIRED, STAGE_DELIVERED
+from delivery_queue import OutboundMessage, PRIORITY_FINAL
+from outbox import CircuitBreaker, STATUS_SCHEDULED, STATUS_PENDING
+from message_templates import PARSE_MODE
+from wall_timer import FiringStats, sleep_until, MISSED_POLICY_SKIP
+import constants
+
+FINAL_PREFIX = 'FINAL:'  # id записи outbox для финального напоминания
 
 
 class AlertManager:
@@ -12,10 +22,26 @@ class AlertManager:
         self.bot_token = bot_token
         self.chat_id = chat_id
         self.api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        self.sent_hashes = set()  # Хеши отправленных сообщений
+        self.photo_url = f"https://api.telegram.org/bot{bot_token}/sendPhoto"
+        self.sent_hashes = {}  # Хеши отправленных сообщений (в порядке отправки)
         self.sent_keys = set()    # ← НОВОЕ: ключи отправленных сообщений
         self.planned_alerts = set()
         self.scheduled_tasks = {}  # alert_key -> asyncio.Task
+        self.tracer = None  # tracing.Tracer, если включена трассировка
+        self.delivery = None  # delivery_queue.DeliveryQueue, если включена очередь
+        self.outbox = None  # outbox.Outbox, если включено сохранение оповещений
+        self.builder = None  # MessageBuilder — пересборка текстов восстановленных напоминаний
+        self.breaker = CircuitBreaker()
+        self._inflight = set()  # id записей outbox, уже стоящих в очереди доставки
+        self.missed_policy = 'late'  # wall_timer.MISSED_POLICIES
+        self.firing = FiringStats()
+        self.outbox_scope = ''  # префикс id записей outbox (у вещательных каналов — чат)
+
+    def _outbox_id(self, alert_key: str, final: bool = False) -> str:
+        return f"{self.outbox_scope}{FINAL_PREFIX if final else ''}{alert_key}"
+
+    def _is_final(self, outbox_id: str) -> bool:
+        return outbox_id[len(self.outbox_scope):].startswith(FINAL_PREFIX)
 
     def _get_message_hash(self, message_text: str) -> str:
         """Генерирует хеш сообщения."""
@@ -32,6 +58,125 @@ class AlertManager:
 
         return False
 
+    def _is_skipped(self, message_text: str, force: bool, alert_key: str) -> bool:
+        """Проверка на уже отправленное сообщение (по ключу и по хешу текста)."""
+        # ← НОВОЕ: Проверка по ключу (более надежная).
+        # force — финальное напоминание, у него тот же ключ, что у объявления
+        if not force and alert_key and alert_key in self.sent_keys:
+            logger.debug(f"Сообщение {alert_key} уже отправлено. Пропускаем.")
+            return True
+
+        # Проверка на дубликаты (если не force)
+        return not force and self._is_duplicate_sent_today(message_text)
+
+    def _post(self, message_text: str, alert_key: str = None) -> str | None:
+        """HTTP-запрос sendMessage. Возвращает None при успехе или описание ошибки."""
+        if not self.breaker.allow():
+            return "Bot API временно недоступен (размыкатель)"
+        try:
+            payload = {
+                'chat_id': self.chat_id,
+                'text': message_text,
+                'disable_notification': False,
+                'parse_mode': PARSE_MODE
+            }
+            response = requests.post(self.api_url, data=payload, timeout=10)
+            if response.status_code == 400 and "can't parse entities" in response.text:
+                # текст, сохранённый до перехода на MarkdownV2, уходит без разметки
+                logger.warning(f"Разметка сообщения {alert_key} не принята, отправляю без неё")
+                del payload['parse_mode']
+                response = requests.post(self.api_url, data=payload, timeout=10)
+            response.raise_for_status()
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Ошибка отправки: {e}")
+            self.breaker.record_failure()
+            return str(e)
+
+        self.breaker.record_success()
+
+        # Добавляем в набор отправленных; самые старые хеши вытесняются
+        msg_hash = self._get_message_hash(message_text)
+        self.sent_hashes[msg_hash] = None
+        if len(self.sent_hashes) > constants.MAX_SENT_HASHES:
+            del self.sent_hashes[next(iter(self.sent_hashes))]
+
+        # ← НОВОЕ: Добавляем ключ
+        if alert_key:
+            self.sent_keys.add(alert_key)
+            if self.tracer:
+                self.tracer.mark_alert(alert_key, STAGE_DELIVERED)
+
+        logger.info("✓ Уведомление отправлено")
+        return None
+
+    def _post_photo(self, chart, caption: str, alert_key: str = None) -> str | None:
+        """
+        sendPhoto: картинка загружается один раз, дальше отправляется по file_id.
+        Возвращает None при успехе или описание ошибки.
+        """
+        if not self.breaker.allow():
+            return "Bot API временно недоступен (размыкатель)"
+        data = {'chat_id': self.chat_id, 'caption': caption, 'parse_mode': PARSE_MODE}
+        files = None
+        if chart.file_id:
+            data['photo'] = chart.file_id
+        else:
+            files = {'photo': (f"schedule_{chart.key[0]}.png", chart.png, 'image/png')}
+        try:
+            response = requests.post(self.photo_url, data=data, files=files, timeout=30)
+            response.raise_for_status()
+            if not chart.file_id:
+                # самый крупный из вариантов, которые сохранил Telegram
+                chart.file_id = response.json()['result']['photo'][-1]['file_id']
+        except (requests.exceptions.RequestException, KeyError, IndexError, ValueError) as e:
+            logger.error(f"Ошибка отправки картинки: {e}")
+            self.breaker.record_failure()
+            return str(e)
+
+        self.breaker.record_success()
+        chart.sends += 1
+        if alert_key:
+            self.sent_keys.add(alert_key)
+        logger.info("✓ Картинка графика отправлена")
+        return None
+
+    def dispatch_photo(self, chart, caption: str, priority: int, alert_key: str,
+                       deadline_ts: float = None) -> bool:
+        """
+        Ставит картинку графика в очередь доставки. В outbox не пишется:
+        после перезапуска картинка строится заново по графику.
+        """
+        if alert_key in self.sent_keys:
+            return False
+        sender = lambda text: self._post_photo(chart, text, alert_key) is None
+        if self.delivery is None:
+            return sender(caption)
+        return self.delivery.submit(OutboundMessage(
+            priority, caption, sender, deadline_ts=deadline_ts, label=alert_key))
+
+    def dispatch_chart(self, charts, queue: str, periods, caption: str, priority: int,
+                       alert_key: str, deadline_ts: float = None) -> bool:
+        """
+        Картинка графика — необязательное дополнение к обновлению: рендер в
+        пуле процессов идёт в фоновой задаче (scheduled_tasks), разбор графика
+        и планирование напоминаний его не ждут.
+        """
+        if alert_key in self.sent_keys or alert_key in self.scheduled_tasks:
+            return False
+        self._track_task(alert_key, asyncio.create_task(self._send_chart(
+            charts, queue, periods, caption, priority, alert_key, deadline_ts)))
+        return True
+
+    async def _send_chart(self, charts, queue: str, periods, caption: str, priority: int,
+                          alert_key: str, deadline_ts: float = None):
+        try:
+            chart = await charts.get(queue, periods)
+        except Exception as e:
+            logger.error(f"Не удалось построить картинку графика {queue}: {e}")
+            return
+        self.dispatch_photo(chart, caption, priority, alert_key=alert_key, deadline_ts=deadline_ts)
+
     def send_alert(self, message_text: str, force: bool = False, alert_key: str = None) -> bool:
         """
         Отправляет сообщение (с проверкой на дубликаты).
@@ -41,73 +186,290 @@ class AlertManager:
             force: Если True — отправить, несмотря на дубликаты
             alert_key: Уникальный ключ сообщения (для отслеживания)
         """
+        if self._is_skipped(message_text, force, alert_key):
+            return False
+        return self._post(message_text, alert_key) is None
+
+    def _deliver(self, outbox_id: str | None, message_text: str, force: bool,
+                 alert_key: str = None) -> bool:
+        """Отправка из очереди доставки с отметкой результата в outbox."""
+        try:
+            if self._is_skipped(message_text, force, alert_key):
+                if outbox_id:
+                    self.outbox.mark_dropped(outbox_id, 'duplicate')
+                return False
+            error = self._post(message_text, alert_key)
+            if outbox_id:
+                if error is None:
+                    self.outbox.mark_sent(outbox_id)
+                else:
+                    next_ts = self.outbox.mark_failed(outbox_id, error)
+                    logger.warning(f"Повторная отправка {alert_key} через "
+                                   f"{int(next_ts - time.time())} сек")
+            return error is None
+        finally:
+            self._inflight.discard(outbox_id)
 
-        # ← НОВОЕ: Проверка по ключу (более надежная)
-        if alert_key and alert_key in self.sent_keys:
+    def _on_drop(self, outbox_id: str | None, reason: str):
+        if outbox_id:
+            self._inflight.discard(outbox_id)
+            self.outbox.mark_dropped(outbox_id, reason)
+
+    def dispatch(self, message_text: str, priority: int, alert_key: str = None,
+                 force: bool = False, due_ts: float = None, deadline_ts: float = None,
+                 rewrite=None) -> bool:
+        """
+        Ставит сообщение в очередь доставки с приоритетом и сроком актуальности
+        (см. DeliveryQueue). Без очереди отправляет сразу через send_alert.
+        Оповещение с ключом сначала записывается в outbox — повторная
+        постановка уже отправленного оповещения ничего не делает.
+        Возвращает True, если сообщение принято к отправке.
+        """
+        if not force and alert_key and alert_key in self.sent_keys:
             logger.debug(f"Сообщение {alert_key} уже отправлено. Пропускаем.")
             return False
 
-        # Проверка на дубликаты (если не force)
-        if not force and self._is_duplicate_sent_today(message_text):
-            return False
+        outbox_id = None
+        if self.outbox is not None and alert_key:
+            outbox_id = self._outbox_id(alert_key, final=force)
+            status = self.outbox.status(outbox_id)
+            if status == STATUS_SCHEDULED:
+                self.outbox.mark_pending(outbox_id, message_text)
+            elif status == STATUS_PENDING:
+                # уже принято ранее и ждёт (повторной) отправки
+                return True
+            elif not self.outbox.add(outbox_id, alert_key, self.chat_id, message_text,
+                                     priority, due_ts=due_ts, deadline_ts=deadline_ts):
+                logger.debug(f"Сообщение {alert_key} уже отправлено (outbox). Пропускаем.")
+                return False
 
-        try:
-            payload = {
-                'chat_id': self.chat_id,
-                'text': message_text,
-                'disable_notification': False,
-                'parse_mode': 'Markdown'
-            }
-            response = requests.post(self.api_url, data=payload, timeout=10)
-            response.raise_for_status()
+        return self._submit(outbox_id, message_text, priority, alert_key, force,
+                            due_ts, deadline_ts, rewrite)
+
+    def _submit(self, outbox_id: str | None, message_text: str, priority: int,
+                alert_key: str, force: bool, due_ts: float = None,
+                deadline_ts: float = None, rewrite=None) -> bool:
+        if self.delivery is None:
+            return self._deliver(outbox_id, message_text, force, alert_key)
+        if outbox_id:
+            self._inflight.add(outbox_id)
+        return self.delivery.submit(OutboundMessage(
+            priority, message_text,
+            lambda text: self._deliver(outbox_id, text, force, alert_key),
+            due_ts=due_ts, deadline_ts=deadline_ts, rewrite=rewrite,
+            label=alert_key or '',
+            on_drop=lambda reason: self._on_drop(outbox_id, reason)))
+
+    def _final_rewrite(self, meta: dict | None):
+        """Пересборка текста финального напоминания по сохранённому периоду."""
+        if self.builder is None or not meta:
+            return None
+        if meta['type'] == 'OFF':
+            return lambda minutes: self.builder.final_off_message(
+                meta['start'], meta['end'], minutes)
+        return lambda minutes: self.builder.final_on_message(meta['end'], minutes)
 
-            # Добавляем в набор отправленных
-            msg_hash = self._get_message_hash(message_text)
-            self.sent_hashes.add(msg_hash)
+    async def run_retries(self, interval: float = constants.OUTBOX_RETRY_POLL):
+        """Фоновая задача: повторная постановка неотправленных записей outbox."""
+        while True:
+            await asyncio.sleep(interval)
+            if self.outbox is None or self.breaker.is_open:
+                continue
+            try:
+                for row in self.outbox.due_retries(time.time(), self.chat_id):
+                    outbox_id, alert_key, text, priority, due_ts, deadline_ts, meta = row
+                    if outbox_id in self._inflight:
+                        continue
+                    meta = json.loads(meta) if meta else None
+                    self._submit(outbox_id, text, priority, alert_key,
+                                 self._is_final(outbox_id), due_ts, deadline_ts,
+                                 self._final_rewrite(meta))
+            except Exception as e:
+                logger.error(f"Ошибка повторной отправки из outbox: {e}")
 
-            # ← НОВОЕ: Добавляем ключ
-            if alert_key:
+    def restore_outbox(self) -> int:
+        """
+        Восстанавливает состояние после перезапуска: ключи отправленных сегодня
+        оповещений, запланированные финальные напоминания (таймеры заводятся
+        заново) и неотправленные сообщения. Вызывать из работающего цикла
+        событий до первой обработки графиков. Возвращает число восстановленных записей.
+        """
+        if self.outbox is None:
+            return 0
+        now = time.time()
+        self.outbox.purge(now - constants.OUTBOX_KEEP_DAYS * 86400)
+        day_start = datetime.combine(datetime.now().date(), datetime.min.time()).timestamp()
+        for outbox_id, alert_key in self.outbox.sent_since(day_start, self.chat_id):
+            if not self._is_final(outbox_id):
                 self.sent_keys.add(alert_key)
 
-            logger.info("✓ Уведомление отправлено")
-            return True
+        restored = 0
+        for row in self.outbox.unfinished(self.chat_id):
+            outbox_id, alert_key, text, priority, status, due_ts, deadline_ts, meta = row
+            if deadline_ts is not None and deadline_ts <= now:
+                self.outbox.mark_dropped(outbox_id, 'expired')
+                continue
+            meta = json.loads(meta) if meta else None
+            force = self._is_final(outbox_id)
+            if status == STATUS_SCHEDULED:
+                self.planned_alerts.add(alert_key)
+                self._track_task(alert_key, asyncio.create_task(
+                    self.schedule_delayed_alert(
+                        meta['type'] if meta else 'ALERT', due_ts, text,
+                        alert_key, deadline_ts=deadline_ts, rewrite=self._final_rewrite(meta))))
+            else:
+                self._submit(outbox_id, text, priority, alert_key, force,
+                             due_ts, deadline_ts, self._final_rewrite(meta))
+            restored += 1
+        if restored:
+            logger.info(f"Восстановлено из outbox: {restored} оповещений")
+        return restored
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка отправки: {e}")
-            return False
+    def format_outbox_status(self) -> str:
+        counts = self.outbox.counts() if self.outbox else {}
+        breaker = "разомкнут" if self.breaker.is_open else "замкнут"
+        return (
+            f"Outbox: ожидают {counts.get(STATUS_SCHEDULED, 0)}, "
+            f"к отправке {counts.get(STATUS_PENDING, 0)}, "
+            f"отправлено {counts.get('sent', 0)}, отброшено {counts.get('dropped', 0)}\n"
+            f"Размыкатель Bot API: {breaker}, срабатываний {self.breaker.trips}"
+        )
 
     def clear_daily_cache(self):
         """Очищает кеш отправленных сообщений (вызывать раз в день)."""
         self.sent_hashes.clear()
         self.sent_keys.clear()
+        if self.outbox is not None:
+            self.outbox.purge(time.time() - constants.OUTBOX_KEEP_DAYS * 86400)
         logger.info("✓ Кеш отправленных сообщений очищен")
 
-    async def schedule_delayed_alert(self, alert_type: str, delay_seconds: float,
-                                     message: str, alert_key: str) -> None:
+    def schedule_final(self, alert_type: str, due_ts: float, message: str, alert_key: str,
+                       deadline_ts: float = None, period: tuple = None) -> bool:
+        """
+        Планирует финальное напоминание на due_ts (epoch). Напоминание сначала
+        записывается в outbox, поэтому переживает перезапуск; задача
+        регистрируется в scheduled_tasks сразу, до первого запуска.
+        period — (начало, конец) для пересборки текста при опоздании.
+        """
+        meta = {'type': alert_type, 'start': period[0], 'end': period[1]} if period else None
+        if self.outbox is not None and not self.outbox.add(
+                self._outbox_id(alert_key, final=True), alert_key, self.chat_id, message,
+                PRIORITY_FINAL,
+                status=STATUS_SCHEDULED, due_ts=due_ts, deadline_ts=deadline_ts, meta=meta):
+            logger.debug(f"Напоминание {alert_key} уже есть в outbox")
+            return False
+        self.planned_alerts.add(alert_key)
+        self._track_task(alert_key, asyncio.create_task(
+            self.schedule_delayed_alert(
+                alert_type, due_ts, message, alert_key,
+                deadline_ts=deadline_ts, rewrite=self._final_rewrite(meta))))
+        return True
+
+    def retime_final(self, alert_type: str, alert_key: str, due_ts: float, message: str,
+                     deadline_ts: float = None, period: tuple = None) -> bool:
+        """
+        Переносит ещё не сработавшее финальное напоминание на новый момент
+        due_ts (после /set_off, /set_on). Объявление повторно не отправляется.
+        Возвращает False, если напоминание уже сработало или не планировалось.
+        """
+        task = self.scheduled_tasks.get(alert_key)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        meta = {'type': alert_type, 'start': period[0], 'end': period[1]} if period else None
+        if self.outbox is not None:
+            self.outbox.reschedule(self._outbox_id(alert_key, final=True), due_ts, message)
+        self.planned_alerts.add(alert_key)
+        self._track_task(alert_key, asyncio.create_task(
+            self.schedule_delayed_alert(
+                alert_type, due_ts, message, alert_key,
+                deadline_ts=deadline_ts, rewrite=self._final_rewrite(meta))))
+        return True
+
+    def _track_task(self, alert_key: str, task: asyncio.Task):
+        """Регистрирует задачу напоминания; завершённая задача удаляется сама."""
+        self.scheduled_tasks[alert_key] = task
+        task.add_done_callback(
+            lambda done: self.scheduled_tasks.pop(alert_key, None)
+            if self.scheduled_tasks.get(alert_key) is done else None)
+
+    async def schedule_delayed_alert(self, alert_type: str, due_ts: float,
+                                     message: str, alert_key: str,
+                                     deadline_ts: float = None, rewrite=None) -> None:
         """
         Этот корутин должен запускаться через asyncio.create_task(...).
-        Он регистрирует себя в scheduled_tasks по alert_key, выполняет sleep и отправляет.
+        Он регистрирует себя в scheduled_tasks по alert_key, ждёт момента due_ts
+        (epoch, по настенным часам — см. wall_timer.sleep_until) и отправляет.
+        deadline_ts — момент отключения/включения: позже него напоминание не отправляется,
+        rewrite(minutes_left) — пересборка текста при опоздании.
         """
 
         # регистрируем задачу
         self.scheduled_tasks[alert_key] = asyncio.current_task()
         try:
-            logger.info(
-                f"Планирование {alert_type} '{alert_key}' через {int(delay_seconds // 60)} мин")
-            await asyncio.sleep(delay_seconds)
-            self.send_alert(message, force=True, alert_key=alert_key)
-            self.planned_alerts.discard(alert_key)
-            self.scheduled_tasks.pop(alert_key, None)
+            logger.info(f"Планирование {alert_type} '{alert_key}' через "
+                        f"{int(max(due_ts - time.time(), 0) // 60)} мин")
+            lateness = await sleep_until(due_ts, self.firing, alert_key)
+            self.firing.record(lateness)
+            if self.tracer:
+                self.tracer.mark_alert(alert_key, STAGE_FIRED)
+            if lateness > constants.MISSED_REMINDER_GRACE:
+                message, rewrite = self._handle_missed(alert_key, lateness, message,
+                                                       deadline_ts, rewrite)
+            if message is not None:
+                self.dispatch(message, PRIORITY_FINAL, alert_key=alert_key, force=True,
+                              due_ts=due_ts, deadline_ts=deadline_ts, rewrite=rewrite)
+            self._forget(alert_key)
 
         except asyncio.CancelledError:
             logger.warning(f"Задача {alert_key} отменена")
-            self.scheduled_tasks.pop(alert_key, None)
-            self.planned_alerts.discard(alert_key)
+            self._forget(alert_key)
         except Exception as e:
             logger.error(f"Ошибка в schedule_delayed_alert: {e}")
+            self._forget(alert_key)
+
+    def _forget(self, alert_key: str):
+        """
+        Снимает регистрацию завершившейся задачи напоминания — только если
+        ключ всё ещё принадлежит ей: отменённую задачу могли уже заменить
+        новой (ревизия графика, перенос напоминания).
+        """
+        current = asyncio.current_task()
+        registered = self.scheduled_tasks.get(alert_key)
+        if registered is None or registered is current:
             self.scheduled_tasks.pop(alert_key, None)
             self.planned_alerts.discard(alert_key)
 
+    def _handle_missed(self, alert_key: str, lateness: float, message: str,
+                       deadline_ts: float | None, rewrite):
+        """
+        Напоминание сработало позже срока (хост спал, часы перевели).
+        Возвращает (текст, rewrite) для отправки или (None, None) — пропустить.
+        """
+        now = time.time()
+        if self.missed_policy == MISSED_POLICY_SKIP or (
+                deadline_ts is not None and now >= deadline_ts):
+            self.firing.skipped += 1
+            logger.warning(f"Напоминание {alert_key} пропущено: опоздание {int(lateness)} с")
+            if self.outbox is not None:
+                self.outbox.mark_dropped(self._outbox_id(alert_key, final=True), 'missed')
+            return None, None
+
+        self.firing.late += 1
+        logger.warning(f"Напоминание {alert_key} отправляется с опозданием {int(lateness)} с")
+        note = self.builder.late_note(int(lateness // 60)) if self.builder else ''
+        if rewrite is not None and deadline_ts is not None:
+            base = rewrite
+
+            def rewrite(minutes: int):
+                text = base(minutes)
+                return text + note if text else text
+
+            message = rewrite(int((deadline_ts - now) // 60)) or message + note
+        else:
+            message += note
+        return message, rewrite
+
     def cancel_planned_for_date(self, date_key: str):
         """
         Отменяет все запланированные оповещения и очищает связанные sent_keys для указанной даты.
@@ -121,12 +483,29 @@ class AlertManager:
                 if task and not task.done():
                     task.cancel()
                 self.planned_alerts.discard(key)
+        if self.outbox is not None:
+            self.outbox.cancel_matching(date_key, self.chat_id)
         # очищаем sent_keys связанные с датой (позволит отправить новые сообщения после изменения)
         for k in list(self.sent_keys):
             if date_key in k:
                 self.sent_keys.discard(k)
         logger.info(f"Отмена завершена для {date_key}")
 
+    def cancel_stale_for_date(self, date_key: str, keep_keys: set):
+        """
+        Отменяет напоминания даты, не входящие в keep_keys, — например,
+        восстановленные из outbox по графику, который за время простоя сменился.
+        """
+        for key in list(self.planned_alerts):
+            if date_key in key and key not in keep_keys:
+                task = self.scheduled_tasks.pop(key, None)
+                if task and not task.done():
+                    task.cancel()
+                self.planned_alerts.discard(key)
+                if self.outbox is not None:
+                    self.outbox.cancel_key(key, self.chat_id)
+                logger.info(f"Напоминание {key} больше не соответствует графику, отменено")
+
     def cancel_all_planned(self):
         """Отменяет все запланированные оповещения и очищает ключи/таски."""
         logger.info("Отмена всех запланированных оповещений")
@@ -135,5 +514,7 @@ class AlertManager:
             if task and not task.done():
                 task.cancel()
             self.planned_alerts.discard(key)
+        if self.outbox is not None:
+            self.outbox.cancel_matching('', self.chat_id)
         self.sent_keys.clear()
         logger.info("Все запланированные оповещения отменены")
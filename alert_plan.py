@@ -0,0 +1,94 @@
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from logger import logger
+
+
+def load_timezone(name: str):
+    """
+    Возвращает ZoneInfo по имени. Если база часовых поясов недоступна
+    (Windows без пакета tzdata), возвращает текущий системный пояс.
+    """
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        logger.warning(
+            f"Часовой пояс {name} недоступен ({e}), используется системный. "
+            f"Установите пакет tzdata для корректной работы при переходе на летнее время.")
+        return datetime.now().astimezone().tzinfo
+
+
+class AlertPlan:
+    """
+    Скомпилированный план оповещений одного периода отключения.
+    Все моменты — epoch-секунды (int), посчитанные один раз в заданном поясе;
+    дальше главный цикл только сравнивает числа. Объект неизменяем.
+    """
+
+    __slots__ = ('date_key', 'period_start', 'period_end',
+                 'off_ts', 'on_ts', 'off_alert_ts', 'on_alert_ts',
+                 'off_key', 'on_key', 'off_alert_time', 'on_alert_time')
+
+    def __init__(self, date_key: str, period_start: str, period_end: str,
+                 off_ts: int, on_ts: int, off_alert_ts: int, on_alert_ts: int,
+                 off_alert_time: str, on_alert_time: str):
+        values = {
+            'date_key': date_key,
+            'period_start': period_start,
+            'period_end': period_end,
+            'off_ts': off_ts,
+            'on_ts': on_ts,
+            'off_alert_ts': off_alert_ts,
+            'on_alert_ts': on_alert_ts,
+            'off_key': f"OFF_{date_key}_{period_start}_{period_end}",
+            'on_key': f"ON_{date_key}_{period_start}_{period_end}",
+            'off_alert_time': off_alert_time,
+            'on_alert_time': on_alert_time,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AlertPlan неизменяем")
+
+    def __repr__(self) -> str:
+        return (f"AlertPlan({self.date_key} {self.period_start}-{self.period_end}, "
+                f"off={self.off_ts}, on={self.on_ts})")
+
+    def is_active(self, now_ts: float) -> bool:
+        """Идёт ли отключение в момент now_ts."""
+        return self.off_ts <= now_ts < self.on_ts
+
+
+def _epoch(day: date, hhmm: str, tz) -> int:
+    hour, minute = (int(x) for x in hhmm.split(':', 1))
+    return int(datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz).timestamp())
+
+
+def compile_plans(periods, tz, alert_minutes_before_off: int,
+                  alert_minutes_before_on: int) -> tuple[AlertPlan, ...]:
+    """
+    Компилирует периоды ScheduleParser [(начало, конец, дата), ...] в AlertPlan.
+    Конец '00:00' (или не позже начала) — полночь следующего дня.
+    """
+    plans = []
+    for period_start, period_end, schedule_date in periods:
+        day = schedule_date.date() if isinstance(schedule_date, datetime) else schedule_date
+        off_ts = _epoch(day, period_start, tz)
+        on_ts = _epoch(day, period_end, tz)
+        if on_ts <= off_ts:
+            on_ts = _epoch(day + timedelta(days=1), period_end, tz)
+
+        off_alert_ts = off_ts - alert_minutes_before_off * 60
+        on_alert_ts = on_ts - alert_minutes_before_on * 60
+        plans.append(AlertPlan(
+            date_key=day.strftime('%d.%m.%Y'),
+            period_start=period_start,
+            period_end=period_end,
+            off_ts=off_ts,
+            on_ts=on_ts,
+            off_alert_ts=off_alert_ts,
+            on_alert_ts=on_alert_ts,
+            off_alert_time=datetime.fromtimestamp(off_alert_ts, tz).strftime('%H:%M'),
+            on_alert_time=datetime.fromtimestamp(on_alert_ts, tz).strftime('%H:%M'),
+        ))
+    return tuple(plans)
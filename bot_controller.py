@@ -1,7 +1,18 @@
 import asyncio
+import html
 import requests
 import logging
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
+from validators import validate_queue_format
+from profiler import SamplingProfiler, MemoryProfiler
+from delivery_queue import OutboundMessage, PRIORITY_INFO
+from message_templates import CATALOG, escape_markdown
+
+TELEGRAM_TEXT_LIMIT = 4096
+INLINE_RESULTS_LIMIT = 10
+INLINE_CACHE_SECONDS = 60  # ответ меняется не чаще раза в минуту
 
 logger = logging.getLogger(__name__)
 
@@ -18,28 +29,63 @@ class BotController:
       /planned
       /cancel_date DD.MM.YYYY
       /reload
+      /stats [queue] [days]
+      /profile start [ms]|stop|report
+      /mem start|report|stop
+      /latency
+      /next [queue]
+      /address <адрес>
+      /set_address <адрес>
+      /map [DD.MM.YYYY|завтра]
+    Inline-запрос «@bot <очередь>» доступен всем пользователям.
     """
 
     def __init__(self, bot_token: str, admin_chat_id: str,
-                 parser, alert_manager, alert_config, last_schedule_updates: dict):
+                 parser, alert_manager, alert_config, last_schedule_updates: dict,
+                 stats=None, connection=None, tracer=None, delivery=None,
+                 transitions=None, addresses=None, grids: dict = None, charts=None,
+                 sources=None, ingestor=None, broadcaster=None,
+                 shadow=None):
         self.api_base = f"https://api.telegram.org/bot{bot_token}"
         self.admin_chat_id = int(admin_chat_id)
         self.parser = parser
         self.alert_manager = alert_manager
         self.alert_config = alert_config
         self.last_schedule_updates = last_schedule_updates
+        self.stats = stats
+        self.connection = connection
+        self.tracer = tracer
+        self.delivery = delivery
+        self.transitions = transitions
+        self.addresses = addresses  # address_resolver.AddressResolver
+        self.grids = grids  # date_key -> day_grid.DayGrid (общий с ScheduleIngestor)
+        self.charts = charts  # chart_renderer.ChartCache
+        self.sources = sources  # schedule_sources.SourceMerger
+        self.ingestor = ingestor  # ScheduleIngestor — перепланирование без опроса канала
+        self.broadcaster = broadcaster  # broadcast.Broadcaster, если включены каналы очередей
+        self.shadow = shadow  # shadow_parser.ShadowParser
+        self._replan_task = None
+        self.cpu_profiler = SamplingProfiler()
+        self.mem_profiler = MemoryProfiler()
         self.offset = None
         self.running = True
 
     def _escape_markdown(self, text: str) -> str:
         """Экранирует спецсимволы для MarkdownV2."""
-        # Экранируем спецсимволы Markdown
-        special_chars = r'_*[]()~`>#+-=|{}.!'
-        for char in special_chars:
-            text = text.replace(char, '\\' + char)
-        return text
+        return escape_markdown(text)
+
+    def _send(self, chat_id: int, text: str, parse_mode: str = None):
+        """
+        Отправляет ответ. При наличии очереди доставки ответ идёт в самой
+        низкоприоритетной полосе и не задерживает напоминания.
+        """
+        if self.delivery:
+            return self.delivery.submit(OutboundMessage(
+                PRIORITY_INFO, text, lambda t: self._send_now(chat_id, t, parse_mode),
+                label=f"reply:{chat_id}"))
+        return self._send_now(chat_id, text, parse_mode)
 
-    def _send(self, chat_id: int, text: str):
+    def _send_now(self, chat_id: int, text: str, parse_mode: str = None):
         """Отправляет сообщение без parse_mode (или с экранированием)."""
         try:
             # Вариант 1: БЕЗ parse_mode (самый безопасный)
@@ -47,6 +93,8 @@ class BotController:
                 "chat_id": chat_id,
                 "text": text
             }
+            if parse_mode:
+                payload["parse_mode"] = parse_mode
             r = requests.post(f"{self.api_base}/sendMessage",
                               data=payload, timeout=10)
             r.raise_for_status()
@@ -78,6 +126,28 @@ class BotController:
             logger.error(f"Bot send markdown error: {e}")
             return False
 
+    def _send_document(self, chat_id: int, filename: str, content: bytes, caption: str = ""):
+        """Отправляет файл (например, длинный отчёт профилирования)."""
+        try:
+            r = requests.post(f"{self.api_base}/sendDocument",
+                              data={"chat_id": chat_id, "caption": caption},
+                              files={"document": (filename, content)},
+                              timeout=30)
+            r.raise_for_status()
+            logger.debug(f"✓ Документ {filename} отправлен")
+            return True
+        except Exception as e:
+            logger.error(f"Bot send document error: {e}")
+            return False
+
+    def _send_report(self, chat_id: int, report: str, filename: str):
+        """Короткий отчёт — текстом, длинный — файлом."""
+        if len(report) <= TELEGRAM_TEXT_LIMIT:
+            self._send(chat_id, report)
+        else:
+            caption = report.split("\n", 1)[0]
+            self._send_document(chat_id, filename, report.encode('utf-8'), caption)
+
     def _is_admin(self, upd) -> bool:
         """Более надёжная проверка администратора по разным типам апдейтов."""
         try:
@@ -99,14 +169,94 @@ class BotController:
             return False
 
     def _format_status(self) -> str:
-        return (
+        status = (
             f"Статус приложения\n\n"
             f"Очередь: {self.alert_config.target_queue}\n"
             f"Оповещение до ОТКЛЮЧЕНИЯ: {self.alert_config.alert_minutes_before_off} мин\n"
             f"Оповещение до ВКЛЮЧЕНИЯ: {self.alert_config.alert_minutes_before_on} мин\n"
             f"Интервал проверки: {self.alert_config.check_interval_seconds} сек\n"
-            f"Запланировано оповещений: {len(self.alert_manager.planned_alerts)}"
+            f"Запланировано оповещений: {len(self.alert_manager.planned_alerts)}\n"
+            f"Пропущенные напоминания: {self.alert_config.missed_reminder_policy}\n"
+            + self.alert_manager.firing.format_status()
         )
+        if self.delivery:
+            status += "\n\n" + self.delivery.format_status()
+        if self.alert_manager.outbox:
+            status += "\n" + self.alert_manager.format_outbox_status()
+        if self.charts:
+            status += "\n" + self.charts.format_status()
+        status += "\n" + CATALOG.format_status()
+        if self.broadcaster:
+            status += "\n" + self.broadcaster.format_status()
+        if self.shadow:
+            status += "\n" + self.shadow.format_status()
+        if self.sources and len(self.sources.sources) > 1:
+            status += "\n\n" + self.sources.format_status()
+        if self.connection:
+            status += "\n\n" + self.connection.format_status()
+        return status
+
+    def _set_queue(self, chat_id: int, new_q: str):
+        if self.ingestor is not None:
+            # график новой очереди уже разобран — планы перестраиваются сразу
+            self._replan_task = asyncio.get_running_loop().create_task(
+                self._switch_queue(chat_id, new_q))
+            return
+        try:
+            self.parser.target_queue = new_q
+        except Exception:
+            pass
+        self.alert_config.target_queue = new_q
+        self._send(chat_id, f"Очередь установлена: {new_q}")
+
+    async def _switch_queue(self, chat_id: int, new_q: str):
+        try:
+            dates = await self.ingestor.switch_queue(new_q)
+        except Exception as e:
+            logger.error(f"Ошибка смены очереди: {e}")
+            self._send(chat_id, f"Очередь установлена: {new_q}, но перепланировать не удалось: {e}")
+            return
+        self._send(chat_id, f"Очередь установлена: {new_q}\n"
+                            f"Дат с графиком: {dates}, напоминания перепланированы")
+
+    def _set_minutes(self, chat_id: int, name: str, val: int):
+        if self.ingestor is None:
+            self._send(chat_id, f"{name} = {val} минут")
+            return
+        moved = self.ingestor.retime()
+        self._send(chat_id, f"{name} = {val} минут\nПеренесено напоминаний: {moved}")
+
+    def _handle_channels(self, chat_id: int, cmd: str, args: list):
+        if self.broadcaster is None:
+            self._send(chat_id, "Режим вещательных каналов выключен (BROADCAST_MODE=1).")
+            return
+        registry = self.broadcaster.registry
+        if cmd == '/channels':
+            self._send(chat_id, registry.format_list())
+            return
+        if not args or not validate_queue_format(args[0]):
+            self._send(chat_id, f"Ошибка: {cmd} <queue>{' <@канал>' if cmd == '/set_channel' else ''}")
+            return
+        queue = args[0]
+        if cmd == '/del_channel':
+            removed = self.broadcaster.remove_channel(queue)
+            self._send(chat_id, f"Канал очереди {queue} удалён" if removed
+                       else f"У очереди {queue} нет канала")
+            return
+        if len(args) < 2:
+            self._send(chat_id, "Ошибка: /set_channel <queue> <@канал>")
+            return
+        self._replan_task = asyncio.get_running_loop().create_task(
+            self._add_channel(chat_id, queue, args[1]))
+
+    async def _add_channel(self, chat_id: int, queue: str, chat: str):
+        try:
+            dates = await self.broadcaster.add_channel(queue, chat)
+        except Exception as e:
+            logger.error(f"Ошибка регистрации канала {chat}: {e}")
+            self._send(chat_id, f"Не удалось зарегистрировать канал: {e}")
+            return
+        self._send(chat_id, f"Канал очереди {queue}: {chat}\nОпубликовано дат с графиком: {dates}")
 
     def _format_planned(self) -> str:
         if not self.alert_manager.planned_alerts:
@@ -144,7 +294,18 @@ class BotController:
                     "/set_on <minutes> — минуты до включения\n"
                     "/planned — показать запланированные оповещения\n"
                     "/cancel_date DD.MM.YYYY — отменить планы для даты\n"
-                    "/reload — отменить все планы и очистить кеш"
+                    "/reload — отменить все планы и очистить кеш\n"
+                    "/stats [queue] [days] — статистика отключений (по умолчанию 30 дней)\n"
+                    "/profile start [ms]|stop|report — сэмплирующий CPU-профайлер\n"
+                    "/mem start|report|stop — снимки памяти (tracemalloc)\n"
+                    "/latency — задержки по этапам: пост → разбор → план → таймер → доставка\n"
+                    "/next [queue] — ближайшее отключение/включение очереди\n"
+                    "/address <адрес> — найти очередь по адресу\n"
+                    "/set_address <адрес> — установить очередь по адресу\n"
+                    "/map [DD.MM.YYYY|завтра] — карта отключений всех очередей\n"
+                    "/channels — вещательные каналы очередей\n"
+                    "/set_channel <queue> <@канал> — канал очереди\n"
+                    "/del_channel <queue> — убрать канал очереди"
                 ))
                 return
 
@@ -154,19 +315,17 @@ class BotController:
 
             if cmd == '/set_queue' and len(parts) >= 2:
                 new_q = parts[1]
-                try:
-                    self.parser.target_queue = new_q
-                except Exception:
-                    pass
-                self.alert_config.target_queue = new_q
-                self._send(chat_id, f"Очередь установлена: {new_q}")
+                if not validate_queue_format(new_q):
+                    self._send(chat_id, "Ошибка: очередь в формате 1.2 (или /set_address <адрес>)")
+                    return
+                self._set_queue(chat_id, new_q)
                 return
 
             if cmd == '/set_off' and len(parts) >= 2:
                 try:
                     val = int(parts[1])
                     self.alert_config.alert_minutes_before_off = val
-                    self._send(chat_id, f"ALERT_OFF_MINUTES = {val} минут")
+                    self._set_minutes(chat_id, "ALERT_OFF_MINUTES", val)
                 except ValueError:
                     self._send(
                         chat_id, "Ошибка: используйте целое число минут")
@@ -176,12 +335,16 @@ class BotController:
                 try:
                     val = int(parts[1])
                     self.alert_config.alert_minutes_before_on = val
-                    self._send(chat_id, f"ALERT_ON_MINUTES = {val} минут")
+                    self._set_minutes(chat_id, "ALERT_ON_MINUTES", val)
                 except ValueError:
                     self._send(
                         chat_id, "Ошибка: используйте целое число минут")
                 return
 
+            if cmd in ('/channels', '/set_channel', '/del_channel'):
+                self._handle_channels(chat_id, cmd, parts[1:])
+                return
+
             if cmd == '/planned':
                 self._send(chat_id, self._format_planned())
                 return
@@ -216,10 +379,161 @@ class BotController:
                     chat_id, "Перезагрузка: отменены все планы, кеш очищен")
                 return
 
+            if cmd == '/stats':
+                if not self.stats:
+                    self._send(chat_id, "Архив графиков не подключён")
+                    return
+                queue = self.alert_config.target_queue
+                days = 30
+                for arg in parts[1:]:
+                    if validate_queue_format(arg):
+                        queue = arg
+                    elif arg.isdigit() and int(arg) > 0:
+                        days = int(arg)
+                    else:
+                        self._send(
+                            chat_id, "Ошибка: /stats [очередь, напр. 1.2] [дней]")
+                        return
+                self._send(chat_id, self.stats.summary(queue, days))
+                return
+
+            if cmd == '/profile':
+                action = parts[1].lower() if len(parts) >= 2 else 'report'
+                if action == 'start':
+                    try:
+                        interval_ms = float(parts[2]) if len(parts) >= 3 else 5
+                    except ValueError:
+                        self._send(chat_id, "Ошибка: интервал в миллисекундах")
+                        return
+                    # команды обрабатываются в потоке event loop — его и профилируем
+                    self.cpu_profiler.start(threading.get_ident(),
+                                            max(interval_ms, 1) / 1000)
+                    self._send(chat_id, "CPU-профилирование запущено. /profile stop")
+                elif action == 'stop':
+                    self.cpu_profiler.stop()
+                    self._send_report(chat_id, self.cpu_profiler.report(), 'cpu_profile.txt')
+                elif action == 'report':
+                    self._send_report(chat_id, self.cpu_profiler.report(), 'cpu_profile.txt')
+                else:
+                    self._send(chat_id, "Использование: /profile start [ms]|stop|report")
+                return
+
+            if cmd == '/mem':
+                action = parts[1].lower() if len(parts) >= 2 else 'report'
+                if action == 'start':
+                    self.mem_profiler.start()
+                    self._send(chat_id, "Трассировка памяти запущена. /mem report")
+                elif action == 'report':
+                    self._send_report(chat_id, self.mem_profiler.report(), 'memory.txt')
+                elif action == 'stop':
+                    report = self.mem_profiler.report()
+                    self.mem_profiler.stop()
+                    self._send_report(chat_id, report, 'memory.txt')
+                else:
+                    self._send(chat_id, "Использование: /mem start|report|stop")
+                return
+
+            if cmd == '/latency':
+                if not self.tracer:
+                    self._send(chat_id, "Трассировка не подключена")
+                    return
+                self._send(chat_id, self.tracer.format_histograms())
+                return
+
+            if cmd in ('/address', '/set_address'):
+                if not self.addresses:
+                    self._send(chat_id, "Справочник адресов не загружен")
+                    return
+                query = text.split(maxsplit=1)[1] if len(parts) >= 2 else ''
+                queue, matches = self.addresses.resolve_queue(query)
+                if not matches:
+                    self._send(chat_id, "Адрес не найден. Пример: /address Шевченка 12")
+                    return
+                if cmd == '/set_address' and queue:
+                    self._set_queue(chat_id, queue)
+                    return
+                lines = [f"{street}, {house} — очередь {q}" for street, house, q in matches]
+                if cmd == '/set_address':
+                    lines.append("Уточните адрес: найдены разные очереди.")
+                self._send(chat_id, "\n".join(lines))
+                return
+
+            if cmd == '/map':
+                if self.grids is None:
+                    self._send(chat_id, "Карта отключений недоступна")
+                    return
+                day = datetime.now().date()
+                if len(parts) >= 2:
+                    if parts[1].lower() == 'завтра':
+                        day += timedelta(days=1)
+                    else:
+                        try:
+                            day = datetime.strptime(parts[1], '%d.%m.%Y').date()
+                        except ValueError:
+                            self._send(chat_id, "Ошибка: /map [DD.MM.YYYY|завтра]")
+                            return
+                grid = self.grids.get(day.strftime('%d.%m.%Y'))
+                if grid is None:
+                    self._send(chat_id, f"Нет графика на {day:%d.%m.%Y}")
+                    return
+                grid_map = grid.format_map(highlight=self.alert_config.target_queue)
+                self._send(chat_id, f"<pre>{html.escape(grid_map)}</pre>", parse_mode='HTML')
+                return
+
+            if cmd == '/next':
+                if not self.transitions:
+                    self._send(chat_id, "Индекс переключений не подключён")
+                    return
+                queue = parts[1] if len(parts) >= 2 else self.alert_config.target_queue
+                if not validate_queue_format(queue):
+                    self._send(chat_id, "Ошибка: /next [очередь, напр. 1.2]")
+                    return
+                self._send(chat_id, self.transitions.format_next(queue, time.time()))
+                return
+
             self._send(chat_id, "Неизвестная команда. /help для списка")
         except Exception as e:
             logger.exception(f"Ошибка обработки команды: {e}")
 
+    def _answer_inline(self, inline_query: dict):
+        """
+        Отвечает на inline-запрос «@bot 1.2» из индекса переключений.
+        Доступно любому пользователю: ответ содержит только публичный график.
+        """
+        if not self.transitions:
+            return
+        query = (inline_query.get('query') or '').strip()
+        if query and validate_queue_format(query):
+            queues = [query]
+        elif query:
+            queues = [q for q in self.transitions.queues() if q.startswith(query)]
+            if not queues and self.addresses:
+                # «@bot Шевченка 12» — очередь по адресу
+                queues = list(dict.fromkeys(q for _, _, q in self.addresses.resolve(query)))
+        else:
+            queues = [self.alert_config.target_queue]
+        now_ts = time.time()
+        results = []
+        for queue in queues[:INLINE_RESULTS_LIMIT]:
+            text = self.transitions.format_next(queue, now_ts)
+            results.append({
+                "type": "article",
+                "id": queue,
+                "title": f"Очередь {queue}",
+                "description": text.split("\n", 1)[0],
+                "input_message_content": {"message_text": text},
+            })
+        try:
+            r = requests.post(f"{self.api_base}/answerInlineQuery",
+                              json={"inline_query_id": inline_query['id'],
+                                    "results": results,
+                                    "cache_time": INLINE_CACHE_SECONDS,
+                                    "is_personal": False},
+                              timeout=10)
+            r.raise_for_status()
+        except Exception as e:
+            logger.error(f"Bot inline answer error: {e}")
+
     def _get_updates(self, timeout=30):
         params = {"timeout": timeout}
         if self.offset:
@@ -243,6 +557,9 @@ class BotController:
             for upd in updates:
                 try:
                     self.offset = max(self.offset or 0, upd['update_id'] + 1)
+                    if 'inline_query' in upd:
+                        self._answer_inline(upd['inline_query'])
+                        continue
                     self._handle_command(upd)
                 except Exception as e:
                     logger.exception(f"Ошибка обработки обновления: {e}")
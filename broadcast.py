@@ -0,0 +1,261 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from alert_manager import AlertManager
+from alert_plan import compile_plans
+from message_builder import MessageBuilder
+from schedule_store import schedule_fingerprint
+from schedule_ingestor import announce_plans, retime_plans
+from delivery_queue import PRIORITY_INFO
+from validators import validate_queue_format
+from logger import logger
+import constants
+
+
+class ChannelRegistry:
+    """
+    Реестр вещательных каналов: очередь -> канал Telegram (@имя или -100…).
+    Хранится в JSON, правится командами /set_channel и /del_channel.
+    """
+
+    def __init__(self, path: str = constants.BROADCAST_CHANNELS_PATH):
+        self.path = path
+        self.channels = {}  # queue -> chat id канала
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось прочитать реестр каналов {self.path}: {e}")
+            return
+        self.channels = {queue: str(chat) for queue, chat in data.items()
+                         if validate_queue_format(queue) and chat}
+        logger.info(f"✓ Реестр вещательных каналов: {len(self.channels)} очередей")
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.channels, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self) -> int:
+        return len(self.channels)
+
+    def __contains__(self, queue: str) -> bool:
+        return queue in self.channels
+
+    def channel_for(self, queue: str) -> str | None:
+        return self.channels.get(queue)
+
+    def set(self, queue: str, chat: str):
+        self.channels[queue] = str(chat)
+        self._save()
+
+    def remove(self, queue: str) -> bool:
+        if self.channels.pop(queue, None) is None:
+            return False
+        self._save()
+        return True
+
+    def format_list(self) -> str:
+        if not self.channels:
+            return "Вещательные каналы не заданы."
+        lines = ["Вещательные каналы:"]
+        for queue in sorted(self.channels, key=lambda q: tuple(int(x) for x in q.split('.'))):
+            lines.append(f"- {queue}: {self.channels[queue]}")
+        return "\n".join(lines)
+
+
+class BroadcastChannel:
+    """
+    Канал одной очереди: свой AlertManager (чат — канал), построитель текстов
+    и задача повторной отправки из outbox (записи outbox отделены чатом).
+    """
+
+    __slots__ = ('queue', 'chat', 'alert_manager', 'builder', 'retry_task', 'plans', 'fingerprints')
+
+    def __init__(self, queue: str, chat: str, alert_manager: AlertManager, builder: MessageBuilder):
+        self.queue = queue
+        self.chat = chat
+        self.alert_manager = alert_manager
+        self.builder = builder
+        self.retry_task = asyncio.create_task(alert_manager.run_retries())
+        self.plans = {}         # date_key -> tuple[AlertPlan, ...]
+        self.fingerprints = {}  # date_key -> отпечаток графика очереди
+
+    def close(self, cancel_planned: bool = True):
+        """Останавливает повторную отправку; cancel_planned — отменить и напоминания."""
+        if cancel_planned:
+            self.alert_manager.cancel_all_planned()
+        self.retry_task.cancel()
+
+
+class Broadcaster:
+    """
+    Режим вещательных каналов: оповещения каждой очереди публикуются один
+    раз в её канал, на который подписываются жители. Стоимость доставки —
+    O(очередей) вызовов Bot API независимо от числа подписчиков.
+
+    Каналы планируются по уже разобранному графику (ScheduleStore) для
+    очередей, график которых изменился. Очередь, доставка, outbox и
+    размыкатель общие с основным AlertManager; записи outbox каждого канала
+    отделены его чатом. Текст сообщения строится один раз на публикацию
+    построителем очереди, а картинка графика загружается в Telegram один
+    раз — дальше её file_id переиспользуется всеми каналами и личным чатом.
+    """
+
+    def __init__(self, registry: ChannelRegistry, bot_token: str, alert_config,
+                 primary: AlertManager, store, tz, charts=None):
+        self.registry = registry
+        self.bot_token = bot_token
+        self.alert_config = alert_config
+        self.primary = primary
+        self.store = store
+        self.tz = tz
+        self.charts = charts
+        self.channels = {}  # queue -> BroadcastChannel
+
+    def _channel(self, queue: str) -> BroadcastChannel | None:
+        chat = self.registry.channel_for(queue)
+        if chat is None:
+            return None
+        channel = self.channels.get(queue)
+        if channel is not None and channel.chat == chat:
+            return channel
+        if channel is not None:
+            channel.close()
+        manager = AlertManager(self.bot_token, chat)
+        manager.outbox_scope = f"{chat}/"
+        # трассировщик не общий: ключи напоминаний не содержат очереди и
+        # совпали бы со ссылками трасс основного чата
+        for shared in ('delivery', 'outbox', 'breaker', 'firing', 'missed_policy'):
+            setattr(manager, shared, getattr(self.primary, shared))
+        builder = MessageBuilder(queue, self.alert_config.alert_minutes_before_off,
+                                 self.alert_config.alert_minutes_before_on,
+                                 locale=self.alert_config.locale)
+        manager.builder = builder
+        channel = BroadcastChannel(queue, chat, manager, builder)
+        self.channels[queue] = channel
+        return channel
+
+    def restore(self) -> int:
+        """Восстанавливает напоминания всех каналов из outbox (после перезапуска)."""
+        return sum(self._channel(queue).alert_manager.restore_outbox()
+                   for queue in list(self.registry.channels))
+
+    async def apply(self, schedule_date, changed_queues) -> int:
+        """
+        Публикует изменившиеся графики (см. ScheduleStore.update) в каналы
+        их очередей. Возвращает число каналов, в которые что-то запланировано.
+        """
+        day = schedule_date.date() if isinstance(schedule_date, datetime) else schedule_date
+        published = 0
+        for queue in sorted(changed_queues):
+            channel = self._channel(queue)
+            if channel is not None and await self._publish(channel, day):
+                published += 1
+        return published
+
+    async def _publish(self, channel: BroadcastChannel, day) -> bool:
+        date_key = day.strftime('%d.%m.%Y')
+        periods = self.store.periods_for(channel.queue, day)
+        fingerprint = schedule_fingerprint(periods)
+        if channel.fingerprints.get(date_key) == fingerprint:
+            return False
+        manager = channel.alert_manager
+        is_revision = date_key in channel.fingerprints
+        if is_revision:
+            manager.cancel_planned_for_date(date_key)
+        channel.fingerprints[date_key] = fingerprint
+
+        plans = compile_plans(
+            periods, self.tz,
+            self.alert_config.alert_minutes_before_off,
+            self.alert_config.alert_minutes_before_on) if periods else ()
+        if not is_revision:
+            manager.cancel_stale_for_date(
+                date_key, {key for plan in plans for key in (plan.off_key, plan.on_key)})
+        if not plans:
+            channel.plans.pop(date_key, None)
+            return False
+        channel.plans[date_key] = plans
+
+        now_ts = time.time()
+        await announce_plans(manager, channel.builder, plans, now_ts)
+        if self.charts is not None and plans[-1].on_ts > now_ts:
+            manager.dispatch_chart(
+                self.charts, channel.queue, periods,
+                channel.builder.chart_caption(date_key, periods), PRIORITY_INFO,
+                alert_key=f"CHART_{date_key}_{fingerprint}", deadline_ts=plans[-1].on_ts)
+        logger.info(f"График очереди {channel.queue} на {date_key} опубликован в {channel.chat}")
+        return True
+
+    async def add_channel(self, queue: str, chat: str) -> int:
+        """Регистрирует канал очереди и сразу публикует уже известный график."""
+        self.registry.set(queue, chat)
+        channel = self._channel(queue)
+        today = datetime.now().date()
+        published = 0
+        for day in self.store.days(queue):
+            if day >= today and await self._publish(channel, day):
+                published += 1
+        return published
+
+    def remove_channel(self, queue: str) -> bool:
+        channel = self.channels.pop(queue, None)
+        if channel is not None:
+            channel.close()
+        return self.registry.remove(queue)
+
+    def retime(self) -> int:
+        """Переносит напоминания всех каналов после /set_off, /set_on."""
+        moved = 0
+        off_minutes = self.alert_config.alert_minutes_before_off
+        on_minutes = self.alert_config.alert_minutes_before_on
+        now_ts = time.time()
+        for channel in self.channels.values():
+            channel.builder.alert_off_minutes = off_minutes
+            channel.builder.alert_on_minutes = on_minutes
+            for date_key, old_plans in channel.plans.items():
+                day = datetime.strptime(date_key, '%d.%m.%Y').date()
+                plans = compile_plans(
+                    [(plan.period_start, plan.period_end, day) for plan in old_plans],
+                    self.tz, off_minutes, on_minutes)
+                channel.plans[date_key] = plans
+                moved += retime_plans(channel.alert_manager, channel.builder,
+                                      old_plans, plans, now_ts)
+        return moved
+
+    def prune(self, today=None):
+        """Суточная очистка: кеши отправленного и планы прошедших дат всех каналов."""
+        today = today or datetime.now().date()
+        for channel in self.channels.values():
+            channel.alert_manager.clear_daily_cache()
+            for date_key in list(channel.fingerprints):
+                if datetime.strptime(date_key, '%d.%m.%Y').date() < today:
+                    channel.fingerprints.pop(date_key, None)
+                    channel.plans.pop(date_key, None)
+
+    def close(self):
+        """
+        Останавливает повторную отправку всех каналов (при завершении).
+        Напоминания в outbox не отменяются — restore() заведёт их после перезапуска.
+        """
+        for channel in self.channels.values():
+            channel.close(cancel_planned=False)
+        self.channels.clear()
+
+    def format_status(self) -> str:
+        planned = sum(len(c.alert_manager.planned_alerts) for c in self.channels.values())
+        return (f"Вещательные каналы: {len(self.registry)} очередей, активных {len(self.channels)}, "
+                f"запланировано напоминаний {planned}")
+
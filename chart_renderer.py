@@ -0,0 +1,173 @@
+import asyncio
+import struct
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from schedule_archive import periods_to_mask
+from schedule_store import schedule_fingerprint
+import constants
+
+# размеры картинки (пиксели)
+CELL_WIDTH = 24
+BAR_HEIGHT = 64
+MARGIN = 20
+TITLE_HEIGHT = 40
+TICKS_HEIGHT = 28
+FONT_SCALE = 3
+
+BACKGROUND = (255, 255, 255)
+OFF_COLOR = (220, 53, 69)
+ON_COLOR = (40, 167, 69)
+GRID_COLOR = (222, 226, 230)
+TEXT_COLOR = (33, 37, 41)
+
+# растровый шрифт 3x5: только символы, которые встречаются на графике
+_GLYPHS = {
+    '0': '111101101101111', '1': '010110010010111', '2': '111001111100111',
+    '3': '111001111001111', '4': '101101111001001', '5': '111100111001111',
+    '6': '111100111101111', '7': '111001001001001', '8': '111101111101111',
+    '9': '111101111001111', '.': '000000000000010', ':': '000010000010000',
+    '-': '000000111000000', '/': '001001010100100', ' ': '000000000000000',
+}
+_FONT = {char: np.array([int(bit) for bit in bits], dtype=bool).reshape(5, 3)
+         for char, bits in _GLYPHS.items()}
+
+
+def _draw_text(image: np.ndarray, text: str, x: int, y: int, scale: int, color):
+    """Рисует text растровым шрифтом, (x, y) — левый верхний угол."""
+    for char in text:
+        glyph = np.kron(_FONT.get(char, _FONT[' ']), np.ones((scale, scale), dtype=bool))
+        h, w = glyph.shape
+        region = image[y:y + h, x:x + w]
+        region[glyph[:region.shape[0], :region.shape[1]]] = color
+        x += w + scale
+
+
+def encode_png(rgb: np.ndarray) -> bytes:
+    """Кодирует массив H x W x 3 (uint8) в PNG средствами стандартной библиотеки."""
+    height, width, _ = rgb.shape
+    # фильтр 0 (None) перед каждой строкой
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8),
+                          rgb.reshape(height, width * 3)], axis=1).tobytes()
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(raw, 9)) + chunk(b'IEND', b''))
+
+
+def render_chart(queue: str, mask: int) -> bytes:
+    """
+    Столбчатая диаграмма суток очереди: 24 ячейки, красные — света нет.
+    Выполняется в отдельном процессе (см. ChartCache), возвращает PNG.
+    """
+    hours = constants.HOURS_PER_DAY
+    width = MARGIN * 2 + CELL_WIDTH * hours
+    height = TITLE_HEIGHT + BAR_HEIGHT + TICKS_HEIGHT + MARGIN
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = BACKGROUND
+
+    off = ((mask >> np.arange(hours)) & 1).astype(bool)
+    _draw_text(image, queue, MARGIN, MARGIN // 2, FONT_SCALE + 1, TEXT_COLOR)
+    _draw_text(image, f"{int(off.sum())}/{hours}", width - MARGIN - 5 * 4 * (FONT_SCALE + 1),
+               MARGIN // 2, FONT_SCALE + 1, OFF_COLOR)
+
+    top = TITLE_HEIGHT
+    # цвет каждой ячейки — одним присваиванием по маске столбцов
+    columns = np.where(off[:, None], OFF_COLOR, ON_COLOR).astype(np.uint8)
+    bar = np.repeat(columns, CELL_WIDTH, axis=0)
+    image[top:top + BAR_HEIGHT, MARGIN:MARGIN + bar.shape[0]] = bar[None, :, :]
+    # разделители часов и подписи каждые 3 часа
+    for hour in range(hours + 1):
+        x = MARGIN + hour * CELL_WIDTH
+        image[top:top + BAR_HEIGHT, max(x - 1, 0):x + 1] = GRID_COLOR if hour % 3 else TEXT_COLOR
+        if hour % 3 == 0:
+            label = str(hour)
+            label_width = len(label) * 4 * 2 - 2
+            _draw_text(image, label, max(x - label_width // 2, 0),
+                       top + BAR_HEIGHT + 8, 2, TEXT_COLOR)
+    return encode_png(image)
+
+
+class Chart:
+    """Готовая картинка графика; file_id появляется после первой загрузки в Telegram."""
+
+    __slots__ = ('key', 'png', 'file_id', 'sends')
+
+    def __init__(self, key: tuple, png: bytes):
+        self.key = key
+        self.png = png
+        self.file_id = None
+        self.sends = 0  # успешных отправок (первая — загрузка, остальные по file_id)
+
+
+class ChartCache:
+    """
+    LRU-кеш картинок графиков по (очередь, отпечаток графика). Рендеринг
+    идёт в пуле процессов и никогда не блокирует цикл событий; одновременные
+    запросы одной картинки ждут один и тот же рендер.
+    """
+
+    def __init__(self, max_entries: int = constants.CHART_CACHE_SIZE, executor=None):
+        self.max_entries = max_entries
+        self._executor = executor
+        self._owns_executor = executor is None
+        self.charts = OrderedDict()  # (queue, fingerprint) -> Chart
+        self._pending = {}  # (queue, fingerprint) -> asyncio.Future
+        self.renders = 0
+        self.hits = 0
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=constants.CHART_WORKERS)
+        return self._executor
+
+    async def get(self, queue: str, periods) -> Chart:
+        """Картинка графика очереди; рендерится только при промахе кеша."""
+        key = (queue, schedule_fingerprint(periods))
+        chart = self.charts.get(key)
+        if chart is not None:
+            self.charts.move_to_end(key)
+            self.hits += 1
+            return chart
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            png = await asyncio.get_running_loop().run_in_executor(
+                self._pool(), render_chart, queue, periods_to_mask(periods))
+            chart = Chart(key, png)
+            self.renders += 1
+            self.charts[key] = chart
+            while len(self.charts) > self.max_entries:
+                self.charts.popitem(last=False)
+            future.set_result(chart)
+            return chart
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # ошибка уже передана ожидающим, не логировать повторно
+            raise
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        finally:
+            del self._pending[key]
+
+    def close(self):
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def format_status(self) -> str:
+        uploaded = sum(1 for chart in self.charts.values() if chart.file_id)
+        reused = sum(max(chart.sends - 1, 0) for chart in self.charts.values())
+        return (f"Картинки графиков: в кеше {len(self.charts)} (загружено {uploaded}), "
+                f"рендеров {self.renders}, попаданий {self.hits}, "
+                f"отправок по file_id {reused}")
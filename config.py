@@ -1,5 +1,8 @@
 import os
 from dataclasses import dataclass
+import constants
+from message_templates import LOCALES, DEFAULT_LOCALE
+from wall_timer import MISSED_POLICIES
 
 
 @dataclass
@@ -20,6 +23,33 @@ class AlertConfig:
     alert_minutes_before_off: int
     alert_minutes_before_on: int
     check_interval_seconds: int
+    archive_path: str = constants.ARCHIVE_PATH
+    feed_host: str = '127.0.0.1'
+    feed_port: int = 0  # 0 — HTTP-фиды отключены
+    catchup_hours: int = 48  # глубина догрузки истории при старте, 0 — выкл.
+    timezone: str = constants.DEFAULT_TIMEZONE
+    outbox_path: str = constants.OUTBOX_PATH
+    address_book_path: str = constants.ADDRESS_BOOK_PATH
+    send_charts: bool = True  # картинка графика к обновлению
+    shadow_parser: str = ''  # модуль парсера-кандидата для теневого режима
+    locale: str = DEFAULT_LOCALE  # язык оповещений: message_templates.LOCALES
+    broadcast: bool = False  # публикация оповещений в каналы очередей
+    broadcast_channels_path: str = constants.BROADCAST_CHANNELS_PATH
+    schedule_urls: tuple = ()  # веб-источники графиков (страницы/JSON) помимо канала
+    missed_reminder_policy: str = 'late'  # 'late' — отправить с пометкой, 'skip' — пропустить
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    """Логический флаг из окружения: 1/0, true/false, yes/no, on/off."""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    value = value.strip().lower()
+    if value in ('1', 'true', 'yes', 'on'):
+        return True
+    if value in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError(f"{name} должен быть 1/0 (true/false)")
 
 
 def load_config() -> tuple[TelegramConfig, AlertConfig]:
@@ -46,7 +76,28 @@ def load_config() -> tuple[TelegramConfig, AlertConfig]:
         target_queue=os.getenv('TARGET_QUEUE', '1.2'),
         alert_minutes_before_off=int(os.getenv('ALERT_OFF_MINUTES', '15')),
         alert_minutes_before_on=int(os.getenv('ALERT_ON_MINUTES', '10')),
-        check_interval_seconds=int(os.getenv('CHECK_INTERVAL_SECONDS', '300'))
+        check_interval_seconds=int(os.getenv('CHECK_INTERVAL_SECONDS', '300')),
+        archive_path=os.getenv('ARCHIVE_PATH', constants.ARCHIVE_PATH),
+        feed_host=os.getenv('FEED_HOST', '127.0.0.1'),
+        feed_port=int(os.getenv('FEED_PORT', '0')),
+        catchup_hours=int(os.getenv('CATCHUP_HOURS', '48')),
+        timezone=os.getenv('TIMEZONE', constants.DEFAULT_TIMEZONE),
+        outbox_path=os.getenv('OUTBOX_PATH', constants.OUTBOX_PATH),
+        address_book_path=os.getenv('ADDRESS_BOOK_PATH', constants.ADDRESS_BOOK_PATH),
+        send_charts=_env_flag('SEND_CHARTS', True),
+        shadow_parser=os.getenv('SHADOW_PARSER', ''),
+        locale=os.getenv('LOCALE', DEFAULT_LOCALE),
+        broadcast=_env_flag('BROADCAST_MODE', False),
+        broadcast_channels_path=os.getenv('BROADCAST_CHANNELS_PATH',
+                                          constants.BROADCAST_CHANNELS_PATH),
+        schedule_urls=tuple(url.strip() for url in os.getenv('SCHEDULE_URLS', '').split(',')
+                            if url.strip()),
+        missed_reminder_policy=os.getenv('MISSED_REMINDER_POLICY', 'late')
     )
 
+    if alert_config.locale not in LOCALES:
+        raise ValueError(f"LOCALE должен быть одним из: {', '.join(LOCALES)}")
+    if alert_config.missed_reminder_policy not in MISSED_POLICIES:
+        raise ValueError(f"MISSED_REMINDER_POLICY должен быть одним из: {', '.join(MISSED_POLICIES)}")
+
     return tg_config, alert_config
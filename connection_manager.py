@@ -0,0 +1,156 @@
+import asyncio
+import random
+import time
+from telethon.errors import UsernameInvalidError, UsernameNotOccupiedError
+from logger import logger
+import constants
+
+
+class ConnectionManager:
+    """
+    Следит за подключением к Telegram (Telethon): проверки здоровья,
+    переподключение с экспоненциальной задержкой и кеш сущности канала.
+    Пока соединения нет, остальные задачи (напоминания, бот) продолжают работать.
+    """
+
+    def __init__(self, tg_client,
+                 health_interval: int = constants.HEALTH_CHECK_INTERVAL,
+                 backoff_base: float = constants.RECONNECT_BACKOFF_BASE,
+                 backoff_max: float = constants.RECONNECT_BACKOFF_MAX):
+        self.tg_client = tg_client
+        self.health_interval = health_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.channel = None  # кешированная сущность канала
+        self.connected = False
+        self._ever_connected = False
+        self.running = True
+        self._lock = asyncio.Lock()
+
+        self.started_at = time.time()
+        self.connected_since = None
+        self.reconnects = 0
+        self.failed_attempts = 0
+        self.downtime_seconds = 0.0
+        self._down_since = time.time()
+
+    def _mark_up(self):
+        now = time.time()
+        if self._down_since is not None:
+            self.downtime_seconds += now - self._down_since
+            self._down_since = None
+        self.connected = True
+        self.connected_since = now
+
+    def mark_down(self, reason: str = ""):
+        """Отмечает соединение как потерянное (следующий запрос переподключит)."""
+        if not self.connected:
+            return
+        logger.warning(f"Соединение с Telegram потеряно{': ' + reason if reason else ''}")
+        self.connected = False
+        self.connected_since = None
+        self._down_since = time.time()
+
+    def _backoff_delay(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    async def _connect_once(self):
+        try:
+            await self.tg_client.client.disconnect()
+        except Exception:
+            pass
+        await asyncio.wait_for(self.tg_client.connect(),
+                               timeout=constants.CONNECT_TIMEOUT)
+        if self.channel is None:
+            try:
+                self.channel = await asyncio.wait_for(
+                    self.tg_client.get_channel(), timeout=constants.CONNECT_TIMEOUT)
+            except (ValueError, UsernameInvalidError, UsernameNotOccupiedError) as e:
+                # неверное имя канала — повторять бессмысленно
+                raise RuntimeError(f"Канал не найден: {e}") from e
+
+    async def ensure_connected(self):
+        """
+        Возвращает сущность канала, при необходимости переподключаясь.
+        Повторяет попытки бесконечно (с задержкой), кроме фатальных ошибок
+        (нет файла сессии, аккаунт не авторизован, канал не найден).
+        """
+        async with self._lock:
+            if self.connected and self.channel is not None:
+                return self.channel
+
+            attempt = 0
+            while self.running:
+                try:
+                    await self._connect_once()
+                    self._mark_up()
+                    if self._ever_connected:
+                        self.reconnects += 1
+                        logger.info(f"✓ Переподключено к Telegram (всего переподключений: {self.reconnects})")
+                    self._ever_connected = True
+                    return self.channel
+                except (FileNotFoundError, RuntimeError):
+                    raise
+                except Exception as e:
+                    self.failed_attempts += 1
+                    delay = self._backoff_delay(attempt)
+                    attempt += 1
+                    logger.warning(
+                        f"Не удалось подключиться к Telegram ({type(e).__name__}: {e}). "
+                        f"Повтор через {delay:.0f} сек (попытка {attempt})")
+                    await asyncio.sleep(delay)
+            return None
+
+    async def is_healthy(self) -> bool:
+        """Лёгкая проверка: клиент подключён и отвечает на запрос."""
+        client = self.tg_client.client
+        try:
+            if not client.is_connected():
+                return False
+            await asyncio.wait_for(client.get_me(), timeout=constants.CONNECT_TIMEOUT)
+            return True
+        except Exception as e:
+            logger.debug(f"Проверка соединения не прошла: {e}")
+            return False
+
+    async def run(self):
+        """Фоновая задача: периодически проверяет соединение и восстанавливает его."""
+        while self.running:
+            await asyncio.sleep(self.health_interval)
+            if not self.connected:
+                continue  # переподключение уже идёт / будет выполнено из цикла
+            if not await self.is_healthy():
+                self.mark_down("проверка здоровья не прошла")
+                await self.ensure_connected()
+
+    def stop(self):
+        self.running = False
+
+    def format_status(self) -> str:
+        now = time.time()
+        uptime = now - self.started_at
+        downtime = self.downtime_seconds + (now - self._down_since if self._down_since else 0)
+        state = "подключено" if self.connected else "нет соединения"
+        lines = [
+            f"Telegram: {state}",
+            f"Аптайм процесса: {_format_duration(uptime)}",
+            f"Время без соединения: {_format_duration(downtime)}",
+            f"Переподключений: {self.reconnects} (неудачных попыток: {self.failed_attempts})",
+        ]
+        if self.connected_since:
+            lines.append(f"Текущее соединение: {_format_duration(now - self.connected_since)}")
+        return "\n".join(lines)
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes = seconds // 60
+    if days:
+        return f"{days} д {hours} ч {minutes} мин"
+    if hours:
+        return f"{hours} ч {minutes} мин"
+    return f"{minutes} мин"
@@ -1,11 +1,13 @@
 # Форматы времени
 TIME_FORMAT = "%H:%M:%S"
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_TIMEZONE = 'Europe/Kyiv'  # пояс, в котором публикуются графики
 
 # Регулярные выражения
 QUEUE_PATTERN_FORMAT = r'^\s*(?:Черга\s*)?' + \
     '{}' + r'\s*[:]\s*(.*?)(?=\n\s*(?:Черга|\Z))'
 TIME_PAIRS_PATTERN = r'(\d{2})-(\d{2})'
+QUEUE_ID_PATTERN = r'(\d+\.\d+)'
 
 # Сообщения об ошибках
 ERROR_ENV_VARS_MISSING = "Ошибка: Не установлены все необходимые переменные окружения (TG_API_ID, TG_API_HASH, TG_BOT_TOKEN, TG_CHAT_ID)."
@@ -14,4 +16,59 @@ ERROR_SCHEDULE_PARSE = "Ошибка при парсинге расписани
 
 # Ограничения
 MAX_HISTORY_LIMIT = 10
+HTTP_SOURCE_TIMEOUT = 15  # секунды на запрос к веб-источнику графиков
+HTTP_SOURCE_USER_AGENT = 'shutdown-schedule-bot/1.0'
+CATCHUP_MISSED_POLLS = 3  # пропущено опросов подряд -> догрузка истории
+CATCHUP_TIMEOUT = 300  # секунды на одну догрузку истории
+
+# Соединение с Telegram
+CONNECT_TIMEOUT = 30  # секунды на подключение / получение канала
+HEALTH_CHECK_INTERVAL = 60  # секунды между проверками соединения
+RECONNECT_BACKOFF_BASE = 5  # секунды, первая задержка переподключения
+RECONNECT_BACKOFF_MAX = 300  # секунды, максимальная задержка
 MIN_ALERT_DELAY = 60  # секунды
+MAX_SENT_HASHES = 2000  # хешей отправленных сообщений в памяти
+
+# Трассировка
+TRACE_PATH = 'logs/traces.jsonl'
+
+# Архив графиков
+ARCHIVE_PATH = 'data/schedule_archive.csv'
+HOURS_PER_DAY = 24
+
+# Outbox оповещений
+OUTBOX_PATH = 'data/outbox.sqlite3'
+OUTBOX_RETRY_BASE = 10  # секунды, первая задержка повторной отправки
+OUTBOX_RETRY_MAX = 600  # секунды, максимальная задержка
+OUTBOX_RETRY_POLL = 5  # секунды между проверками очереди повторов
+OUTBOX_KEEP_DAYS = 7  # сколько хранить отправленные/отменённые записи
+BREAKER_FAILURE_THRESHOLD = 5  # ошибок подряд до размыкания
+BREAKER_COOLDOWN = 60  # секунды паузы после размыкания
+
+# Справочник адресов
+ADDRESS_BOOK_PATH = 'data/addresses.csv'  # строки 'улица;дом;очередь'
+ADDRESS_FUZZY_CUTOFF = 0.75  # порог похожести названия улицы (difflib)
+ADDRESS_FUZZY_CANDIDATES = 10  # улиц-кандидатов для точного сравнения
+
+# Картинки графиков
+CHART_CACHE_SIZE = 64  # картинок в LRU-кеше
+CHART_WORKERS = 1  # процессов для рендеринга
+
+# Теневой парсер
+SHADOW_REPORT_PATH = 'logs/shadow_report.jsonl'
+SHADOW_WORKERS = 1  # процессов для теневого разбора
+SHADOW_MAX_PENDING = 32  # незавершённых сравнений, дальше сообщения пропускаются
+SHADOW_TIMING_REPEAT = 3  # повторов разбора для замера (лучшее время)
+SHADOW_SEEN_IDS = 1000  # id сообщений, уже отданных на теневой разбор
+
+# Шаблоны сообщений
+TEMPLATE_CACHE_SIZE = 1024  # готовых текстов в кеше
+
+# Вещательные каналы очередей
+BROADCAST_CHANNELS_PATH = 'data/broadcast_channels.json'  # {"1.2": "@канал"}
+
+# Таймеры напоминаний
+TIMER_MAX_SLEEP = 60  # секунды, максимальный отрезок сна до сверки с часами
+CLOCK_JUMP_THRESHOLD = 5  # секунды расхождения настенного и монотонного времени
+MISSED_REMINDER_GRACE = 60  # опоздание (с), после которого напоминание считается пропущенным
+FIRING_SAMPLES = 500  # последних срабатываний для статистики точности
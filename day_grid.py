@@ -0,0 +1,142 @@
+from datetime import date, datetime
+import numpy as np
+from schedule_archive import periods_to_mask
+import constants
+
+_HOUR_BITS = np.arange(constants.HOURS_PER_DAY, dtype=np.uint32)
+OFF_CELL = '█'
+ON_CELL = '·'
+
+
+def hour_ranges(hours) -> str:
+    """[14, 15, 16, 20] -> '14-17, 20-21'."""
+    hours = list(hours)
+    if not hours:
+        return '—'
+    ranges = []
+    start = prev = hours[0]
+    for hour in hours[1:]:
+        if hour != prev + 1:
+            ranges.append((start, prev + 1))
+            start = hour
+        prev = hour
+    ranges.append((start, prev + 1))
+    return ', '.join(f"{a:02d}-{b:02d}" for a, b in ranges)
+
+
+class DayGrid:
+    """
+    График всех очередей на одну дату: матрица очереди x 24 часа (True —
+    света нет). Строится один раз на ревизию из вывода ScheduleParser.parse_all;
+    объединение, пересечение, сравнение ревизий и подсчёт отключённых очередей
+    по часам — операции над матрицей без разбора строк.
+    """
+
+    __slots__ = ('day', 'queues', 'index', 'bits')
+
+    def __init__(self, day: date, queues, bits: np.ndarray):
+        self.day = day
+        self.queues = tuple(queues)
+        self.index = {queue: row for row, queue in enumerate(self.queues)}
+        self.bits = bits
+
+    @classmethod
+    def from_periods(cls, schedule_date, queue_periods: dict[str, list]) -> 'DayGrid':
+        """Строит сетку из {очередь: [(начало, конец, дата), ...]}."""
+        day = schedule_date.date() if isinstance(schedule_date, datetime) else schedule_date
+        queues = sorted(queue_periods, key=lambda q: tuple(int(x) for x in q.split('.')))
+        masks = np.fromiter((periods_to_mask(queue_periods[q]) for q in queues),
+                            dtype=np.uint32, count=len(queues))
+        bits = ((masks[:, None] >> _HOUR_BITS) & 1).astype(bool)
+        return cls(day, queues, bits)
+
+    def _rows(self, queues=None) -> np.ndarray:
+        if queues is None:
+            return self.bits
+        rows = [self.index[q] for q in queues if q in self.index]
+        return self.bits[rows]
+
+    def row(self, queue: str) -> np.ndarray:
+        """Часы очереди (bool[24]); очередь без графика — все False."""
+        row = self.index.get(queue)
+        if row is None:
+            return np.zeros(constants.HOURS_PER_DAY, dtype=bool)
+        return self.bits[row]
+
+    def union(self, queues=None) -> np.ndarray:
+        """Часы, когда света нет хотя бы в одной из очередей."""
+        return self._rows(queues).any(axis=0)
+
+    def intersection(self, queues=None) -> np.ndarray:
+        """Часы, когда света нет во всех очередях сразу."""
+        rows = self._rows(queues)
+        if rows.shape[0] == 0:
+            return np.zeros(constants.HOURS_PER_DAY, dtype=bool)
+        return rows.all(axis=0)
+
+    def off_count(self) -> np.ndarray:
+        """Число очередей без света в каждом часу (int[24])."""
+        return self.bits.sum(axis=0)
+
+    def off_at(self, hour: int) -> list[str]:
+        """Очереди без света в указанный час."""
+        return [self.queues[row] for row in np.flatnonzero(self.bits[:, hour])]
+
+    def _aligned(self, queues) -> np.ndarray:
+        aligned = np.zeros((len(queues), constants.HOURS_PER_DAY), dtype=bool)
+        for row, queue in enumerate(queues):
+            own = self.index.get(queue)
+            if own is not None:
+                aligned[row] = self.bits[own]
+        return aligned
+
+    def diff(self, newer: 'DayGrid') -> dict[str, tuple[list[int], list[int]]]:
+        """
+        Изменения от этой ревизии к newer: {очередь: (добавленные часы
+        отключения, отменённые часы)}. Неизменившиеся очереди не попадают.
+        """
+        if newer.queues == self.queues:
+            queues, old, new = self.queues, self.bits, newer.bits
+        else:
+            queues = sorted(set(self.queues) | set(newer.queues),
+                            key=lambda q: tuple(int(x) for x in q.split('.')))
+            old, new = self._aligned(queues), newer._aligned(queues)
+        added = new & ~old
+        removed = old & ~new
+        changed = np.flatnonzero((added | removed).any(axis=1))
+        return {queues[row]: (np.flatnonzero(added[row]).tolist(),
+                              np.flatnonzero(removed[row]).tolist())
+                for row in changed}
+
+    def format_map(self, highlight: str = None) -> str:
+        """Текстовая карта района: строка на очередь, столбец на час."""
+        label_width = max((len(q) for q in self.queues), default=3) + 1
+        pad = ' ' * (label_width + 1)
+        tens = ''.join(str(h // 10) for h in range(constants.HOURS_PER_DAY))
+        ones = ''.join(str(h % 10) for h in range(constants.HOURS_PER_DAY))
+        lines = [f"Отключения на {self.day:%d.%m.%Y}", pad + tens, pad + ones]
+        for row, queue in enumerate(self.queues):
+            marker = '>' if queue == highlight else ' '
+            cells = ''.join(OFF_CELL if off else ON_CELL for off in self.bits[row])
+            lines.append(f"{marker}{queue:<{label_width}}{cells}")
+        counts = self.off_count()
+        lines.append(' ' + 'Σ'.ljust(label_width)
+                     + ''.join(str(c) if c < 10 else '+' for c in counts))
+        if self.queues:
+            peak = int(counts.argmax())
+            lines.append(f"Больше всего отключено в {peak:02d}:00 — "
+                         f"{int(counts[peak])} из {len(self.queues)} очередей")
+        return "\n".join(lines)
+
+
+def format_diff(changes: dict[str, tuple[list[int], list[int]]]) -> str:
+    """Краткое описание изменений ревизии для логов."""
+    parts = []
+    for queue, (added, removed) in changes.items():
+        desc = []
+        if added:
+            desc.append(f"+{hour_ranges(added)}")
+        if removed:
+            desc.append(f"−{hour_ranges(removed)}")
+        parts.append(f"{queue}: {' '.join(desc)}")
+    return '; '.join(parts)
@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+from logger import logger
+
+# приоритеты (меньше — важнее)
+PRIORITY_FINAL = 0     # финальные напоминания «через N минут»
+PRIORITY_CURRENT = 1   # «сейчас отключены»
+PRIORITY_ANNOUNCE = 2  # объявления «обновление графика»
+PRIORITY_INFO = 3      # ответы на команды бота
+PRIORITIES = (PRIORITY_FINAL, PRIORITY_CURRENT, PRIORITY_ANNOUNCE, PRIORITY_INFO)
+
+LATE_GRACE_SECONDS = 60  # опоздание, после которого текст переписывается
+MIN_USEFUL_LEAD = 60     # меньше чем за минуту до события сообщение бесполезно
+
+
+class OutboundMessage:
+    """Исходящее сообщение с приоритетом и сроком актуальности."""
+
+    __slots__ = ('priority', 'text', 'sender', 'due_ts', 'deadline_ts',
+                 'rewrite', 'label', 'on_drop', 'seq', 'enqueued_ts')
+
+    def __init__(self, priority: int, text: str, sender, due_ts: float = None,
+                 deadline_ts: float = None, rewrite=None, label: str = '', on_drop=None):
+        self.priority = priority
+        self.text = text
+        self.sender = sender            # callable(text) -> bool, блокирующий
+        self.due_ts = due_ts            # когда сообщение должно было уйти
+        self.deadline_ts = deadline_ts  # момент события (после него — не слать)
+        self.rewrite = rewrite          # callable(minutes_left) -> str | None
+        self.label = label
+        self.on_drop = on_drop          # callable(reason), если сообщение отброшено
+        self.seq = 0
+        self.enqueued_ts = 0.0
+
+
+class DeliveryQueue:
+    """
+    Очередь исходящих сообщений с полосами приоритетов: один отправитель
+    всегда берёт сообщение из самой важной непустой полосы, поэтому финальные
+    напоминания обгоняют объявления и ответы бота. Сообщения, которые уже не
+    успевают до события, отбрасываются; опоздавшие переписываются с
+    фактическим числом минут.
+    """
+
+    def __init__(self):
+        self.lanes = {priority: deque() for priority in PRIORITIES}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self.running = True
+
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        self.preemptions = 0
+        self.deadline_misses = 0
+        self.rewritten = 0
+
+    def submit(self, message: OutboundMessage) -> bool:
+        message.seq = next(self._seq)
+        message.enqueued_ts = time.time()
+        self.lanes[message.priority].append(message)
+        self.submitted += 1
+        self._wakeup.set()
+        return True
+
+    def pending(self) -> int:
+        return sum(len(lane) for lane in self.lanes.values())
+
+    def _next(self) -> OutboundMessage | None:
+        for priority in PRIORITIES:
+            lane = self.lanes[priority]
+            if not lane:
+                continue
+            message = lane.popleft()
+            # вытеснение: в менее важных полосах ждёт сообщение, поставленное раньше
+            if any(self.lanes[p] and self.lanes[p][0].seq < message.seq
+                   for p in PRIORITIES if p > priority):
+                self.preemptions += 1
+            return message
+        return None
+
+    @staticmethod
+    def _useful_lead(message: OutboundMessage) -> float:
+        """
+        Минимальный запас до события, при котором сообщение ещё имеет смысл.
+        Напоминание, запланированное ближе MIN_USEFUL_LEAD (ALERT_*_MINUTES=1),
+        отбрасывается, только если опоздание съело половину его запаса.
+        """
+        if message.due_ts is None:
+            return MIN_USEFUL_LEAD
+        return min(MIN_USEFUL_LEAD, (message.deadline_ts - message.due_ts) / 2)
+
+    def _check_deadline(self, message: OutboundMessage, now: float) -> bool:
+        """False — сообщение устарело и отброшено. Может переписать текст."""
+        if message.deadline_ts is not None and now > message.deadline_ts - self._useful_lead(message):
+            self.deadline_misses += 1
+            logger.warning(f"Сообщение {message.label} опоздало к событию и не отправлено")
+            if message.on_drop:
+                message.on_drop('deadline')
+            return False
+        if (message.rewrite and message.due_ts is not None and message.deadline_ts is not None
+                and now - message.due_ts > LATE_GRACE_SECONDS):
+            minutes_left = int((message.deadline_ts - now) // 60)
+            text = message.rewrite(minutes_left)
+            if not text:
+                self.deadline_misses += 1
+                if message.on_drop:
+                    message.on_drop('deadline')
+                return False
+            message.text = text
+            self.rewritten += 1
+            logger.info(f"Сообщение {message.label} переписано: до события {minutes_left} мин")
+        return True
+
+    async def run(self):
+        """Единственный отправитель: блокирующий HTTP уходит в отдельный поток."""
+        while self.running:
+            message = self._next()
+            if message is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if not self._check_deadline(message, time.time()):
+                continue
+            try:
+                ok = await asyncio.to_thread(message.sender, message.text)
+            except Exception as e:
+                logger.error(f"Ошибка доставки {message.label}: {e}")
+                ok = False
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def format_status(self) -> str:
+        return (
+            f"Доставка: в очереди {self.pending()}, отправлено {self.sent}, "
+            f"ошибок {self.failed}\n"
+            f"Вытеснений: {self.preemptions}, опозданий к событию: {self.deadline_misses}, "
+            f"переписано: {self.rewritten}"
+        )
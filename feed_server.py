@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timezone
+from urllib.parse import unquote
+from logger import logger
+from schedule_store import ScheduleStore, period_bounds
+from validators import validate_queue_format
+
+ICS_CONTENT_TYPE = 'text/calendar; charset=utf-8'
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+REQUEST_TIMEOUT = 10  # секунды на чтение запроса
+MAX_HEADER_LINES = 100
+ICS_LINE_LIMIT = 75  # октетов, RFC 5545
+
+
+def _fold_ics_line(line: str) -> str:
+    """Переносит длинную строку iCalendar (продолжение начинается с пробела)."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= ICS_LINE_LIMIT:
+        return line
+    chunks, current, size = [], '', 0
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        limit = ICS_LINE_LIMIT if not chunks else ICS_LINE_LIMIT - 1
+        if size + char_size > limit:
+            chunks.append(current)
+            current, size = '', 0
+        current += char
+        size += char_size
+    chunks.append(current)
+    return '\r\n '.join(chunks)
+
+
+class FeedCache:
+    """
+    Кеш сгенерированных фидов. Фид очереди пересобирается только если
+    версия очереди в ScheduleStore изменилась с момента последней сборки.
+    """
+
+    def __init__(self, store: ScheduleStore):
+        self.store = store
+        self._cache = {}  # (queue, fmt) -> (version, body, etag)
+        self.renders = 0
+
+    def get(self, queue: str, fmt: str) -> tuple[bytes, str]:
+        """Возвращает (тело, etag) фида очереди в формате 'ics' или 'json'."""
+        version = self.store.version(queue)
+        cached = self._cache.get((queue, fmt))
+        if cached and cached[0] == version:
+            return cached[1], cached[2]
+
+        body = self._render_ics(queue) if fmt == 'ics' else self._render_json(queue)
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self._cache[(queue, fmt)] = (version, body, etag)
+        self.renders += 1
+        logger.debug(f"Фид {queue}.{fmt} пересобран (версия {version})")
+        return body, etag
+
+    def _render_json(self, queue: str) -> bytes:
+        outages = []
+        for period_start, period_end, day in self.store.periods_for(queue):
+            start_dt, end_dt = period_bounds(period_start, period_end, day)
+            outages.append({
+                'date': day.isoformat(),
+                'start': start_dt.astimezone().isoformat(),
+                'end': end_dt.astimezone().isoformat(),
+            })
+        payload = {
+            'queue': queue,
+            'version': self.store.version(queue),
+            'outages': outages,
+        }
+        return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+    def _render_ics(self, queue: str) -> bytes:
+        def utc(dt: datetime) -> str:
+            return dt.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+        # DTSTAMP фиксирован по времени изменения очереди, чтобы тело
+        # (и ETag) не менялись между запросами без изменения графика
+        stamp = utc(self.store.updated_at.get(queue) or datetime.now())
+        lines = [
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:-//power-alert//schedule feed//RU',
+            'CALSCALE:GREGORIAN',
+            f'X-WR-CALNAME:Отключения света — очередь {queue}',
+        ]
+        for period_start, period_end, day in self.store.periods_for(queue):
+            start_dt, end_dt = period_bounds(period_start, period_end, day)
+            lines.extend([
+                'BEGIN:VEVENT',
+                f'UID:{queue}-{start_dt:%Y%m%dT%H%M}@power-alert',
+                f'DTSTAMP:{stamp}',
+                f'DTSTART:{utc(start_dt)}',
+                f'DTEND:{utc(end_dt)}',
+                f'SUMMARY:Нет света (очередь {queue})',
+                'TRANSP:OPAQUE',
+                'END:VEVENT',
+            ])
+        lines.append('END:VCALENDAR')
+        return ('\r\n'.join(_fold_ics_line(line) for line in lines) + '\r\n').encode('utf-8')
+
+
+class FeedServer:
+    """
+    Встроенный HTTP-сервер с фидами графиков:
+      /queues            — список очередей (JSON)
+      /feed/<queue>.ics  — календарь iCalendar
+      /feed/<queue>.json — JSON
+    Поддерживает ETag / If-None-Match (ответ 304 без тела).
+    """
+
+    def __init__(self, store: ScheduleStore, host: str = '127.0.0.1', port: int = 8080):
+        self.store = store
+        self.cache = FeedCache(store)
+        self.host = host
+        self.port = port
+        self.server = None
+        self.requests_total = 0
+        self.not_modified_total = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"✓ Фиды графиков доступны на http://{self.host}:{self.port}/")
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    @staticmethod
+    def _etag_matches(if_none_match: str, etag: str) -> bool:
+        if not if_none_match:
+            return False
+        for candidate in if_none_match.split(','):
+            candidate = candidate.strip()
+            if candidate.startswith('W/'):
+                candidate = candidate[2:]
+            if candidate == '*' or candidate == etag:
+                return True
+        return False
+
+    def _route(self, path: str) -> tuple[bytes, str, str] | None:
+        """Возвращает (тело, content-type, etag) или None, если ресурс не найден."""
+        if path == '/queues':
+            body = json.dumps({'queues': self.store.queues()}).encode('utf-8')
+            return body, JSON_CONTENT_TYPE, '"' + hashlib.sha1(body).hexdigest() + '"'
+        if not path.startswith('/feed/'):
+            return None
+        queue, _, fmt = path[len('/feed/'):].rpartition('.')
+        if fmt not in ('ics', 'json') or not validate_queue_format(queue):
+            return None
+        if queue not in self.store.schedules:
+            return None
+        body, etag = self.cache.get(queue, fmt)
+        return body, (ICS_CONTENT_TYPE if fmt == 'ics' else JSON_CONTENT_TYPE), etag
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            headers = {}
+            for _ in range(MAX_HEADER_LINES):
+                line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2:
+                await self._respond(writer, 400, 'Bad Request')
+                return
+            method, target = parts[0], unquote(parts[1].split('?', 1)[0])
+            if method not in ('GET', 'HEAD'):
+                await self._respond(writer, 405, 'Method Not Allowed',
+                                    extra={'Allow': 'GET, HEAD'})
+                return
+
+            self.requests_total += 1
+            route = self._route(target)
+            if route is None:
+                await self._respond(writer, 404, 'Not Found')
+                return
+            body, content_type, etag = route
+
+            extra = {'ETag': etag, 'Cache-Control': 'public, max-age=60'}
+            if self._etag_matches(headers.get('if-none-match'), etag):
+                self.not_modified_total += 1
+                await self._respond(writer, 304, 'Not Modified', extra=extra)
+                return
+            await self._respond(writer, 200, 'OK', body=body, content_type=content_type,
+                                extra=extra, head_only=(method == 'HEAD'))
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка обработки HTTP-запроса фида: {e}")
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, reason: str,
+                       body: bytes = b'', content_type: str = 'text/plain; charset=utf-8',
+                       extra: dict = None, head_only: bool = False):
+        headers = [f'HTTP/1.1 {status} {reason}', 'Connection: close']
+        if status != 304:
+            headers.append(f'Content-Type: {content_type}')
+            headers.append(f'Content-Length: {len(body)}')
+        for name, value in (extra or {}).items():
+            headers.append(f'{name}: {value}')
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1'))
+        if body and not head_only and status != 304:
+            writer.write(body)
+        await writer.drain()
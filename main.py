@@ -1,14 +1,29 @@
 import asyncio
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 from config import load_config
 from logger import logger
 from telegram_client import TelegramClientWrapper
 from schedule_parser import ScheduleParser
 from date_parser import DateParser
-from interval_checker import IntervalChecker
 from message_builder import MessageBuilder
 from alert_manager import AlertManager
+from schedule_archive import ScheduleArchive
+from schedule_stats import ScheduleStats
+from schedule_store import ScheduleStore
+from feed_server import FeedServer
+from schedule_ingestor import ScheduleIngestor
+from connection_manager import ConnectionManager
+from tracing import Tracer
+from delivery_queue import DeliveryQueue
+from outbox import Outbox
+from transition_index import TransitionIndex
+from alert_plan import load_timezone
+from address_resolver import AddressResolver
+from chart_renderer import ChartCache
+from broadcast import ChannelRegistry, Broadcaster
+from shadow_parser import ShadowParser
+from schedule_sources import TelegramSource, HttpSource, SourceMerger, PartialFetch
 import constants
 
 
@@ -24,54 +39,112 @@ async def main():
         return
 
     tg_client = TelegramClientWrapper(tg_config)
+    connection = ConnectionManager(tg_client)
     parser = ScheduleParser(alert_config.target_queue)
     date_parser = DateParser()
-    interval_checker = IntervalChecker()
     builder = MessageBuilder(
         alert_config.target_queue,
         alert_config.alert_minutes_before_off,
-        alert_config.alert_minutes_before_on
+        alert_config.alert_minutes_before_on,
+        locale=alert_config.locale
     )
     alert_manager = AlertManager(tg_config.bot_token, tg_config.chat_id)
+    archive = ScheduleArchive(alert_config.archive_path)
+    stats = ScheduleStats(archive)
+    store = ScheduleStore()
+    tracer = Tracer()
+    alert_manager.tracer = tracer
+    delivery = DeliveryQueue()
+    alert_manager.delivery = delivery
+    delivery_task = asyncio.create_task(delivery.run())
+    outbox = Outbox(alert_config.outbox_path)
+    alert_manager.outbox = outbox
+    alert_manager.builder = builder
+    alert_manager.missed_policy = alert_config.missed_reminder_policy
+    # напоминания, запланированные до перезапуска, заводятся заново
+    alert_manager.restore_outbox()
+    retry_task = asyncio.create_task(alert_manager.run_retries())
 
     last_day = None
     last_schedule_updates = {}
+    transitions = TransitionIndex(load_timezone(alert_config.timezone))
+    addresses = AddressResolver(alert_config.address_book_path)
+    charts = ChartCache() if alert_config.send_charts else None
+    broadcaster = None
+    if alert_config.broadcast:
+        broadcaster = Broadcaster(
+            ChannelRegistry(alert_config.broadcast_channels_path), tg_config.bot_token,
+            alert_config, alert_manager, store, load_timezone(alert_config.timezone), charts)
+        broadcaster.restore()
+    shadow = ShadowParser(alert_config.shadow_parser) if alert_config.shadow_parser else None
+    telegram_source = TelegramSource(tg_client)
+    sources = SourceMerger([telegram_source] + [
+        HttpSource(url) for url in alert_config.schedule_urls])
+    ingestor = ScheduleIngestor(
+        parser, date_parser, builder, alert_manager,
+        alert_config, archive, store, last_schedule_updates,
+        tracer=tracer, transitions=transitions, charts=charts,
+        broadcaster=broadcaster, shadow=shadow
+    )
 
     # Запуск контроллера бота (async task)
     try:
         logger.info("Инициализирую BotController...")
         from bot_controller import BotController
         bot_ctrl = BotController(tg_config.bot_token, tg_config.chat_id,
-                                 parser, alert_manager, alert_config, last_schedule_updates)
+                                 parser, alert_manager, alert_config, last_schedule_updates,
+                                 stats=stats, connection=connection, tracer=tracer,
+                                 delivery=delivery, transitions=transitions,
+                                 addresses=addresses if len(addresses) else None,
+                                 grids=ingestor.grids, charts=charts,
+                                 sources=sources, ingestor=ingestor,
+                                 broadcaster=broadcaster, shadow=shadow)
         bot_task = asyncio.create_task(bot_ctrl.run())
         logger.info("✓ BotController запущен в фоне")
     except Exception as e:
         logger.error(f"Ошибка инициализации BotController: {e}")
         bot_task = None
 
+    feed_server = None
+    if alert_config.feed_port:
+        try:
+            feed_server = FeedServer(
+                store, alert_config.feed_host, alert_config.feed_port)
+            await feed_server.start()
+        except OSError as e:
+            logger.error(f"Не удалось запустить HTTP-сервер фидов: {e}")
+            feed_server = None
+
     try:
         logger.info("Подключаюсь к Telegram...")
-        await asyncio.wait_for(tg_client.connect(), timeout=10)
-        logger.info("✓ Подключено к Telegram")
-    except asyncio.TimeoutError:
-        logger.error("Таймаут подключения к Telegram (10 сек)")
-        return
+        channel = await connection.ensure_connected()
+        logger.info(f"✓ Отслеживается очередь: {alert_config.target_queue}")
     except Exception as e:
+        # нет файла сессии или аккаунт не авторизован — повторять бессмысленно
         logger.error(f"Ошибка подключения к Telegram: {e}")
+        if bot_task:
+            bot_task.cancel()
+        if feed_server:
+            await feed_server.stop()
+        delivery.stop()
+        delivery_task.cancel()
+        retry_task.cancel()
+        if broadcaster:
+            broadcaster.close()
+        outbox.close()
+        if charts:
+            charts.close()
+        if shadow:
+            shadow.close()
         return
+    connection_task = asyncio.create_task(connection.run())
 
-    try:
-        logger.info("Получаю канал...")
-        channel = await asyncio.wait_for(tg_client.get_channel(), timeout=10)
-        logger.info(f"✓ Отслеживается очередь: {alert_config.target_queue}")
-    except asyncio.TimeoutError:
-        logger.error("Таймаут получения канала (10 сек)")
-        await tg_client.disconnect()
-        return
-    except Exception as e:
-        logger.error(f"Ошибка получения канала: {e}")
-        await tg_client.disconnect()
-        return
+    if alert_config.catchup_hours > 0:
+        logger.info(
+            f"Догружаю историю канала за {alert_config.catchup_hours} ч...")
+        await run_catch_up(tg_client, channel, ingestor,
+                           time.time() - alert_config.catchup_hours * 3600)
+    last_poll_ts = time.time()
 
     try:
         while True:
@@ -79,78 +152,26 @@ async def main():
                 # очистка кеша в полночь
                 current_day = datetime.now().day
                 if last_day is not None and last_day != current_day:
-                    alert_manager.clear_daily_cache()
-                    last_schedule_updates.clear()
+                    daily_cleanup(alert_manager, last_schedule_updates, ingestor)
                 last_day = current_day
 
-                logger.debug("Получаю последние сообщения...")
-                messages = await asyncio.wait_for(tg_client.get_recent_messages(channel), timeout=15)
-                logger.debug(f"Получено {len(messages)} сообщений")
-
-                for message in messages:
-                    if not message.message:
-                        continue
-
-                    schedule_date, update_dt = date_parser.parse_date(
-                        message.message)
-                    date_key = schedule_date.strftime('%d.%m.%Y')
-
-                    prev_update = last_schedule_updates.get(date_key)
-
-                    if update_dt is None and prev_update is not None:
-                        logger.debug(
-                            f"Пропускаю сообщение без времени обновления для {date_key}")
-                        continue
-
-                    if update_dt is not None and prev_update is not None and update_dt <= prev_update:
-                        logger.debug(
-                            f"Пропускаю старое обновление для {date_key}")
-                        continue
-
-                    if prev_update is not None and (update_dt is None or update_dt > prev_update):
-                        logger.info(
-                            f"Новое обновление графика для {date_key}. Отменяю старые планы.")
-                        alert_manager.cancel_planned_for_date(date_key)
-
-                    last_schedule_updates[date_key] = update_dt or datetime.now(
-                    )
+                # без соединения ждём переподключения; уже запланированные
+                # напоминания при этом продолжают срабатывать
+                channel = await connection.ensure_connected()
 
-                    parser.set_schedule_date(schedule_date)
-                    periods = parser.parse(message.message)
+                # после долгого простоя последних MAX_HISTORY_LIMIT сообщений
+                # может не хватить — догружаем историю с момента последнего опроса
+                missed_seconds = time.time() - last_poll_ts
+                if missed_seconds > alert_config.check_interval_seconds * constants.CATCHUP_MISSED_POLLS:
+                    logger.warning(
+                        f"Последний успешный опрос был {int(missed_seconds // 60)} мин назад. "
+                        f"Догружаю историю канала...")
+                    await run_catch_up(tg_client, channel, ingestor,
+                                       last_poll_ts - alert_config.check_interval_seconds)
 
-                    if not periods:
-                        continue
-
-                    logger.info(
-                        f"Найден график на {date_key} (ID: {message.id})")
-
-                    is_currently_offline = interval_checker.is_currently_offline(
-                        periods)
-
-                    if is_currently_offline:
-                        current_period = interval_checker.get_current_offline_period(
-                            periods)
-                        if current_period:
-                            period_start, period_end, apply_date = current_period
-                            apply_date_key = apply_date.strftime('%d.%m.%Y') if hasattr(
-                                apply_date, 'strftime') else str(apply_date)
-
-                            current_offline_key = f"CURRENT_OFFLINE_{apply_date_key}_{period_start}_{period_end}"
-                            msg = builder.current_offline_message(
-                                period_start, period_end)
-
-                            if alert_manager.send_alert(msg, alert_key=current_offline_key):
-                                logger.info(
-                                    "Сообщение о текущем отключении отправлено")
-                            else:
-                                logger.debug(
-                                    "Сообщение уже было отправлено ранее")
-
-                    for period_start, period_end, apply_date in periods:
-                        await process_period(
-                            alert_manager, builder, alert_config, interval_checker,
-                            period_start, period_end, apply_date
-                        )
+                telegram_source.channel = channel
+                await poll_sources(sources, ingestor)
+                last_poll_ts = time.time()
 
                 logger.info(f"Запланировано: {len(alert_manager.planned_alerts)} оповещений. "
                             f"Спящий режим {alert_config.check_interval_seconds // 60} мин")
@@ -159,7 +180,9 @@ async def main():
 
             except asyncio.TimeoutError:
                 logger.warning(
-                    "Таймаут при получении сообщений (15 сек), продолжаю...")
+                    "Таймаут при получении сообщений (15 сек), проверяю соединение...")
+                if not await connection.is_healthy():
+                    connection.mark_down("таймаут получения сообщений")
                 await asyncio.sleep(10)
             except Exception as e:
                 logger.error(f"Ошибка в цикле: {e}")
@@ -171,85 +194,63 @@ async def main():
         logger.error(f"Критическая ошибка: {e}")
     finally:
         logger.info("Отключаюсь от Telegram...")
+        connection.stop()
+        connection_task.cancel()
         await tg_client.disconnect()
         if bot_task:
             bot_task.cancel()
+        if feed_server:
+            await feed_server.stop()
+        delivery.stop()
+        delivery_task.cancel()
+        retry_task.cancel()
+        if broadcaster:
+            broadcaster.close()
+        outbox.close()
+        if charts:
+            charts.close()
+        if shadow:
+            shadow.close()
         logger.info("✓ Приложение остановлено")
 
 
-async def process_period(alert_manager, builder, alert_config, interval_checker,
-                         period_start, period_end, schedule_date):
-    """Обрабатывает один период отключения/включения с учетом даты."""
-
-    now_ts = time.time()
-
-    start_ts = time.mktime(time.strptime(
-        f"{schedule_date.year}-{schedule_date.month:02d}-{schedule_date.day:02d} {period_start}:00",
-        "%Y-%m-%d %H:%M:%S"
-    ))
-
-    if start_ts < now_ts:
-        logger.debug(
-            f"Время {period_start} уже прошло для даты {schedule_date.strftime('%d.%m.%Y')}")
-        return
-
-    is_in_current_interval = interval_checker.is_in_interval(
-        period_start, period_end, schedule_date)
-
-    if is_in_current_interval:
-        logger.info(
-            f"Мы находимся в интервале отключения {period_start}-{period_end} на {schedule_date.strftime('%d.%m.%Y')}")
-        return
-
-    # ОТКЛЮЧЕНИЕ (OFF)
-    off_alert_ts = start_ts - (alert_config.alert_minutes_before_off * 60)
-    if off_alert_ts > now_ts + constants.MIN_ALERT_DELAY:
-        off_key = f"OFF_{schedule_date.strftime('%d.%m.%Y')}_{period_start}_{period_end}"
-        if off_key not in alert_manager.planned_alerts:
-            off_time = time.strftime('%H:%M', time.localtime(off_alert_ts))
-            msg = builder.initial_off_message(
-                period_start, period_end, off_time)
-
-            if alert_manager.send_alert(msg, alert_key=off_key):
-                alert_manager.planned_alerts.add(off_key)
-
-                final_msg = builder.final_off_message(
-                    period_start, period_end)
-                delay = off_alert_ts - now_ts
-                asyncio.create_task(
-                    alert_manager.schedule_delayed_alert(
-                        'OFF', delay, final_msg, off_key)
-                )
+def daily_cleanup(alert_manager, last_schedule_updates: dict, ingestor):
+    """Суточная очистка кешей и прошедших дат (при смене дня)."""
+    alert_manager.clear_daily_cache()
+    last_schedule_updates.clear()
+    ingestor.prune()
 
-    # ВКЛЮЧЕНИЕ (ON)
-    end_ts = time.mktime(time.strptime(
-        f"{schedule_date.year}-{schedule_date.month:02d}-{schedule_date.day:02d} {period_end}:00",
-        "%Y-%m-%d %H:%M:%S"
-    ))
 
-    on_alert_ts = end_ts - (alert_config.alert_minutes_before_on * 60)
-
-    if on_alert_ts > now_ts + constants.MIN_ALERT_DELAY:
-        on_key = f"ON_{schedule_date.strftime('%d.%m.%Y')}_{period_start}_{period_end}"
-        if on_key not in alert_manager.planned_alerts:
-            on_time = time.strftime('%H:%M', time.localtime(on_alert_ts))
-            msg = builder.initial_on_message(period_end, on_time)
-
-            if alert_manager.send_alert(msg, alert_key=on_key):
-                alert_manager.planned_alerts.add(on_key)
+async def poll_sources(sources, ingestor) -> int:
+    """
+    Один опрос всех источников (schedule_sources.SourceMerger): сообщения
+    без повторов передаются в ingestor. Объекты сообщений не переживают
+    вызов. Возвращает их число.
+    """
+    logger.debug("Опрашиваю источники графиков...")
+    try:
+        messages = await sources.fetch()
+    except PartialFetch as e:
+        # ответы остальных источников обрабатываем, ошибку — в главный цикл
+        await ingestor.process_messages(e.messages, time.time())
+        raise e.error
+    fetched_ts = time.time()
+    logger.debug(f"Получено {len(messages)} сообщений")
 
-                final_msg = builder.final_on_message(period_end)
-                delay = on_alert_ts - now_ts
+    await ingestor.process_messages(messages, fetched_ts)
+    return len(messages)
 
-                logger.info(f"Запланировано напоминание о включении в {period_end} "
-                            f"(через {int(delay / 60)} мин)")
 
-                asyncio.create_task(
-                    alert_manager.schedule_delayed_alert(
-                        'ON', delay, final_msg, on_key)
-                )
-    else:
-        logger.debug(f"Напоминание о включении {period_end} уже прошло")
+async def run_catch_up(tg_client, channel, ingestor, since_ts: float):
+    """Догружает историю канала начиная с since_ts (epoch) через ingestor."""
+    since = datetime.fromtimestamp(since_ts, tz=timezone.utc)
+    try:
+        await asyncio.wait_for(
+            ingestor.catch_up(tg_client.iter_history(channel, since)),
+            timeout=constants.CATCHUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(
+            f"Догрузка истории прервана по таймауту ({constants.CATCHUP_TIMEOUT} сек)")
 
 
 if __name__ == '__main__':
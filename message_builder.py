@@ -1,48 +1,51 @@
-from datetime import datetime
+from message_templates import CATALOG, DEFAULT_LOCALE
 
 
 class MessageBuilder:
-    """Построитель сообщений оповещений."""
-
-    def __init__(self, target_queue: str, alert_off_minutes: int, alert_on_minutes: int):
+    """
+    Построитель сообщений оповещений: фасад над каталогом шаблонов
+    (message_templates). Очередь, язык и минуты читаются в момент вызова,
+    готовый текст уже экранирован для MarkdownV2.
+    """
+
+    def __init__(self, target_queue: str, alert_off_minutes: int, alert_on_minutes: int,
+                 locale: str = DEFAULT_LOCALE, catalog=CATALOG):
         self.target_queue = target_queue
         self.alert_off_minutes = alert_off_minutes
         self.alert_on_minutes = alert_on_minutes
+        self.locale = locale
+        self.catalog = catalog
+
+    def _render(self, kind: str, **values) -> str:
+        return self.catalog.render(self.locale, kind, queue=self.target_queue, **values)
 
     def current_offline_message(self, period_start: str, period_end: str) -> str:
         """Сообщение о текущем отключении (прямо сейчас) — БЕЗ динамического времени."""
-        return (
-            f"🚨 *ВНИМАНИЕ! СЕЙЧАС ОТКЛЮЧЕНЫ!* 🚨\n\n"
-            f"Ваша очередь **{self.target_queue}** отключена прямо сейчас.\n"
-            f"⏰ Включение в *{period_end}*"
-        )
+        return self._render('current_offline', end=period_end)
 
     def initial_off_message(self, period_start: str, period_end: str, alert_time: str) -> str:
         """Начальное сообщение об отключении."""
-        return (
-            f"🚨 *ОБНОВЛЕНИЕ ГРАФИКА! ОТКЛЮЧЕНИЕ:* 🚨\n\n"
-            f"Ваша очередь **{self.target_queue}** будет отключена в *{period_start}* (до *{period_end}*).\n"
-            f"⏰ Напоминание сработает в {alert_time}."
-        )
-
-    def final_off_message(self, period_start: str, period_end: str) -> str:
-        """Финальное сообщение об отключении."""
-        return (
-            f"⚡️ *СВЕТ ОТКЛЮЧАТ ЧЕРЕЗ {self.alert_off_minutes} МИНУТ!* 📢\n\n"
-            f"Плановое *отключение* в {period_start} до {period_end} для очереди {self.target_queue}."
-        )
+        return self._render('initial_off', start=period_start, end=period_end,
+                            alert_time=alert_time)
+
+    def final_off_message(self, period_start: str, period_end: str, minutes: int = None) -> str:
+        """Финальное сообщение об отключении (minutes — если напоминание опоздало)."""
+        return self._render('final_off', start=period_start, end=period_end,
+                            minutes=minutes or self.alert_off_minutes)
 
     def initial_on_message(self, period_end: str, alert_time: str) -> str:
         """Начальное сообщение о включении."""
-        return (
-            f"💡 *ОБНОВЛЕНИЕ ГРАФИКА! ВКЛЮЧЕНИЕ:* 💡\n\n"
-            f"Ваша очередь **{self.target_queue}** будет включена в *{period_end}*.\n"
-            f"⏰ Напоминание сработает в {alert_time}."
-        )
-
-    def final_on_message(self, period_end: str) -> str:
-        """Финальное сообщение о включении."""
-        return (
-            f"💡 *СВЕТ ВКЛЮЧАТ ЧЕРЕЗ {self.alert_on_minutes} МИНУТ!* 🎉\n\n"
-            f"Плановое *включение* в {period_end} для очереди {self.target_queue}."
-        )
+        return self._render('initial_on', end=period_end, alert_time=alert_time)
+
+    def final_on_message(self, period_end: str, minutes: int = None) -> str:
+        """Финальное сообщение о включении (minutes — если напоминание опоздало)."""
+        return self._render('final_on', end=period_end, minutes=minutes or self.alert_on_minutes)
+
+    def late_note(self, minutes_late: int) -> str:
+        """Пометка к напоминанию, отправленному позже срока."""
+        return self._render('late_note', minutes=max(minutes_late, 1))
+
+    def chart_caption(self, date_key: str, periods) -> str:
+        """Подпись к картинке графика очереди на дату."""
+        intervals = ", ".join(f"{start}–{end}" for start, end, *_ in periods)
+        return self._render('chart_caption', date=date_key, intervals=intervals)
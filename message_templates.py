@@ -0,0 +1,166 @@
+import re
+from collections import OrderedDict
+from logger import logger
+import constants
+
+PARSE_MODE = 'MarkdownV2'
+# символы, которые MarkdownV2 требует экранировать в обычном тексте
+_SPECIAL = set('\\_*[]()~`>#+-=|{}.!')
+# разметка, которая в исходниках шаблонов остаётся разметкой
+_MARKUP = set('*_')
+_FIELD_RE = re.compile(r'\{(\w+)\}')
+
+DEFAULT_LOCALE = 'ru'
+
+# Исходники шаблонов: *жирный*, _курсив_, {поле}. Остальное — обычный текст,
+# экранируется при компиляции.
+TEMPLATES = {
+    'ru': {
+        'current_offline': (
+            "🚨 *ВНИМАНИЕ! СЕЙЧАС ОТКЛЮЧЕНЫ!* 🚨\n\n"
+            "Ваша очередь *{queue}* отключена прямо сейчас.\n"
+            "⏰ Включение в *{end}*"),
+        'initial_off': (
+            "🚨 *ОБНОВЛЕНИЕ ГРАФИКА! ОТКЛЮЧЕНИЕ:* 🚨\n\n"
+            "Ваша очередь *{queue}* будет отключена в *{start}* (до *{end}*).\n"
+            "⏰ Напоминание сработает в {alert_time}."),
+        'final_off': (
+            "⚡️ *СВЕТ ОТКЛЮЧАТ ЧЕРЕЗ {minutes} МИНУТ!* 📢\n\n"
+            "Плановое *отключение* в {start} до {end} для очереди {queue}."),
+        'initial_on': (
+            "💡 *ОБНОВЛЕНИЕ ГРАФИКА! ВКЛЮЧЕНИЕ:* 💡\n\n"
+            "Ваша очередь *{queue}* будет включена в *{end}*.\n"
+            "⏰ Напоминание сработает в {alert_time}."),
+        'final_on': (
+            "💡 *СВЕТ ВКЛЮЧАТ ЧЕРЕЗ {minutes} МИНУТ!* 🎉\n\n"
+            "Плановое *включение* в {end} для очереди {queue}."),
+        'late_note': "\n\n⏱ _Напоминание задержано на {minutes} мин: бот был недоступен._",
+        'chart_caption': "📊 *ГРАФИК НА {date}*\n\nОчередь *{queue}*, без света: {intervals}",
+    },
+    'uk': {
+        'current_offline': (
+            "🚨 *УВАГА! ЗАРАЗ ВІДКЛЮЧЕНО!* 🚨\n\n"
+            "Вашу чергу *{queue}* відключено прямо зараз.\n"
+            "⏰ Увімкнення о *{end}*"),
+        'initial_off': (
+            "🚨 *ОНОВЛЕННЯ ГРАФІКА! ВІДКЛЮЧЕННЯ:* 🚨\n\n"
+            "Вашу чергу *{queue}* буде відключено о *{start}* (до *{end}*).\n"
+            "⏰ Нагадування спрацює о {alert_time}."),
+        'final_off': (
+            "⚡️ *СВІТЛО ВІДКЛЮЧАТЬ ЧЕРЕЗ {minutes} ХВ!* 📢\n\n"
+            "Планове *відключення* о {start} до {end} для черги {queue}."),
+        'initial_on': (
+            "💡 *ОНОВЛЕННЯ ГРАФІКА! УВІМКНЕННЯ:* 💡\n\n"
+            "Вашу чергу *{queue}* буде увімкнено о *{end}*.\n"
+            "⏰ Нагадування спрацює о {alert_time}."),
+        'final_on': (
+            "💡 *СВІТЛО УВІМКНУТЬ ЧЕРЕЗ {minutes} ХВ!* 🎉\n\n"
+            "Планове *увімкнення* о {end} для черги {queue}."),
+        'late_note': "\n\n⏱ _Нагадування затримано на {minutes} хв: бот був недоступний._",
+        'chart_caption': "📊 *ГРАФІК НА {date}*\n\nЧерга *{queue}*, без світла: {intervals}",
+    },
+    'en': {
+        'current_offline': (
+            "🚨 *ATTENTION! POWER IS OFF NOW!* 🚨\n\n"
+            "Your queue *{queue}* is disconnected right now.\n"
+            "⏰ Power returns at *{end}*"),
+        'initial_off': (
+            "🚨 *SCHEDULE UPDATE! OUTAGE:* 🚨\n\n"
+            "Your queue *{queue}* will be disconnected at *{start}* (until *{end}*).\n"
+            "⏰ Reminder at {alert_time}."),
+        'final_off': (
+            "⚡️ *POWER GOES OFF IN {minutes} MIN!* 📢\n\n"
+            "Scheduled *outage* {start}–{end} for queue {queue}."),
+        'initial_on': (
+            "💡 *SCHEDULE UPDATE! POWER BACK:* 💡\n\n"
+            "Your queue *{queue}* will be reconnected at *{end}*.\n"
+            "⏰ Reminder at {alert_time}."),
+        'final_on': (
+            "💡 *POWER RETURNS IN {minutes} MIN!* 🎉\n\n"
+            "Scheduled *reconnection* at {end} for queue {queue}."),
+        'late_note': "\n\n⏱ _Reminder delayed by {minutes} min: the bot was unavailable._",
+        'chart_caption': "📊 *SCHEDULE FOR {date}*\n\nQueue *{queue}*, no power: {intervals}",
+    },
+}
+LOCALES = tuple(TEMPLATES)
+
+
+def escape_markdown(text: str) -> str:
+    """Экранирует произвольный текст для MarkdownV2."""
+    return ''.join('\\' + char if char in _SPECIAL else char for char in str(text))
+
+
+def _escape_literal(text: str) -> str:
+    """Экранирует текст шаблона, оставляя разметку (*, _) как есть."""
+    return ''.join('\\' + char if char in _SPECIAL and char not in _MARKUP else char
+                   for char in text)
+
+
+class Template:
+    """
+    Скомпилированный шаблон: последовательность готовых (уже экранированных)
+    кусков текста и имён полей. При рендере экранируются только значения.
+    """
+
+    __slots__ = ('kind', 'parts')
+
+    def __init__(self, kind: str, source: str):
+        self.kind = kind
+        parts = []
+        for index, piece in enumerate(_FIELD_RE.split(source)):
+            # split с группой: чётные элементы — текст, нечётные — имена полей
+            if index % 2:
+                parts.append((True, piece))
+            elif piece:
+                parts.append((False, _escape_literal(piece)))
+        self.parts = tuple(parts)
+
+    def render(self, values: dict) -> str:
+        return ''.join(escape_markdown(values[text]) if is_field else text
+                       for is_field, text in self.parts)
+
+
+class TemplateCatalog:
+    """
+    Каталог шаблонов всех языков, компилируется один раз. Готовые тексты
+    кешируются по (язык, вид, значения полей) — то есть по очереди, периоду
+    и виду сообщения, — поэтому одно и то же сообщение для тысяч чатов или
+    повторных ревизий строится один раз.
+    """
+
+    def __init__(self, templates: dict = TEMPLATES, cache_size: int = constants.TEMPLATE_CACHE_SIZE):
+        self.templates = {locale: {kind: Template(kind, source) for kind, source in kinds.items()}
+                          for locale, kinds in templates.items()}
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.renders = 0
+        self.hits = 0
+
+    def template(self, locale: str, kind: str) -> Template:
+        kinds = self.templates.get(locale)
+        if kinds is None:
+            logger.warning(f"Язык {locale} не поддерживается, используется {DEFAULT_LOCALE}")
+            kinds = self.templates[DEFAULT_LOCALE]
+        return kinds[kind]
+
+    def render(self, locale: str, kind: str, **values) -> str:
+        key = (locale, kind, tuple(sorted(values.items())))
+        text = self._cache.get(key)
+        if text is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return text
+        text = self.template(locale, kind).render(values)
+        self.renders += 1
+        self._cache[key] = text
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return text
+
+    def format_status(self) -> str:
+        return (f"Шаблоны сообщений: в кеше {len(self._cache)}, "
+                f"построено {self.renders}, из кеша {self.hits}")
+
+
+# общий каталог: все построители (личный чат, каналы очередей) делят кеш
+CATALOG = TemplateCatalog()
@@ -0,0 +1,221 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from logger import logger
+import constants
+
+STATUS_SCHEDULED = 'scheduled'  # финальное напоминание ждёт своего времени
+STATUS_PENDING = 'pending'      # ждёт отправки / повторной попытки
+STATUS_SENT = 'sent'
+STATUS_DROPPED = 'dropped'      # устарело или отменено
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    alert_key TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    due_ts REAL,
+    deadline_ts REAL,
+    meta TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_ts REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_ts REAL NOT NULL,
+    updated_ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, next_attempt_ts);
+"""
+
+
+class CircuitBreaker:
+    """
+    Размыкатель: после серии ошибок подряд перестаёт пускать запросы на
+    cooldown секунд, затем пропускает одну пробную попытку.
+    """
+
+    def __init__(self, failure_threshold: int = constants.BREAKER_FAILURE_THRESHOLD,
+                 cooldown: float = constants.BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return time.time() < self.open_until
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.time()
+            if now < self.open_until:
+                return False
+            if self.consecutive_failures >= self.failure_threshold:
+                # полуоткрытое состояние: одна попытка, остальные ждут
+                self.open_until = now + self.cooldown
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures == self.failure_threshold:
+                self.trips += 1
+                self.open_until = time.time() + self.cooldown
+                logger.warning(
+                    f"Bot API недоступен: {self.consecutive_failures} ошибок подряд, "
+                    f"пауза {self.cooldown} сек")
+
+
+class Outbox:
+    """
+    Персистентный outbox (SQLite): каждое оповещение записывается до отправки
+    и помечается отправленным после успеха. Идентификатор записи уникален,
+    поэтому повторная постановка того же оповещения не создаёт дубликат.
+    """
+
+    def __init__(self, path: str = constants.OUTBOX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # соединение используется из потока отправки, доступ под замком
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def add(self, outbox_id: str, alert_key: str, chat_id: str, text: str, priority: int,
+            status: str = STATUS_PENDING, due_ts: float = None, deadline_ts: float = None,
+            meta: dict = None) -> bool:
+        """
+        Записывает оповещение. Возвращает False, если запись с таким id уже
+        есть и не была отменена (дубликат).
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status FROM outbox WHERE id = ?', (outbox_id,)).fetchone()
+            if row is not None and row[0] != STATUS_DROPPED:
+                return False
+            self._conn.execute(
+                'INSERT OR REPLACE INTO outbox (id, alert_key, chat_id, text, priority, status, '
+                'due_ts, deadline_ts, meta, attempts, next_attempt_ts, created_ts, updated_ts) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0, ?, ?)',
+                (outbox_id, alert_key, str(chat_id), text, priority, status,
+                 due_ts, deadline_ts, json.dumps(meta) if meta else None, now, now))
+        return True
+
+    def status(self, outbox_id: str) -> str | None:
+        rows = self._execute('SELECT status FROM outbox WHERE id = ?', (outbox_id,))
+        return rows[0][0] if rows else None
+
+    def mark_pending(self, outbox_id: str, text: str = None):
+        if text is None:
+            self._execute("UPDATE outbox SET status = ?, updated_ts = ? WHERE id = ? AND status = ?",
+                          (STATUS_PENDING, time.time(), outbox_id, STATUS_SCHEDULED))
+        else:
+            self._execute("UPDATE outbox SET status = ?, text = ?, updated_ts = ? "
+                          "WHERE id = ? AND status = ?",
+                          (STATUS_PENDING, text, time.time(), outbox_id, STATUS_SCHEDULED))
+
+    def reschedule(self, outbox_id: str, due_ts: float, text: str):
+        """Новый срок и текст запланированного (ещё не сработавшего) напоминания."""
+        self._execute("UPDATE outbox SET due_ts = ?, text = ?, updated_ts = ? "
+                      "WHERE id = ? AND status = ?",
+                      (due_ts, text, time.time(), outbox_id, STATUS_SCHEDULED))
+
+    def mark_sent(self, outbox_id: str):
+        self._execute('UPDATE outbox SET status = ?, updated_ts = ? WHERE id = ?',
+                      (STATUS_SENT, time.time(), outbox_id))
+
+    def mark_dropped(self, outbox_id: str, reason: str = ''):
+        self._execute('UPDATE outbox SET status = ?, last_error = ?, updated_ts = ? WHERE id = ?',
+                      (STATUS_DROPPED, reason, time.time(), outbox_id))
+
+    def mark_failed(self, outbox_id: str, error: str) -> float:
+        """Фиксирует неудачную попытку и назначает следующую (джиттер). Возвращает её время."""
+        with self._lock:
+            row = self._conn.execute('SELECT attempts FROM outbox WHERE id = ?',
+                                     (outbox_id,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            delay = min(constants.OUTBOX_RETRY_MAX,
+                        constants.OUTBOX_RETRY_BASE * (2 ** (attempts - 1)))
+            next_ts = time.time() + random.uniform(delay / 2, delay * 1.5)
+            self._conn.execute(
+                'UPDATE outbox SET status = ?, attempts = ?, next_attempt_ts = ?, last_error = ?, '
+                'updated_ts = ? WHERE id = ?',
+                (STATUS_PENDING, attempts, next_ts, error, time.time(), outbox_id))
+        return next_ts
+
+    @staticmethod
+    def _chat_filter(chat_id, params: tuple) -> tuple[str, tuple]:
+        """Условие по чату: None — записи всех чатов."""
+        if chat_id is None:
+            return '', params
+        return ' AND chat_id = ?', params + (str(chat_id),)
+
+    def cancel_matching(self, fragment: str, chat_id=None):
+        """
+        Снимает записи, ключ которых содержит fragment (дату): неотправленные
+        отменяются, а отправленные перестают блокировать повторную отправку
+        после изменения графика.
+        """
+        where, params = self._chat_filter(
+            chat_id, (STATUS_DROPPED, time.time(), STATUS_DROPPED, f"%{fragment}%"))
+        self._execute("UPDATE outbox SET status = ?, last_error = 'cancelled', updated_ts = ? "
+                      "WHERE status != ? AND alert_key LIKE ?" + where, params)
+
+    def cancel_key(self, alert_key: str, chat_id=None):
+        where, params = self._chat_filter(
+            chat_id, (STATUS_DROPPED, time.time(), STATUS_SCHEDULED, STATUS_PENDING, alert_key))
+        self._execute("UPDATE outbox SET status = ?, last_error = 'cancelled', updated_ts = ? "
+                      "WHERE status IN (?, ?) AND alert_key = ?" + where, params)
+
+    def due_retries(self, now: float, chat_id=None) -> list[tuple]:
+        """Записи pending, у которых наступило время повторной попытки."""
+        where, params = self._chat_filter(chat_id, (STATUS_PENDING, now))
+        return self._execute(
+            'SELECT id, alert_key, text, priority, due_ts, deadline_ts, meta FROM outbox '
+            'WHERE status = ? AND attempts > 0 AND next_attempt_ts <= ?' + where +
+            ' ORDER BY priority, created_ts', params)
+
+    def unfinished(self, chat_id=None) -> list[tuple]:
+        """Все незавершённые записи (для восстановления после перезапуска)."""
+        where, params = self._chat_filter(chat_id, (STATUS_SCHEDULED, STATUS_PENDING))
+        return self._execute(
+            'SELECT id, alert_key, text, priority, status, due_ts, deadline_ts, meta FROM outbox '
+            'WHERE status IN (?, ?)' + where + ' ORDER BY priority, created_ts', params)
+
+    def sent_since(self, since_ts: float, chat_id=None) -> list[tuple]:
+        """(id, alert_key) отправленных записей начиная с since_ts."""
+        where, params = self._chat_filter(chat_id, (STATUS_SENT, since_ts))
+        return self._execute('SELECT id, alert_key FROM outbox WHERE status = ? '
+                             'AND updated_ts >= ?' + where, params)
+
+    def purge(self, older_than_ts: float):
+        self._execute('DELETE FROM outbox WHERE status IN (?, ?) AND updated_ts < ?',
+                      (STATUS_SENT, STATUS_DROPPED, older_than_ts))
+
+    def counts(self) -> dict:
+        return dict(self._execute('SELECT status, COUNT(*) FROM outbox GROUP BY status'))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,157 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from logger import logger
+
+DEFAULT_SAMPLE_INTERVAL = 0.005  # секунды между сэмплами
+MAX_STACK_DEPTH = 64
+TRACEMALLOC_FRAMES = 10
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий CPU-профайлер: фоновый поток периодически снимает стек
+    целевого потока через sys._current_frames(). Когда выключен — потока
+    нет и никаких хуков не установлено, накладные расходы нулевые.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+        self.target_thread_id = None
+        self.interval = DEFAULT_SAMPLE_INTERVAL
+        self.samples = 0
+        self.self_counts = Counter()   # функция на вершине стека
+        self.total_counts = Counter()  # функция где-либо в стеке
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, thread_id: int = None, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        if self.running:
+            return
+        self.target_thread_id = thread_id or threading.main_thread().ident
+        self.interval = interval
+        self.samples = 0
+        self.self_counts.clear()
+        self.total_counts.clear()
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        logger.info(f"Профилирование CPU запущено (интервал {interval * 1000:.0f} мс)")
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.stopped_at = time.time()
+        logger.info(f"Профилирование CPU остановлено ({self.samples} сэмплов)")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.self_counts[_frame_label(frame.f_code)] += 1
+            seen = set()
+            depth = 0
+            while frame is not None and depth < MAX_STACK_DEPTH:
+                label = _frame_label(frame.f_code)
+                if label not in seen:
+                    seen.add(label)
+                    self.total_counts[label] += 1
+                frame = frame.f_back
+                depth += 1
+
+    def report(self, top: int = 20) -> str:
+        if not self.samples:
+            return "Нет сэмплов CPU-профиля."
+        duration = (self.stopped_at or time.time()) - self.started_at
+        lines = [
+            f"CPU-профиль: {self.samples} сэмплов за {duration:.1f} сек "
+            f"(интервал {self.interval * 1000:.0f} мс)",
+            "",
+            f"Топ-{top} по собственному времени:",
+        ]
+        for label, count in self.self_counts.most_common(top):
+            lines.append(f"{count / self.samples * 100:6.1f}%  {label}")
+        lines.append("")
+        lines.append(f"Топ-{top} по суммарному времени (включая вызовы):")
+        for label, count in self.total_counts.most_common(top):
+            lines.append(f"{count / self.samples * 100:6.1f}%  {label}")
+        return "\n".join(lines)
+
+
+class MemoryProfiler:
+    """Снимки tracemalloc по команде. Пока трассировка выключена — накладных расходов нет."""
+
+    def __init__(self):
+        self.baseline = None
+        self.started_by_us = False
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = TRACEMALLOC_FRAMES):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self.started_by_us = True
+        self.baseline = tracemalloc.take_snapshot()
+        logger.info("Трассировка памяти (tracemalloc) запущена")
+
+    def stop(self):
+        if self.started_by_us and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.started_by_us = False
+        self.baseline = None
+        logger.info("Трассировка памяти остановлена")
+
+    @staticmethod
+    def _filtered(snapshot):
+        return snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+
+    def report(self, top: int = 20) -> str:
+        """Топ мест выделения памяти и прирост с момента start."""
+        if not tracemalloc.is_tracing():
+            return "Трассировка памяти не запущена. /mem start"
+        snapshot = self._filtered(tracemalloc.take_snapshot())
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"Память (tracemalloc): сейчас {current / 1024 / 1024:.1f} МБ, "
+            f"пик {peak / 1024 / 1024:.1f} МБ",
+            "",
+            f"Топ-{top} мест выделения:",
+        ]
+        for stat in snapshot.statistics('lineno')[:top]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size / 1024:9.1f} КБ  {stat.count:7d} шт  "
+                         f"{os.path.basename(frame.filename)}:{frame.lineno}")
+        if self.baseline is not None:
+            lines.append("")
+            lines.append(f"Топ-{top} по приросту с начала трассировки:")
+            diff = snapshot.compare_to(self._filtered(self.baseline), 'lineno')
+            for stat in diff[:top]:
+                frame = stat.traceback[0]
+                lines.append(f"{stat.size_diff / 1024:+9.1f} КБ  {stat.count_diff:+7d} шт  "
+                             f"{os.path.basename(frame.filename)}:{frame.lineno}")
+        return "\n".join(lines)
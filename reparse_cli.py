@@ -0,0 +1,239 @@
+"""
+Офлайн-перепарсинг экспорта канала (Telegram Desktop, result.json).
+
+Пример:
+    python reparse_cli.py result.json -o results.jsonl --previous old.jsonl --diff diff.jsonl
+
+Экспорт читается потоково (память не зависит от размера файла), сообщения
+парсятся DateParser и ScheduleParser в пуле процессов. Результаты пишутся
+построчно в JSONL в порядке сообщений; при --previous строится diff
+с прошлым прогоном (оба файла упорядочены по id сообщения).
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+READ_CHUNK_SIZE = 1 << 20        # байт за одно чтение файла
+MAX_OBJECT_SIZE = 64 << 20       # защита от битого экспорта
+DEFAULT_BATCH_SIZE = 500         # сообщений в одной задаче пула
+IN_FLIGHT_PER_WORKER = 4         # задач в очереди на процесс
+
+_MESSAGES_KEY = re.compile(r'"messages"\s*:\s*\[')
+_date_parser = None
+_schedule_parser = None
+
+
+def iter_export_messages(path: str):
+    """
+    Потоково отдаёт объекты из массива "messages" экспорта Telegram,
+    не загружая файл целиком.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        # ищем начало массива сообщений
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            buffer += chunk
+            match = _MESSAGES_KEY.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+            buffer = buffer[-32:]  # ключ мог разорваться между чанками
+
+        pos = 0
+        eof = False
+        while True:
+            # пропускаем пробелы и запятые между элементами
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                if pos >= len(buffer):
+                    raise ValueError('empty buffer')
+                obj, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if eof:
+                    raise ValueError(f"Обрыв экспорта в позиции {pos}")
+                if len(buffer) - pos > MAX_OBJECT_SIZE:
+                    raise ValueError("Слишком большой объект в экспорте")
+                chunk = f.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield obj
+            pos = end
+
+
+def message_text(message: dict) -> str:
+    """Склеивает текст сообщения экспорта (строка или список фрагментов)."""
+    text = message.get('text', '')
+    if isinstance(text, str):
+        return text
+    return ''.join(part if isinstance(part, str) else part.get('text', '')
+                   for part in text)
+
+
+def _init_worker():
+    global _date_parser, _schedule_parser
+    # импорт внутри процесса: логгер пишет в файл, поэтому глушим INFO
+    from date_parser import DateParser
+    from schedule_parser import ScheduleParser
+    logging.getLogger('power_alert').setLevel(logging.WARNING)
+    _date_parser = DateParser()
+    _schedule_parser = ScheduleParser('')
+
+
+def _parse_batch(batch: list[tuple[int, str, str]]) -> list[dict]:
+    """Парсит пачку (id, дата сообщения, текст) в процессе пула."""
+    results = []
+    for message_id, message_date, text in batch:
+        result = {'id': message_id, 'date': message_date,
+                  'schedule_date': None, 'update_dt': None, 'queues': {}}
+        # без даты в тексте DateParser подставляет «сегодня» — для
+        # воспроизводимости между прогонами такие сообщения не датируем
+        if _date_parser.date_pattern.search(text):
+            schedule_date, update_dt = _date_parser.parse_date(text)
+            result['schedule_date'] = schedule_date.isoformat()
+            result['update_dt'] = update_dt.isoformat() if update_dt else None
+            _schedule_parser.set_schedule_date(schedule_date)
+        queue_periods = _schedule_parser.parse_all(text)
+        result['queues'] = {
+            queue: [f"{start}-{end}" for start, end, _ in periods]
+            for queue, periods in queue_periods.items()
+        }
+        results.append(result)
+    return results
+
+
+def _batches(path: str, batch_size: int):
+    batch = []
+    for message in iter_export_messages(path):
+        if message.get('type', 'message') != 'message':
+            continue
+        text = message_text(message)
+        if not text:
+            continue
+        batch.append((message.get('id'), message.get('date'), text))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_export(path: str, workers: int, batch_size: int):
+    """
+    Отдаёт результаты парсинга в исходном порядке. В работе одновременно
+    не больше workers * IN_FLIGHT_PER_WORKER пачек — память ограничена.
+    """
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = deque()
+        for batch in _batches(path, batch_size):
+            pending.append(pool.submit(_parse_batch, batch))
+            if len(pending) >= max_in_flight:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _iter_jsonl(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _comparable(result: dict) -> tuple:
+    return result.get('schedule_date'), result.get('update_dt'), result.get('queues')
+
+
+class RunDiff:
+    """Потоковое сравнение с прошлым прогоном (merge-join по id)."""
+
+    def __init__(self, previous_path: str, out):
+        self.previous = _iter_jsonl(previous_path)
+        self.current_prev = next(self.previous, None)
+        self.out = out
+        self.counts = {'added': 0, 'removed': 0, 'changed': 0}
+
+    def _emit(self, change: str, message_id, old, new):
+        self.counts[change] += 1
+        self.out.write(json.dumps({'id': message_id, 'change': change, 'old': old, 'new': new},
+                                  ensure_ascii=False) + '\n')
+
+    def feed(self, result: dict):
+        while self.current_prev is not None and self.current_prev['id'] < result['id']:
+            self._emit('removed', self.current_prev['id'], self.current_prev, None)
+            self.current_prev = next(self.previous, None)
+        if self.current_prev is not None and self.current_prev['id'] == result['id']:
+            if _comparable(self.current_prev) != _comparable(result):
+                self._emit('changed', result['id'], self.current_prev, result)
+            self.current_prev = next(self.previous, None)
+        else:
+            self._emit('added', result['id'], None, result)
+
+    def finish(self):
+        while self.current_prev is not None:
+            self._emit('removed', self.current_prev['id'], self.current_prev, None)
+            self.current_prev = next(self.previous, None)
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(
+        description="Перепарсинг JSON-экспорта Telegram-канала текущими паттернами")
+    arg_parser.add_argument('export', help="путь к result.json экспорта канала")
+    arg_parser.add_argument('-o', '--output', default='reparse_results.jsonl',
+                            help="куда писать результаты (JSONL)")
+    arg_parser.add_argument('--previous', help="результаты прошлого прогона для сравнения")
+    arg_parser.add_argument('--diff', default='reparse_diff.jsonl',
+                            help="куда писать отличия от прошлого прогона")
+    arg_parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1)
+    arg_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = arg_parser.parse_args(argv)
+
+    if args.previous and os.path.abspath(args.previous) == os.path.abspath(args.output):
+        print("Ошибка: --previous и --output не должны совпадать", file=sys.stderr)
+        return 2
+
+    started = time.perf_counter()
+    total = with_schedule = 0
+    diff_out = open(args.diff, 'w', encoding='utf-8') if args.previous else None
+    try:
+        diff = RunDiff(args.previous, diff_out) if args.previous else None
+        with open(args.output, 'w', encoding='utf-8') as out:
+            for result in parse_export(args.export, args.workers, args.batch_size):
+                total += 1
+                if result['queues']:
+                    with_schedule += 1
+                out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                if diff:
+                    diff.feed(result)
+        if diff:
+            diff.finish()
+    finally:
+        if diff_out:
+            diff_out.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Сообщений: {total}, с графиком: {with_schedule}, "
+          f"время: {elapsed:.1f} сек ({total / max(elapsed, 1e-9):.0f} сообщ/сек)")
+    if diff:
+        print("Отличия от прошлого прогона: " +
+              ", ".join(f"{k}={v}" for k, v in diff.counts.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
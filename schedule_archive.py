@@ -0,0 +1,107 @@
+import os
+from datetime import date, datetime
+from logger import logger
+import constants
+
+
+def periods_to_mask(periods) -> int:
+    """
+    Упаковывает периоды [(начало, конец, дата), ...] в 24-битную маску часов.
+    Бит N установлен, если в час N света нет. Конец '00:00' считается полночью (24).
+    """
+    mask = 0
+    for period_start, period_end, *_ in periods:
+        start_hour = int(period_start.split(':', 1)[0])
+        end_hour = int(period_end.split(':', 1)[0])
+        if end_hour <= start_hour:
+            end_hour = constants.HOURS_PER_DAY
+        for hour in range(start_hour, min(end_hour, constants.HOURS_PER_DAY)):
+            mask |= 1 << hour
+    return mask
+
+
+class ScheduleArchive:
+    """
+    Append-only архив всех распарсенных версий графиков.
+
+    Формат строки файла: 'YYYY-MM-DD;очередь;update_ts;маска_часов'.
+    В памяти хранится индекс последней версии по (очередь, дата).
+    """
+
+    def __init__(self, path: str = constants.ARCHIVE_PATH):
+        self.path = path
+        self.latest = {}     # queue -> {date.toordinal(): (update_ts, mask)}
+        self.versions = {}   # queue -> счётчик изменений (для инвалидации кешей)
+        self._load()
+
+    def _load(self):
+        """Загружает архив с диска и строит индекс последних версий."""
+        if not os.path.exists(self.path):
+            return
+        loaded = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    day_str, queue, update_ts, mask = line.rstrip('\n').split(';')
+                    day = date.fromisoformat(day_str).toordinal()
+                    self._index(day, queue, int(update_ts), int(mask))
+                    loaded += 1
+                except ValueError:
+                    logger.debug(f"Пропускаю повреждённую строку архива: {line!r}")
+        logger.info(f"✓ Архив графиков загружен: {loaded} версий")
+
+    def _index(self, day: int, queue: str, update_ts: int, mask: int):
+        days = self.latest.setdefault(queue, {})
+        prev = days.get(day)
+        # более ранняя ревизия не должна затирать более позднюю
+        if prev is not None and update_ts and update_ts < prev[0]:
+            return
+        days[day] = (update_ts, mask)
+        self.versions[queue] = self.versions.get(queue, 0) + 1
+
+    def record(self, schedule_date, update_dt: datetime | None,
+               queue_periods: dict[str, list]) -> int:
+        """
+        Сохраняет версию графика для всех очередей сообщения.
+        Пишет только очереди, у которых маска изменилась. Возвращает число записей.
+        """
+        if isinstance(schedule_date, datetime):
+            schedule_date = schedule_date.date()
+        day = schedule_date.toordinal()
+        update_ts = int(update_dt.timestamp()) if update_dt else 0
+
+        lines = []
+        for queue, periods in queue_periods.items():
+            mask = periods_to_mask(periods)
+            prev = self.latest.get(queue, {}).get(day)
+            if prev is not None and prev[1] == mask:
+                continue
+            if prev is not None and update_ts and update_ts < prev[0]:
+                continue
+            self._index(day, queue, update_ts, mask)
+            lines.append(
+                f"{schedule_date.isoformat()};{queue};{update_ts};{mask}\n")
+
+        if not lines:
+            return 0
+
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+            logger.debug(
+                f"В архив записано {len(lines)} версий для {schedule_date}")
+        except OSError as e:
+            logger.error(f"Ошибка записи архива графиков: {e}")
+        return len(lines)
+
+    def queues(self) -> list[str]:
+        """Все очереди, встречавшиеся в архиве."""
+        return sorted(self.latest)
+
+    def latest_for_queue(self, queue: str) -> tuple[list[int], list[int]]:
+        """Возвращает (ordinal-даты, маски) последних версий очереди."""
+        days = self.latest.get(queue, {})
+        return list(days), [mask for _, mask in days.values()]
@@ -0,0 +1,393 @@
+import time
+from datetime import datetime
+from alert_plan import compile_plans, load_timezone
+from schedule_store import schedule_fingerprint
+from day_grid import DayGrid, format_diff
+from tracing import STAGE_PARSED, STAGE_PLANNED
+from delivery_queue import PRIORITY_CURRENT, PRIORITY_ANNOUNCE, PRIORITY_INFO
+from logger import logger
+import constants
+
+
+class ScheduleIngestor:
+    """Обрабатывает сообщения канала: парсинг, сохранение графиков и планирование оповещений."""
+
+    def __init__(self, parser, date_parser, builder, alert_manager,
+                 alert_config, archive, store, last_schedule_updates: dict,
+                 tracer=None, transitions=None, charts=None, broadcaster=None,
+                 shadow=None):
+        self.parser = parser
+        self.date_parser = date_parser
+        self.builder = builder
+        self.alert_manager = alert_manager
+        self.alert_config = alert_config
+        self.archive = archive
+        self.store = store
+        self.last_schedule_updates = last_schedule_updates
+        self.tracer = tracer
+        self.transitions = transitions  # transition_index.TransitionIndex
+        self.charts = charts  # chart_renderer.ChartCache
+        self.broadcaster = broadcaster  # broadcast.Broadcaster — каналы очередей
+        self.shadow = shadow  # shadow_parser.ShadowParser — сравнение с кандидатом
+        self.tz = load_timezone(alert_config.timezone)
+        self.plans = {}  # date_key -> tuple[AlertPlan, ...] целевой очереди
+        self.fingerprints = {}  # date_key -> отпечаток графика целевой очереди
+        self.grids = {}  # date_key -> DayGrid последней ревизии (все очереди)
+
+    async def process_messages(self, messages, fetched_ts: float = None):
+        """Обрабатывает пачку сообщений (как пришли из get_recent_messages)."""
+        for message in messages:
+            if not message.message:
+                continue
+            self._shadow(message.message, message.id)
+            await self.handle_message(message.message, message.id,
+                                      _message_ts(message), fetched_ts)
+
+    async def handle_message(self, text: str, message_id=None,
+                             posted_ts: float = None, fetched_ts: float = None) -> bool:
+        """
+        Обрабатывает одно сообщение канала.
+        Возвращает True, если сообщение содержало график целевой очереди.
+        posted_ts / fetched_ts — моменты публикации и получения (для трассировки).
+        """
+        schedule_date, update_dt = self.date_parser.parse_date(text)
+        date_key = schedule_date.strftime('%d.%m.%Y')
+
+        prev_update = self.last_schedule_updates.get(date_key)
+
+        if update_dt is None and prev_update is not None:
+            logger.debug(
+                f"Пропускаю сообщение без времени обновления для {date_key}")
+            return False
+
+        if update_dt is not None and prev_update is not None and update_dt <= prev_update:
+            logger.debug(
+                f"Пропускаю старое обновление для {date_key}")
+            return False
+
+        is_revision = prev_update is not None and (
+            update_dt is None or update_dt > prev_update)
+
+        self.last_schedule_updates[date_key] = update_dt or datetime.now(
+        )
+
+        trace_id = self.tracer.begin(message_id, posted_ts, fetched_ts) if self.tracer else None
+        try:
+            return await self._apply_schedule(text, schedule_date, update_dt, date_key,
+                                              is_revision, message_id, trace_id)
+        finally:
+            if self.tracer:
+                self.tracer.finish(trace_id, message_id=message_id, date=date_key,
+                                   queue=self.parser.target_queue)
+
+    def _shadow(self, text: str, message_id):
+        """
+        Теневой разбор каждого нового сообщения — до проверки свежести по
+        рабочему DateParser, чтобы кандидат видел и отброшенные им ревизии.
+        """
+        if self.shadow is not None:
+            self.shadow.submit(text, message_id)
+
+    def _mark(self, trace_id, stage: str):
+        if self.tracer:
+            self.tracer.mark(trace_id, stage)
+
+    async def _apply_schedule(self, text: str, schedule_date, update_dt, date_key: str,
+                              is_revision: bool, message_id, trace_id) -> bool:
+        """Парсит ревизию графика и (пере)планирует оповещения целевой очереди."""
+        self.parser.set_schedule_date(schedule_date)
+        queue_periods = self.parser.parse_all(text)
+        periods = self.parser.parse(text)
+        self._mark(trace_id, STAGE_PARSED)
+        if queue_periods:
+            self._update_grid(date_key, schedule_date, queue_periods)
+        self.archive.record(schedule_date, update_dt, queue_periods)
+        changed = self.store.update(schedule_date, queue_periods)
+        if self.transitions is not None and changed:
+            self.transitions.update(schedule_date, {
+                queue: self.store.periods_for(queue, schedule_date) for queue in changed})
+        if self.broadcaster is not None and changed:
+            await self.broadcaster.apply(schedule_date, changed)
+
+        # ревизия, не изменившая набор периодов нашей очереди (правка другой
+        # очереди, опечатка в заголовке), не трогает таймеры и ничего не шлёт
+        fingerprint = schedule_fingerprint(periods)
+        if is_revision:
+            if self.fingerprints.get(date_key) == fingerprint:
+                logger.info(
+                    f"Обновление графика для {date_key} не затрагивает очередь "
+                    f"{self.parser.target_queue}. Планы сохранены.")
+                return False
+            logger.info(
+                f"Новое обновление графика для {date_key}. Отменяю старые планы.")
+            self.alert_manager.cancel_planned_for_date(date_key)
+        self.fingerprints[date_key] = fingerprint
+
+        # строки и часовые пояса разбираются один раз на ревизию графика
+        plans = compile_plans(
+            periods, self.tz,
+            self.alert_config.alert_minutes_before_off,
+            self.alert_config.alert_minutes_before_on) if periods else ()
+
+        if not is_revision:
+            # первый график даты после запуска: напоминания, восстановленные
+            # из outbox по графику, который сменился за время простоя, снимаются
+            self.alert_manager.cancel_stale_for_date(
+                date_key, {key for plan in plans for key in (plan.off_key, plan.on_key)})
+
+        if not periods:
+            self.plans.pop(date_key, None)
+            return False
+
+        logger.info(
+            f"Найден график на {date_key} (ID: {message_id})")
+        self.plans[date_key] = plans
+        await self._announce(date_key, plans, periods, fingerprint, trace_id)
+        return True
+
+    async def _announce(self, date_key: str, plans, periods, fingerprint: str, trace_id=None):
+        """Объявления и напоминания целевой очереди по скомпилированным планам даты."""
+        now_ts = time.time()
+        await announce_plans(self.alert_manager, self.builder, plans, now_ts)
+        self._mark(trace_id, STAGE_PLANNED)
+        if self.charts is not None and plans[-1].on_ts > now_ts:
+            self.alert_manager.dispatch_chart(
+                self.charts, self.parser.target_queue, periods,
+                self.builder.chart_caption(date_key, periods), PRIORITY_INFO,
+                alert_key=f"CHART_{date_key}_{fingerprint}", deadline_ts=plans[-1].on_ts)
+        if self.tracer:
+            for plan in plans:
+                if plan.off_key in self.alert_manager.planned_alerts:
+                    self.tracer.link(plan.off_key, trace_id, plan.off_alert_ts)
+                if plan.on_key in self.alert_manager.planned_alerts:
+                    self.tracer.link(plan.on_key, trace_id, plan.on_alert_ts)
+
+    def retime(self) -> int:
+        """
+        Применяет изменившиеся ALERT_OFF_MINUTES / ALERT_ON_MINUTES: планы
+        перекомпилируются из уже разобранных периодов, а ещё не сработавшие
+        напоминания переносятся на месте. Канал не опрашивается, объявления
+        не повторяются. Возвращает число перенесённых напоминаний.
+        """
+        off_minutes = self.alert_config.alert_minutes_before_off
+        on_minutes = self.alert_config.alert_minutes_before_on
+        self.builder.alert_off_minutes = off_minutes
+        self.builder.alert_on_minutes = on_minutes
+        now_ts = time.time()
+        moved = 0
+        for date_key, old_plans in self.plans.items():
+            day = datetime.strptime(date_key, '%d.%m.%Y').date()
+            plans = compile_plans(
+                [(plan.period_start, plan.period_end, day) for plan in old_plans],
+                self.tz, off_minutes, on_minutes)
+            self.plans[date_key] = plans
+            moved += retime_plans(self.alert_manager, self.builder, old_plans, plans, now_ts)
+        if self.broadcaster is not None:
+            moved += self.broadcaster.retime()
+        logger.info(f"Напоминания перенесены: {moved} (за {off_minutes} мин до отключения, "
+                    f"за {on_minutes} мин до включения)")
+        return moved
+
+    async def switch_queue(self, queue: str) -> int:
+        """
+        Переключает целевую очередь на уже разобранный график (ScheduleStore):
+        напоминания прежней очереди снимаются, новой — планируются и
+        объявляются один раз. Канал не опрашивается. Возвращает число дат с графиком.
+        """
+        if queue == self.parser.target_queue:
+            return len(self.plans)
+        logger.info(f"Смена очереди {self.parser.target_queue} -> {queue}")
+        self.parser.target_queue = queue
+        self.builder.target_queue = queue
+        self.alert_config.target_queue = queue
+
+        today = datetime.now().date()
+        days = {datetime.strptime(key, '%d.%m.%Y').date() for key in self.plans}
+        days.update(day for day in self.store.days(queue) if day >= today)
+        planned = 0
+        for day in sorted(days):
+            date_key = day.strftime('%d.%m.%Y')
+            self.alert_manager.cancel_planned_for_date(date_key)
+            periods = self.store.periods_for(queue, day)
+            fingerprint = schedule_fingerprint(periods)
+            self.fingerprints[date_key] = fingerprint
+            if not periods:
+                self.plans.pop(date_key, None)
+                continue
+            plans = compile_plans(
+                periods, self.tz,
+                self.alert_config.alert_minutes_before_off,
+                self.alert_config.alert_minutes_before_on)
+            self.plans[date_key] = plans
+            await self._announce(date_key, plans, periods, fingerprint)
+            planned += 1
+        return planned
+
+    def _update_grid(self, date_key: str, schedule_date, queue_periods: dict):
+        grid = DayGrid.from_periods(schedule_date, queue_periods)
+        previous = self.grids.get(date_key)
+        if previous is not None:
+            changes = previous.diff(grid)
+            if changes:
+                logger.info(f"Изменения графика на {date_key}: {format_diff(changes)}")
+        self.grids[date_key] = grid
+
+    def prune(self, today=None):
+        """Забывает планы и отпечатки прошедших дат."""
+        today = today or datetime.now().date()
+        for date_key in list(self.fingerprints):
+            if datetime.strptime(date_key, '%d.%m.%Y').date() < today:
+                self.fingerprints.pop(date_key, None)
+                self.plans.pop(date_key, None)
+        for date_key in list(self.grids):
+            if self.grids[date_key].day < today:
+                del self.grids[date_key]
+        if self.transitions is not None:
+            self.transitions.prune(today)
+        if self.broadcaster is not None:
+            self.broadcaster.prune(today)
+
+    async def catch_up(self, history) -> int:
+        """
+        Догоняет пропущенные обновления после простоя.
+
+        history — асинхронный итератор сообщений в хронологическом порядке
+        (см. TelegramClientWrapper.iter_history). Каждое сообщение сразу
+        проходит через парсеры и попадает в архив, но для планирования
+        по каждой дате запоминается только последняя ревизия — поэтому
+        промежуточные ревизии не вызывают цикл «отмена/повторное объявление».
+        Возвращает число просмотренных сообщений.
+        """
+        latest = {}  # date_key -> (schedule_date, update_dt, text, message_id, posted_ts, fetched_ts)
+        seen = 0
+
+        async for message in history:
+            if not message.message:
+                continue
+            seen += 1
+            text = message.message
+            self._shadow(text, message.id)
+            schedule_date, update_dt = self.date_parser.parse_date(text)
+            date_key = schedule_date.strftime('%d.%m.%Y')
+
+            self.parser.set_schedule_date(schedule_date)
+            queue_periods = self.parser.parse_all(text)
+            if not queue_periods:
+                continue
+            self.archive.record(schedule_date, update_dt, queue_periods)
+
+            prev = latest.get(date_key)
+            # сообщения идут от старых к новым: более позднее без времени
+            # обновления не перекрывает ревизию с явным временем
+            if prev is not None and prev[1] is not None and (
+                    update_dt is None or update_dt < prev[1]):
+                continue
+            latest[date_key] = (schedule_date, update_dt, text, message.id,
+                                _message_ts(message), time.time())
+
+        today = datetime.now().date()
+        planned = 0
+        for date_key in sorted(latest, key=lambda k: latest[k][0]):
+            schedule_date, _, text, message_id, posted_ts, fetched_ts = latest[date_key]
+            if schedule_date < today:
+                continue
+            if await self.handle_message(text, message_id, posted_ts, fetched_ts):
+                planned += 1
+
+        logger.info(
+            f"Догрузка истории: просмотрено {seen} сообщений, "
+            f"дат с графиком: {len(latest)}, применено актуальных ревизий: {planned}")
+        return seen
+
+
+def _message_ts(message) -> float | None:
+    """Момент публикации сообщения Telethon (epoch) или None."""
+    date = getattr(message, 'date', None)
+    return date.timestamp() if date else None
+
+
+async def announce_plans(alert_manager, builder, plans, now_ts: float):
+    """Сообщение о текущем отключении (если оно идёт) и напоминания по всем планам даты."""
+    for plan in plans:
+        if not plan.is_active(now_ts):
+            continue
+        current_offline_key = f"CURRENT_OFFLINE_{plan.date_key}_{plan.period_start}_{plan.period_end}"
+        msg = builder.current_offline_message(plan.period_start, plan.period_end)
+
+        if alert_manager.dispatch(msg, PRIORITY_CURRENT, alert_key=current_offline_key,
+                                  deadline_ts=plan.on_ts):
+            logger.info(
+                "Сообщение о текущем отключении отправлено")
+        else:
+            logger.debug(
+                "Сообщение уже было отправлено ранее")
+        break
+
+    for plan in plans:
+        await process_plan(alert_manager, builder, plan, now_ts)
+
+
+def retime_plans(alert_manager, builder, old_plans, plans, now_ts: float) -> int:
+    """
+    Переносит несработавшие финальные напоминания со старых планов на
+    перекомпилированные. Новый срок, который уже прошёл, — отправка сразу
+    с точным остатком минут. Возвращает число перенесённых напоминаний.
+    """
+    moved = 0
+    for old, plan in zip(old_plans, plans):
+        period = (plan.period_start, plan.period_end)
+        if plan.off_alert_ts != old.off_alert_ts:
+            due_ts = max(plan.off_alert_ts, now_ts)
+            moved += alert_manager.retime_final(
+                'OFF', plan.off_key, due_ts,
+                builder.final_off_message(*period, int((plan.off_ts - due_ts) // 60)),
+                deadline_ts=plan.off_ts, period=period)
+        if plan.on_alert_ts != old.on_alert_ts:
+            due_ts = max(plan.on_alert_ts, now_ts)
+            moved += alert_manager.retime_final(
+                'ON', plan.on_key, due_ts,
+                builder.final_on_message(plan.period_end, int((plan.on_ts - due_ts) // 60)),
+                deadline_ts=plan.on_ts, period=period)
+    return moved
+
+
+async def process_plan(alert_manager, builder, plan, now_ts: float):
+    """Планирует оповещения одного периода по скомпилированному AlertPlan."""
+
+    if plan.off_ts < now_ts:
+        logger.debug(
+            f"Время {plan.period_start} уже прошло для даты {plan.date_key}")
+        return
+
+    # ОТКЛЮЧЕНИЕ (OFF)
+    if plan.off_alert_ts > now_ts + constants.MIN_ALERT_DELAY:
+        if plan.off_key not in alert_manager.planned_alerts:
+            msg = builder.initial_off_message(
+                plan.period_start, plan.period_end, plan.off_alert_time)
+
+            if alert_manager.dispatch(msg, PRIORITY_ANNOUNCE, alert_key=plan.off_key,
+                                      deadline_ts=plan.off_ts):
+                final_msg = builder.final_off_message(
+                    plan.period_start, plan.period_end)
+                alert_manager.schedule_final(
+                    'OFF', plan.off_alert_ts, final_msg, plan.off_key,
+                    deadline_ts=plan.off_ts, period=(plan.period_start, plan.period_end))
+
+    # ВКЛЮЧЕНИЕ (ON)
+    if plan.on_alert_ts > now_ts + constants.MIN_ALERT_DELAY:
+        if plan.on_key not in alert_manager.planned_alerts:
+            msg = builder.initial_on_message(plan.period_end, plan.on_alert_time)
+
+            if alert_manager.dispatch(msg, PRIORITY_ANNOUNCE, alert_key=plan.on_key,
+                                      deadline_ts=plan.on_ts):
+                final_msg = builder.final_on_message(plan.period_end)
+                delay = plan.on_alert_ts - now_ts
+
+                logger.info(f"Запланировано напоминание о включении в {plan.period_end} "
+                            f"(через {int(delay / 60)} мин)")
+
+                alert_manager.schedule_final(
+                    'ON', plan.on_alert_ts, final_msg, plan.on_key,
+                    deadline_ts=plan.on_ts, period=(plan.period_start, plan.period_end))
+    else:
+        logger.debug(f"Напоминание о включении {plan.period_end} уже прошло")
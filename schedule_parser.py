@@ -1,6 +1,6 @@
 import re
 from datetime import datetime
-from constants import QUEUE_PATTERN_FORMAT, TIME_PAIRS_PATTERN
+from constants import QUEUE_PATTERN_FORMAT, QUEUE_ID_PATTERN, TIME_PAIRS_PATTERN
 from logger import logger
 from validators import normalize_time
 
@@ -12,6 +12,12 @@ class ScheduleParser:
         self.target_queue = target_queue
         self.schedule_date = schedule_date or datetime.now()
 
+    # общий паттерн для всех очередей сразу (компилируется один раз)
+    all_queues_pattern = re.compile(
+        QUEUE_PATTERN_FORMAT.format(QUEUE_ID_PATTERN),
+        re.MULTILINE | re.IGNORECASE
+    )
+
     def set_schedule_date(self, schedule_date: datetime):
         """Установить дату графика."""
         self.schedule_date = schedule_date
@@ -31,17 +37,33 @@ class ScheduleParser:
             if not match:
                 return []
 
-            schedule_text = match.group(1).strip()
-            time_pairs = re.findall(TIME_PAIRS_PATTERN, schedule_text)
-
-            periods = []
-            for start_hour, end_hour in time_pairs:
-                start_time, end_time = normalize_time(start_hour, end_hour)
-                # Возвращаем также дату, на которую этот график
-                periods.append((start_time, end_time, self.schedule_date))
-
-            return periods
+            return self._parse_periods(match.group(1))
 
         except Exception as e:
             logger.error(f"Ошибка парсинга: {e}")
             return []
+
+    def parse_all(self, text: str) -> dict[str, list[tuple[str, str, datetime]]]:
+        """
+        Парсит графики ВСЕХ очередей из текста.
+        Возвращает словарь {очередь: [(начало, конец, дата_применения), ...]}.
+        """
+        result = {}
+        try:
+            for match in self.all_queues_pattern.finditer(text):
+                result[match.group(1)] = self._parse_periods(match.group(2))
+        except Exception as e:
+            logger.error(f"Ошибка парсинга всех очередей: {e}")
+        return result
+
+    def _parse_periods(self, schedule_text: str) -> list[tuple[str, str, datetime]]:
+        """Преобразует строку вида '02-04, 08-10' в список периодов."""
+        time_pairs = re.findall(TIME_PAIRS_PATTERN, schedule_text.strip())
+
+        periods = []
+        for start_hour, end_hour in time_pairs:
+            start_time, end_time = normalize_time(start_hour, end_hour)
+            # Возвращаем также дату, на которую этот график
+            periods.append((start_time, end_time, self.schedule_date))
+
+        return periods
@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import html
+import re
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+from logger import logger
+import constants
+
+_TAG_RE = re.compile(r'<(script|style)\b.*?</\1>|<[^>]+>', re.S | re.I)
+_BLOCK_RE = re.compile(r'<\s*(br|/p|/div|/li|/h\d|/tr)\b[^>]*>', re.I)
+_SPACES_RE = re.compile(r'[ \t\r\f\v]+')
+
+
+class SourceMessage:
+    """Сообщение источника в виде, который ожидает ScheduleIngestor (как у Telethon)."""
+
+    __slots__ = ('id', 'message', 'date', 'source')
+
+    def __init__(self, message_id, text: str, posted: datetime | None, source: str = ''):
+        self.id = message_id
+        self.message = text
+        self.date = posted
+        self.source = source
+
+
+def normalize_text(text: str) -> str:
+    """Ключ для сравнения одного поста из разных источников."""
+    return ' '.join(text.split()).lower()
+
+
+def html_to_text(body: str) -> str:
+    """Текст страницы без разметки; переносы строк сохраняются по блочным тегам."""
+    body = _BLOCK_RE.sub('\n', body)
+    text = html.unescape(_TAG_RE.sub('', body))
+    lines = (_SPACES_RE.sub(' ', line).strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def _parse_date(value) -> datetime | None:
+    if value is None or value == '':
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value, tz=timezone.utc)
+        posted = datetime.fromisoformat(str(value))
+        return posted if posted.tzinfo else posted.replace(tzinfo=timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+class TelegramSource:
+    """Канал Telegram через TelegramClientWrapper (нужна авторизованная сессия)."""
+
+    def __init__(self, tg_client, channel=None, limit: int = constants.MAX_HISTORY_LIMIT):
+        self.tg_client = tg_client
+        self.channel = channel  # сущность канала; обновляется после переподключения
+        self.limit = limit
+        self.name = 'telegram'
+        self.fetches = 0
+
+    async def fetch(self) -> list:
+        # таймаут не глушится: по нему главный цикл проверяет соединение
+        messages = await asyncio.wait_for(
+            self.tg_client.get_recent_messages(self.channel, limit=self.limit), timeout=15)
+        self.fetches += 1
+        return messages
+
+    def format_status(self) -> str:
+        return f"{self.name}: опросов {self.fetches}"
+
+
+class HttpSource:
+    """
+    Страница или JSON энергокомпании. Запрос условный (If-None-Match /
+    If-Modified-Since): неизменившаяся страница стоит одного ответа 304
+    без тела и разбора.
+
+    JSON — список постов {"id", "text" | "message", "date"} или объект с
+    ключом "posts"; HTML и текст — один пост со всей страницей.
+    """
+
+    def __init__(self, url: str, timeout: float = constants.HTTP_SOURCE_TIMEOUT,
+                 session: requests.Session = None):
+        self.url = url
+        self.name = url
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.etag = None
+        self.last_modified = None
+        self.requests = 0
+        self.not_modified = 0
+        self.changed = 0
+        self.errors = 0
+
+    def _get(self) -> requests.Response:
+        headers = {'User-Agent': constants.HTTP_SOURCE_USER_AGENT}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return self.session.get(self.url, headers=headers, timeout=self.timeout)
+
+    async def fetch(self) -> list:
+        self.requests += 1
+        try:
+            response = await asyncio.to_thread(self._get)
+            if response.status_code == 304:
+                self.not_modified += 1
+                return []
+            response.raise_for_status()
+        except requests.RequestException as e:
+            self.errors += 1
+            logger.warning(f"Источник {self.name} недоступен: {e}")
+            return []
+
+        try:
+            messages = self._parse(response)
+        except (ValueError, AttributeError, TypeError) as e:
+            self.errors += 1
+            logger.error(f"Не удалось разобрать ответ {self.name}: {e}")
+            return []
+        # валидаторы запоминаются только после разбора: иначе следующий
+        # запрос получит 304 и неразобранная ревизия будет потеряна
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        self.changed += 1
+        return messages
+
+    def _page_date(self, response) -> datetime:
+        last_modified = response.headers.get('Last-Modified')
+        if last_modified:
+            try:
+                return parsedate_to_datetime(last_modified)
+            except (TypeError, ValueError):
+                pass
+        return datetime.fromtimestamp(time.time(), tz=timezone.utc)
+
+    def _parse(self, response) -> list[SourceMessage]:
+        content_type = response.headers.get('Content-Type', '')
+        if 'json' in content_type:
+            data = response.json()
+            posts = data.get('posts', []) if isinstance(data, dict) else data
+            messages = []
+            for post in posts:
+                text = post.get('text') or post.get('message')
+                if not text:
+                    continue
+                messages.append(SourceMessage(
+                    f"{self.name}#{post.get('id', len(messages))}", text,
+                    _parse_date(post.get('date')) or self._page_date(response), self.name))
+            return messages
+
+        text = html_to_text(response.text) if 'html' in content_type else response.text.strip()
+        if not text:
+            return []
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+        return [SourceMessage(f"{self.name}#{digest}", text, self._page_date(response), self.name)]
+
+    def format_status(self) -> str:
+        return (f"{self.name}: запросов {self.requests}, без изменений (304) "
+                f"{self.not_modified}, изменений {self.changed}, ошибок {self.errors}")
+
+
+class PartialFetch(Exception):
+    """Часть источников ответила, один упал: messages — то, что получено."""
+
+    def __init__(self, messages: list, error: BaseException):
+        super().__init__(str(error))
+        self.messages = messages
+        self.error = error
+
+
+class SourceMerger:
+    """
+    Опрашивает все источники одновременно и объединяет сообщения: один и
+    тот же пост, пришедший из нескольких источников, передаётся в разбор
+    один раз (побеждает источник, указанный раньше).
+
+    Источник — любой объект с атрибутом name, корутиной fetch() и методом
+    format_status(). fetch() возвращает новые или все актуальные сообщения
+    (объекты с .id, .message, .date); пустой список — ничего не изменилось.
+    """
+
+    def __init__(self, sources: list):
+        self.sources = list(sources)
+        self.duplicates = 0
+
+    async def fetch(self) -> list:
+        results = await asyncio.gather(*(source.fetch() for source in self.sources),
+                                       return_exceptions=True)
+        merged = []
+        seen = set()
+        error = None
+        for source, messages in zip(self.sources, results):
+            if isinstance(messages, BaseException):
+                error = error or messages
+                continue
+            for message in messages:
+                if not message.message:
+                    continue
+                key = normalize_text(message.message)
+                if key in seen:
+                    self.duplicates += 1
+                    continue
+                seen.add(key)
+                merged.append(message)
+        if error is not None:
+            # сообщения остальных источников не теряются: ошибка — после разбора
+            raise PartialFetch(merged, error)
+        return merged
+
+    def format_status(self) -> str:
+        lines = [source.format_status() for source in self.sources]
+        lines.append(f"Повторов между источниками: {self.duplicates}")
+        return "Источники:\n" + "\n".join(lines)
+
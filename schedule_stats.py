@@ -0,0 +1,129 @@
+from datetime import date, timedelta
+import numpy as np
+from schedule_archive import ScheduleArchive
+import constants
+
+_HOUR_BITS = np.arange(constants.HOURS_PER_DAY, dtype=np.uint32)
+
+
+class ScheduleStats:
+    """Векторизованная статистика отключений по архиву графиков (NumPy)."""
+
+    def __init__(self, archive: ScheduleArchive):
+        self.archive = archive
+        self._cache = {}  # queue -> (version, days, hours_matrix)
+
+    def _queue_matrix(self, queue: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Возвращает (days, hours): отсортированные ordinal-даты и матрицу
+        days x 24 (1 = света нет). Кешируется до следующего изменения очереди.
+        """
+        version = self.archive.versions.get(queue, 0)
+        cached = self._cache.get(queue)
+        if cached and cached[0] == version:
+            return cached[1], cached[2]
+
+        day_list, mask_list = self.archive.latest_for_queue(queue)
+        days = np.asarray(day_list, dtype=np.int64)
+        masks = np.asarray(mask_list, dtype=np.uint32)
+        order = np.argsort(days)
+        days, masks = days[order], masks[order]
+        hours = ((masks[:, None] >> _HOUR_BITS) & 1).astype(np.uint8)
+
+        self._cache[queue] = (version, days, hours)
+        return days, hours
+
+    def _window(self, queue: str, start: date, end: date):
+        """Срез матрицы очереди по диапазону дат [start, end]."""
+        days, hours = self._queue_matrix(queue)
+        lo = np.searchsorted(days, start.toordinal(), side='left')
+        hi = np.searchsorted(days, end.toordinal(), side='right')
+        return days[lo:hi], hours[lo:hi]
+
+    def daily_totals(self, queue: str, start: date, end: date) -> list[tuple[date, int]]:
+        """Часы без света по дням: [(дата, часы), ...]. Дни без графика пропускаются."""
+        days, hours = self._window(queue, start, end)
+        totals = hours.sum(axis=1)
+        return [(date.fromordinal(int(d)), int(t)) for d, t in zip(days, totals)]
+
+    def weekly_totals(self, queue: str, start: date, end: date) -> list[tuple[date, int]]:
+        """Часы без света по неделям: [(понедельник недели, часы), ...]."""
+        days, hours = self._window(queue, start, end)
+        if days.size == 0:
+            return []
+        # date.toordinal() для понедельника даёт остаток 1 по модулю 7
+        mondays = days - (days - 1) % 7
+        weeks, inverse = np.unique(mondays, return_inverse=True)
+        totals = np.bincount(inverse, weights=hours.sum(axis=1))
+        return [(date.fromordinal(int(w)), int(t)) for w, t in zip(weeks, totals)]
+
+    def longest_outages(self, queue: str, start: date, end: date,
+                        top: int = 3) -> list[tuple[date, int, int]]:
+        """
+        Самые длинные непрерывные отключения (с переходом через полночь).
+        Возвращает [(дата начала, час начала, длительность в часах), ...].
+        """
+        days, hours = self._window(queue, start, end)
+        if days.size == 0:
+            return []
+
+        # сплошная временная шкала: дни без графика заполняются нулями
+        first = int(days[0])
+        timeline = np.zeros((int(days[-1]) - first + 1, constants.HOURS_PER_DAY),
+                            dtype=np.int8)
+        timeline[days - first] = hours
+        edges = np.diff(np.concatenate(([0], timeline.ravel(), [0])))
+        starts = np.flatnonzero(edges == 1)
+        lengths = np.flatnonzero(edges == -1) - starts
+        if lengths.size == 0:
+            return []
+
+        best = np.argsort(-lengths, kind='stable')[:top]
+        result = []
+        for idx in best:
+            day_offset, hour = divmod(int(starts[idx]), constants.HOURS_PER_DAY)
+            result.append((date.fromordinal(first + day_offset), hour,
+                           int(lengths[idx])))
+        return result
+
+    def hourly_frequency(self, queue: str, start: date, end: date) -> np.ndarray:
+        """Доля дней, когда в час N света не было (массив из 24 значений 0..1)."""
+        _, hours = self._window(queue, start, end)
+        if hours.shape[0] == 0:
+            return np.zeros(constants.HOURS_PER_DAY)
+        return hours.mean(axis=0)
+
+    def summary(self, queue: str, days: int = 30, today: date = None) -> str:
+        """Текстовая сводка для команды /stats."""
+        end = today or date.today()
+        start = end - timedelta(days=days - 1)
+
+        daily = self.daily_totals(queue, start, end)
+        if not daily:
+            return f"Нет данных по очереди {queue} за {days} дн."
+
+        total = sum(hours for _, hours in daily)
+        lines = [
+            f"Статистика очереди {queue} за {days} дн. ({start:%d.%m}–{end:%d.%m})",
+            f"Дней с графиком: {len(daily)}",
+            f"Всего без света: {total} ч (в среднем {total / len(daily):.1f} ч/день)",
+            "",
+            "По неделям:",
+        ]
+        for monday, hours in self.weekly_totals(queue, start, end):
+            lines.append(f"- с {monday:%d.%m}: {hours} ч")
+
+        lines.append("")
+        lines.append("Самые длинные отключения:")
+        for day, hour, length in self.longest_outages(queue, start, end):
+            lines.append(f"- {day:%d.%m} с {hour:02d}:00 — {length} ч")
+
+        freq = self.hourly_frequency(queue, start, end)
+        worst = np.argsort(-freq, kind='stable')[:5]
+        lines.append("")
+        lines.append("Чаще всего без света:")
+        for hour in worst:
+            if freq[hour] > 0:
+                lines.append(
+                    f"- {int(hour):02d}:00–{int(hour) + 1:02d}:00 — {freq[hour] * 100:.0f}% дней")
+        return "\n".join(lines)
@@ -0,0 +1,114 @@
+import hashlib
+from datetime import date, datetime, timedelta
+from logger import logger
+
+
+def schedule_fingerprint(periods) -> str:
+    """
+    Нормализованный отпечаток графика очереди: зависит только от набора
+    периодов (без учёта порядка, повторов и даты), а не от текста сообщения.
+    """
+    normalized = sorted({(start, end) for start, end, *_ in periods})
+    payload = ';'.join(f"{start}-{end}" for start, end in normalized)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def period_bounds(period_start: str, period_end: str, day: date) -> tuple[datetime, datetime]:
+    """
+    Возвращает (начало, конец) периода как локальные datetime.
+    Конец '00:00' (или раньше начала) означает переход на следующий день.
+    """
+    sh, sm = (int(x) for x in period_start.split(':', 1))
+    eh, em = (int(x) for x in period_end.split(':', 1))
+    start_dt = datetime(day.year, day.month, day.day, sh, sm)
+    end_dt = datetime(day.year, day.month, day.day, eh % 24, em)
+    if end_dt <= start_dt:
+        end_dt += timedelta(days=1)
+    return start_dt, end_dt
+
+
+class ScheduleStore:
+    """
+    Текущие (последние) распарсенные графики всех очередей.
+    Для каждой очереди ведётся номер версии: он растёт только когда
+    график очереди действительно изменился.
+    """
+
+    def __init__(self, keep_days: int = 1):
+        self.keep_days = keep_days  # сколько прошедших дней хранить
+        self.schedules = {}  # queue -> {date: [(начало, конец, дата), ...]}
+        self.fingerprints = {}  # queue -> {date: отпечаток графика}
+        self.versions = {}   # queue -> int
+        self.updated_at = {}  # queue -> datetime последнего изменения
+
+    @staticmethod
+    def _as_date(schedule_date) -> date:
+        if isinstance(schedule_date, datetime):
+            return schedule_date.date()
+        return schedule_date
+
+    def update(self, schedule_date, queue_periods: dict[str, list]) -> set[str]:
+        """
+        Применяет новую версию графика на дату.
+        Очередь, пропавшая из новой ревизии, считается очередью без отключений.
+        Возвращает множество очередей, отпечаток графика которых изменился.
+        """
+        day = self._as_date(schedule_date)
+        changed = set()
+        if queue_periods:
+            for queue, days in self.schedules.items():
+                if queue not in queue_periods and days.get(day):
+                    queue_periods = {**queue_periods, queue: []}
+
+        for queue, periods in queue_periods.items():
+            fingerprint = schedule_fingerprint(periods)
+            fingerprints = self.fingerprints.setdefault(queue, {})
+            if fingerprints.get(day) == fingerprint:
+                continue
+            fingerprints[day] = fingerprint
+            self.schedules.setdefault(queue, {})[day] = sorted(
+                {(start, end, day) for start, end, *_ in periods})
+            self.versions[queue] = self.versions.get(queue, 0) + 1
+            self.updated_at[queue] = datetime.now()
+            changed.add(queue)
+
+        if changed:
+            logger.debug(
+                f"Изменились графики очередей {sorted(changed)} на {day:%d.%m.%Y}")
+        self.prune()
+        return changed
+
+    def prune(self, today: date = None):
+        """Удаляет графики старше keep_days дней."""
+        cutoff = (today or date.today()) - timedelta(days=self.keep_days)
+        for queue, days in self.schedules.items():
+            stale = [day for day in days if day < cutoff]
+            if not stale:
+                continue
+            for day in stale:
+                del days[day]
+                self.fingerprints.get(queue, {}).pop(day, None)
+            self.versions[queue] = self.versions.get(queue, 0) + 1
+
+    def queues(self) -> list[str]:
+        return sorted(self.schedules)
+
+    def days(self, queue: str) -> list[date]:
+        """Даты, на которые известен график очереди."""
+        return sorted(self.schedules.get(queue, {}))
+
+    def version(self, queue: str) -> int:
+        return self.versions.get(queue, 0)
+
+    def fingerprint(self, queue: str, day) -> str | None:
+        return self.fingerprints.get(queue, {}).get(self._as_date(day))
+
+    def periods_for(self, queue: str, day: date = None) -> list[tuple[str, str, date]]:
+        """Периоды очереди на дату (или на все известные даты, по порядку)."""
+        days = self.schedules.get(queue, {})
+        if day is not None:
+            return list(days.get(self._as_date(day), []))
+        result = []
+        for d in sorted(days):
+            result.extend(days[d])
+        return result
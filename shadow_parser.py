@@ -0,0 +1,222 @@
+"""
+Теневой режим парсера: кандидат (новая версия ScheduleParser / DateParser)
+разбирает каждое сообщение рядом с рабочим парсером.
+
+Кандидат — модуль (SHADOW_PARSER=имя модуля), в котором определены классы
+ScheduleParser и/или DateParser с теми же интерфейсами; недостающий класс
+берётся рабочий. Оба парсера запускаются в отдельном процессе на одном и
+том же тексте — живой путь оповещений не ждёт и не платит за сравнение.
+Расхождения и относительная стоимость разбора пишутся построчно в
+logs/shadow_report.jsonl.
+"""
+import asyncio
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from logger import logger
+import constants
+
+_production = None  # (DateParser, ScheduleParser) — в процессе пула
+_candidate = None
+
+
+def _make_parsers(module) -> tuple:
+    import date_parser
+    import schedule_parser
+    date_cls = getattr(module, 'DateParser', date_parser.DateParser)
+    schedule_cls = getattr(module, 'ScheduleParser', schedule_parser.ScheduleParser)
+    return date_cls(), schedule_cls('')
+
+
+def _init_worker(candidate: str):
+    global _production, _candidate
+    # импорт внутри процесса: логгер пишет в файл, поэтому глушим INFO
+    logging.getLogger('power_alert').setLevel(logging.WARNING)
+    _production = _make_parsers(None)
+    _candidate = _make_parsers(importlib.import_module(candidate))
+
+
+def _run(parsers: tuple, text: str) -> tuple[dict, float]:
+    """Разбор одним парсером: (нормализованный результат, секунды)."""
+    date_parser, schedule_parser = parsers
+    started = time.perf_counter()
+    schedule_date, update_dt = date_parser.parse_date(text)
+    schedule_parser.set_schedule_date(schedule_date)
+    queue_periods = schedule_parser.parse_all(text)
+    elapsed = time.perf_counter() - started
+    return {
+        'schedule_date': schedule_date.isoformat() if schedule_date else None,
+        'update_dt': update_dt.isoformat() if update_dt else None,
+        'queues': {queue: sorted(f"{start}-{end}" for start, end, *_ in periods)
+                   for queue, periods in queue_periods.items()},
+    }, elapsed
+
+
+def _diff(production: dict, candidate: dict) -> dict:
+    """Различия результатов: поля даты и очереди с разными периодами."""
+    diff = {}
+    for field in ('schedule_date', 'update_dt'):
+        if production[field] != candidate[field]:
+            diff[field] = [production[field], candidate[field]]
+    queues = {}
+    for queue in sorted(set(production['queues']) | set(candidate['queues'])):
+        ours = production['queues'].get(queue)
+        theirs = candidate['queues'].get(queue)
+        if ours != theirs:
+            queues[queue] = [ours, theirs]
+    if queues:
+        diff['queues'] = queues
+    return diff
+
+
+def compare(text: str, repeat: int = constants.SHADOW_TIMING_REPEAT) -> dict:
+    """
+    Выполняется в процессе пула. Разбирает текст обоими парсерами
+    (repeat раз, берётся лучшее время) и возвращает строку отчёта.
+    """
+    production = candidate = None
+    production_time = candidate_time = float('inf')
+    error = None
+    for _ in range(repeat):
+        production, elapsed = _run(_production, text)
+        production_time = min(production_time, elapsed)
+        try:
+            candidate, elapsed = _run(_candidate, text)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            break
+        candidate_time = min(candidate_time, elapsed)
+    if error is not None:
+        return {'match': False, 'error': error, 'production_us': round(production_time * 1e6, 1)}
+    diff = _diff(production, candidate)
+    return {
+        'match': not diff,
+        'diff': diff,
+        'queues': len(production['queues']),
+        'production_us': round(production_time * 1e6, 1),
+        'candidate_us': round(candidate_time * 1e6, 1),
+        'ratio': round(candidate_time / production_time, 3) if production_time else None,
+    }
+
+
+class ShadowParser:
+    """
+    Запускает сравнение в пуле процессов без ожидания результата; число
+    незавершённых сравнений ограничено — при перегрузке сообщение просто
+    пропускается. Каждое сообщение (по id) сравнивается один раз, даже если
+    его повторно отдаёт опрос канала. Итоги держатся в памяти для /status.
+    """
+
+    def __init__(self, candidate: str, report_path: str = constants.SHADOW_REPORT_PATH,
+                 max_pending: int = constants.SHADOW_MAX_PENDING):
+        self.candidate = candidate
+        self.report_path = report_path
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = set()
+        self._seen = OrderedDict()  # id уже отданных сообщений (последние SHADOW_SEEN_IDS)
+        self.compared = 0
+        self.disagreements = 0
+        self.errors = 0
+        self.skipped = 0
+        self.production_us = 0.0
+        self.candidate_us = 0.0
+        self.disabled = None  # причина отключения теневого режима
+        if importlib.util.find_spec(candidate) is None:
+            self._disable(f"модуль {candidate} не найден")
+
+    def _disable(self, reason: str):
+        self.disabled = reason
+        logger.error(f"Теневой парсер отключён: {reason}")
+        self.close()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=constants.SHADOW_WORKERS,
+                initializer=_init_worker, initargs=(self.candidate,))
+        return self._executor
+
+    def submit(self, text: str, message_id=None):
+        """Ставит сообщение на теневой разбор; сразу возвращает управление."""
+        if self.disabled:
+            return
+        if message_id is not None:
+            if message_id in self._seen:
+                return
+            self._seen[message_id] = None
+            if len(self._seen) > constants.SHADOW_SEEN_IDS:
+                self._seen.popitem(last=False)
+        if len(self._pending) >= self.max_pending:
+            self.skipped += 1
+            return
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._pool(), compare, text)
+        except RuntimeError as e:  # пул остановлен
+            logger.error(f"Теневой парсер недоступен: {e}")
+            self.skipped += 1
+            return
+        self._pending.add(future)
+        future.add_done_callback(lambda done: self._record(done, message_id))
+
+    def _record(self, future, message_id):
+        self._pending.discard(future)
+        if future.cancelled():
+            return
+        try:
+            row = future.result()
+        except BrokenProcessPool:
+            # модуль кандидата не импортируется в процессе пула
+            self.errors += 1
+            if not self.disabled:
+                self._disable("процесс пула завершился при загрузке кандидата")
+            return
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Ошибка теневого парсера: {e}")
+            return
+        self.compared += 1
+        if 'error' in row:
+            self.errors += 1
+        elif not row['match']:
+            self.disagreements += 1
+        else:
+            self.production_us += row['production_us']
+            self.candidate_us += row['candidate_us']
+        if not row['match']:
+            logger.warning(f"Теневой парсер расходится с рабочим (сообщение {message_id}): "
+                           f"{row.get('error') or row['diff']}")
+        self._write({'ts': round(time.time(), 3), 'message_id': message_id,
+                     'candidate': self.candidate, **row})
+
+    def _write(self, row: dict):
+        try:
+            directory = os.path.dirname(self.report_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.report_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.error(f"Не удалось записать отчёт теневого парсера: {e}")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def format_status(self) -> str:
+        if self.disabled:
+            return f"Теневой парсер {self.candidate}: отключён ({self.disabled})"
+        text = (f"Теневой парсер {self.candidate}: сравнено {self.compared}, "
+                f"расхождений {self.disagreements}, ошибок {self.errors}, "
+                f"пропущено {self.skipped}")
+        if self.production_us:
+            text += (f"\nСтоимость кандидата: {self.candidate_us / self.production_us:.2f}× "
+                     f"от рабочего (по совпавшим сообщениям)")
+        return text
@@ -0,0 +1,378 @@
+"""
+Нагрузочный «soak»-прогон цикла приёма графиков.
+
+Крутит тот же цикл, что и main() (poll_sources + daily_cleanup), против
+поддельного канала, который публикует и редактирует графики в высоком
+темпе, на виртуальных часах — недели проходят за минуты. Проверяет, что
+память (tracemalloc), число asyncio-задач и время обработки сообщения
+не растут со временем.
+
+Запуск: python soak_test.py [--days 21] [--posts-per-hour 6]
+Код выхода 1, если какое-либо ограничение нарушено.
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+
+import requests
+
+import alert_manager as alert_manager_module
+import alert_plan
+import date_parser as date_parser_module
+import schedule_ingestor
+import schedule_store
+import transition_index
+from alert_manager import AlertManager
+from config import AlertConfig
+from date_parser import DateParser
+from delivery_queue import DeliveryQueue
+from logger import logger
+from main import daily_cleanup, poll_sources
+from message_builder import MessageBuilder
+from outbox import Outbox
+from schedule_archive import ScheduleArchive
+from schedule_ingestor import ScheduleIngestor
+from schedule_parser import ScheduleParser
+from schedule_sources import SourceMerger, TelegramSource
+from schedule_store import ScheduleStore
+from tracing import Tracer
+from transition_index import TransitionIndex
+
+QUEUES = [f"{group}.{sub}" for group in range(1, 7) for sub in (1, 2)]
+CHECK_INTERVAL = 300
+WARMUP_DAYS = 3
+REAL_TIME = time.time
+
+
+# ---------------------------------------------------------------- виртуальное время
+
+class VirtualClock:
+    """Виртуальные «настенные» часы, привязанные ко времени цикла событий."""
+
+    def __init__(self, start_ts: float):
+        self.start_ts = start_ts
+        self.loop = None
+
+    def time(self) -> float:
+        return self.start_ts + (self.loop.time() if self.loop else 0.0)
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """
+    Цикл событий с виртуальным временем: когда готовых задач нет и ни один
+    поток не работает, время перематывается к ближайшему таймеру.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._now = 0.0
+        self._in_threads = 0
+
+    def time(self) -> float:
+        return self._now
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self._in_threads += 1
+
+        def done(_):
+            self._in_threads -= 1
+        future.add_done_callback(done)
+        return future
+
+    def _run_once(self):
+        if not self._ready and self._scheduled and not self._in_threads:
+            self._now = max(self._now, self._scheduled[0]._when)
+        super()._run_once()
+
+
+def install_clock(clock: VirtualClock):
+    """
+    Подменяет time.time, time.monotonic и datetime.now/date.today в модулях
+    бота на виртуальные (таймеры напоминаний сверяют оба вида часов).
+    """
+
+    class _Meta(type):
+        def __instancecheck__(cls, obj):
+            return isinstance(obj, cls.__bases__[0])
+
+    class VirtualDateTime(datetime, metaclass=_Meta):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromtimestamp(clock.time(), tz)
+
+    class VirtualDate(date, metaclass=_Meta):
+        @classmethod
+        def today(cls):
+            return datetime.fromtimestamp(clock.time()).date()
+
+    time.time = clock.time
+    time.monotonic = lambda: clock.time() - clock.start_ts
+    for module in (alert_manager_module, schedule_ingestor, date_parser_module,
+                   schedule_store, transition_index, alert_plan):
+        if hasattr(module, 'datetime'):
+            module.datetime = VirtualDateTime
+        if hasattr(module, 'date'):
+            module.date = VirtualDate
+
+
+# ---------------------------------------------------------------- поддельный канал
+
+class FakeMessage:
+    __slots__ = ('id', 'message', 'date')
+
+    def __init__(self, message_id: int, text: str, posted: datetime):
+        self.id = message_id
+        self.message = text
+        self.date = posted
+
+
+class FakeChannel:
+    """
+    Поддельный TelegramClientWrapper: канал, в который генератор публикует
+    графики и правки. Правка — либо новый пост «Зміни на ...», либо
+    редактирование последнего поста на месте (тот же id).
+    """
+
+    def __init__(self, clock: VirtualClock, seed: int = 1):
+        self.clock = clock
+        self.random = random.Random(seed)
+        self.posts = []
+        self.next_id = 1
+        self.current = {}  # date -> {queue: [(start, end)]}
+        self.fetches = 0
+
+    def _periods(self) -> list[tuple[int, int]]:
+        periods = []
+        hour = self.random.randrange(0, 6)
+        while hour < 23:
+            length = self.random.choice((1, 2, 2, 3, 4))
+            periods.append((hour, min(hour + length, 24)))
+            hour += length + self.random.randrange(2, 7)
+        return periods
+
+    def _render(self, day: date, update: datetime | None) -> str:
+        header = (f"Зміни на {update:%H:%M} {day:%d.%m.%Y}" if update
+                  else f"Графік відключень на {day:%d.%m.%Y}")
+        lines = [header]
+        for queue in QUEUES:
+            pairs = ', '.join(f"{start:02d}-{end:02d}" for start, end in self.current[day][queue])
+            lines.append(f"Черга {queue}: {pairs}")
+        return '\n'.join(lines)
+
+    def publish(self):
+        """Публикует очередную ревизию графика (на сегодня или на завтра)."""
+        now = datetime.fromtimestamp(self.clock.time())
+        day = now.date()
+        tomorrow = day + timedelta(days=1)
+        if tomorrow not in self.current and now.hour >= 18:
+            self.current[tomorrow] = {queue: self._periods() for queue in QUEUES}
+            self._post(self._render(tomorrow, None))
+            return
+        schedule = self.current.setdefault(day, {queue: self._periods() for queue in QUEUES})
+        # правка одной-двух очередей; остальные (в т.ч. целевая) часто не меняются
+        for queue in self.random.sample(QUEUES, self.random.randint(1, 2)):
+            schedule[queue] = self._periods()
+        text = self._render(day, now)
+        if self.posts and self.random.random() < 0.3:
+            self.posts[-1].message = text  # редактирование последнего поста
+        else:
+            self._post(text)
+        for stale in [d for d in self.current if d < day - timedelta(days=1)]:
+            del self.current[stale]
+
+    def _post(self, text: str):
+        posted = datetime.fromtimestamp(self.clock.time(), tz=timezone.utc)
+        self.posts.append(FakeMessage(self.next_id, text, posted))
+        self.next_id += 1
+        # реальный канал хранит всё, но в памяти харнесса держим хвост
+        if len(self.posts) > 500:
+            del self.posts[:100]
+
+    async def get_recent_messages(self, channel, limit: int = 10):
+        self.fetches += 1
+        return list(reversed(self.posts[-limit:]))
+
+    async def iter_history(self, channel, since):
+        for message in list(self.posts):
+            if message.date >= since:
+                yield message
+
+
+# ---------------------------------------------------------------- прогон
+
+class FakeResponse:
+    status_code = 200
+    text = ''
+
+    def raise_for_status(self):
+        pass
+
+
+def fake_post(url, data=None, timeout=None, **kwargs):
+    fake_post.calls += 1
+    return FakeResponse()
+
+
+fake_post.calls = 0
+
+
+async def soak(args, workdir: str, clock: VirtualClock) -> bool:
+    clock.loop = asyncio.get_running_loop()
+    requests.post = fake_post
+
+    alert_config = AlertConfig(
+        target_queue='1.2', alert_minutes_before_off=15, alert_minutes_before_on=10,
+        check_interval_seconds=CHECK_INTERVAL, catchup_hours=0)
+    parser = ScheduleParser(alert_config.target_queue)
+    builder = MessageBuilder(alert_config.target_queue, 15, 10)
+    alert_manager = AlertManager('token', '1')
+    alert_manager.builder = builder
+    alert_manager.tracer = Tracer(os.path.join(workdir, 'traces.jsonl'))
+    alert_manager.outbox = Outbox(os.path.join(workdir, 'outbox.sqlite3'))
+    delivery = DeliveryQueue()
+    alert_manager.delivery = delivery
+    background = [asyncio.create_task(delivery.run()),
+                  asyncio.create_task(alert_manager.run_retries())]
+
+    last_schedule_updates = {}
+    ingestor = ScheduleIngestor(
+        parser, DateParser(), builder, alert_manager, alert_config,
+        ScheduleArchive(os.path.join(workdir, 'archive.csv')), ScheduleStore(),
+        last_schedule_updates, tracer=alert_manager.tracer,
+        transitions=TransitionIndex(alert_plan.load_timezone(alert_config.timezone)))
+    channel = FakeChannel(clock, args.seed)
+    sources = SourceMerger([TelegramSource(channel)])
+
+    publish_every = max(1, round(3600 / CHECK_INTERVAL / args.posts_per_hour))
+    cycles_per_day = 86400 // CHECK_INTERVAL
+    daily = []  # (день, память КБ, задач, мкс на сообщение, сообщений)
+    baseline = None
+    last_day = None
+    day_time = day_messages = 0.0
+
+    for cycle in range(args.days * cycles_per_day):
+        current_day = datetime.fromtimestamp(clock.time()).day
+        if last_day is not None and last_day != current_day:
+            daily_cleanup(alert_manager, last_schedule_updates, ingestor)
+            gc.collect()
+            current, _ = tracemalloc.get_traced_memory()
+            tasks = len(asyncio.all_tasks())
+            per_message = day_time / day_messages * 1e6 if day_messages else 0.0
+            daily.append((len(daily) + 1, current / 1024, tasks, per_message, int(day_messages)))
+            if len(daily) == WARMUP_DAYS:
+                baseline = tracemalloc.take_snapshot()
+            day_time = day_messages = 0.0
+        last_day = current_day
+
+        for _ in range(args.burst if cycle % publish_every == 0 else 0):
+            channel.publish()
+        started = time.perf_counter()
+        day_messages += await poll_sources(sources, ingestor)
+        day_time += time.perf_counter() - started
+        await asyncio.sleep(CHECK_INTERVAL)
+
+    for task in background:
+        task.cancel()
+    delivery.stop()
+    for task in list(alert_manager.scheduled_tasks.values()):
+        task.cancel()
+    await asyncio.sleep(0)
+    alert_manager.outbox.close()
+
+    return report(args, daily, baseline, channel, alert_manager)
+
+
+def report(args, daily, baseline, channel, alert_manager) -> bool:
+    print(f"\nДней: {len(daily)}, постов/правок: {channel.next_id - 1}, опросов: {channel.fetches}, "
+          f"отправлено сообщений: {fake_post.calls}")
+    print(f"{'день':>4} {'память КБ':>10} {'задач':>6} {'мкс/сообщ':>10} {'сообщ':>7}")
+    for day, memory_kb, tasks, per_message, messages in daily:
+        print(f"{day:>4} {memory_kb:>10.0f} {tasks:>6} {per_message:>10.1f} {messages:>7}")
+
+    ok = True
+    measured = daily[WARMUP_DAYS:]
+    if not measured:
+        print("Слишком короткий прогон для проверок")
+        return False
+
+    growth_kb = measured[-1][1] - daily[WARMUP_DAYS - 1][1]
+    if growth_kb > args.max_growth_kb:
+        ok = False
+        print(f"✗ Память выросла на {growth_kb:.0f} КБ после разогрева (лимит {args.max_growth_kb})")
+        snapshot = tracemalloc.take_snapshot()
+        for stat in snapshot.compare_to(baseline, 'lineno')[:10]:
+            print(f"    {stat}")
+    else:
+        print(f"✓ Прирост памяти после разогрева: {growth_kb:.0f} КБ")
+
+    max_tasks = max(tasks for _, _, tasks, _, _ in daily)
+    if max_tasks > args.max_tasks:
+        ok = False
+        print(f"✗ Задач asyncio до {max_tasks} (лимит {args.max_tasks})")
+    else:
+        print(f"✓ Задач asyncio не больше {max_tasks}")
+
+    stale = [key for key, task in alert_manager.scheduled_tasks.items() if task.done()]
+    if stale or len(alert_manager.sent_hashes) > alert_manager_module.constants.MAX_SENT_HASHES:
+        ok = False
+        print(f"✗ Завершённых задач в scheduled_tasks: {len(stale)}, "
+              f"хешей: {len(alert_manager.sent_hashes)}")
+
+    window = max(1, min(3, len(measured) // 2))
+    first = sum(d[3] for d in measured[:window]) / window
+    last = sum(d[3] for d in measured[-window:]) / window
+    if first and last / first > args.max_slowdown:
+        ok = False
+        print(f"✗ Обработка сообщения замедлилась: {first:.1f} → {last:.1f} мкс")
+    else:
+        print(f"✓ Время на сообщение стабильно: {first:.1f} → {last:.1f} мкс")
+    return ok
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--days', type=int, default=21, help='виртуальных дней')
+    arg_parser.add_argument('--posts-per-hour', type=float, default=6,
+                            help='публикаций/правок в час')
+    arg_parser.add_argument('--burst', type=int, default=1,
+                            help='публикаций за один раз (проверка пачек)')
+    arg_parser.add_argument('--seed', type=int, default=1)
+    arg_parser.add_argument('--max-growth-kb', type=float, default=512)
+    arg_parser.add_argument('--max-tasks', type=int, default=64)
+    arg_parser.add_argument('--max-slowdown', type=float, default=2.0)
+    arg_parser.add_argument('--verbose', action='store_true', help='не глушить логи бота')
+    args = arg_parser.parse_args(argv)
+
+    if not args.verbose:
+        logger.setLevel(logging.ERROR)
+
+    start = datetime.combine(datetime.fromtimestamp(REAL_TIME()).date(),
+                             datetime.min.time()).timestamp()
+    clock = VirtualClock(start)
+    install_clock(clock)
+    tracemalloc.start(1)
+
+    loop = VirtualTimeLoop()
+    asyncio.set_event_loop(loop)
+    started = REAL_TIME()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            ok = loop.run_until_complete(soak(args, workdir, clock))
+    finally:
+        loop.close()
+        tracemalloc.stop()
+    print(f"Реальное время прогона: {REAL_TIME() - started:.1f} сек")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
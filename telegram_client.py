@@ -74,6 +74,19 @@ class TelegramClientWrapper:
             logger.error(f"Ошибка получения сообщений: {e}")
             return []
 
+    async def iter_history(self, channel, since):
+        """
+        Отдаёт сообщения канала начиная с момента since (datetime)
+        в хронологическом порядке — от старых к новым. Telethon сам
+        запрашивает историю страницами по 100 сообщений.
+        """
+        try:
+            async for message in self.client.iter_messages(
+                    channel, offset_date=since, reverse=True, wait_time=1):
+                yield message
+        except Exception as e:
+            logger.error(f"Ошибка получения истории канала: {e}")
+
     async def disconnect(self) -> None:
         """Отключается от Telegram."""
         try:
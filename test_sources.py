@@ -0,0 +1,112 @@
+"""
+Проверка HttpSource и SourceMerger против локального сервера-заглушки.
+
+Сервер отдаёт страницу графика с ETag и Last-Modified и отвечает 304 на
+условный запрос; проверяется, что повторный опрос неизменившейся страницы
+не даёт сообщений, изменение страницы — даёт, а одинаковый пост из двух
+источников проходит в разбор один раз.
+
+Запуск: python test_sources.py
+"""
+import asyncio
+import hashlib
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from schedule_sources import HttpSource, SourceMerger, SourceMessage
+
+PAGE = """<html><body><div class="post">
+<p>Графік відключень на 20.10.2026</p>
+<p>Черга 1.2: 08-10, 14-16</p>
+</div></body></html>"""
+
+
+class StandIn:
+    """Сервер-заглушка энергокомпании: одна страница, счётчики ответов."""
+
+    def __init__(self):
+        self.body = PAGE.encode('utf-8')
+        self.modified = formatdate(usegmt=True)
+        self.ok = 0
+        self.not_modified = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                etag = '"' + hashlib.sha1(stand_in.body).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    stand_in.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                stand_in.ok += 1
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', stand_in.modified)
+                self.send_header('Content-Length', str(len(stand_in.body)))
+                self.end_headers()
+                self.wfile.write(stand_in.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/schedule"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def publish(self, text: str):
+        self.body = text.encode('utf-8')
+        self.modified = formatdate(usegmt=True)
+
+    def stop(self):
+        self.server.shutdown()
+
+
+class StaticSource:
+    """Источник с заранее заданными сообщениями (вместо канала Telegram)."""
+
+    name = 'static'
+
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def fetch(self):
+        return self.messages
+
+    def format_status(self):
+        return f"{self.name}: {len(self.messages)} сообщений"
+
+
+async def main():
+    stand_in = StandIn()
+    source = HttpSource(stand_in.url)
+    try:
+        first = await source.fetch()
+        assert len(first) == 1 and 'Черга 1.2: 08-10, 14-16' in first[0].message, first
+        assert await source.fetch() == [], "неизменившаяся страница должна дать 304"
+        assert stand_in.not_modified == 1
+
+        stand_in.publish(PAGE.replace('14-16', '18-20'))
+        changed = await source.fetch()
+        assert len(changed) == 1 and '18-20' in changed[0].message
+
+        # тот же пост в «канале» и на сайте — в разбор попадает один раз
+        channel_post = SourceMessage(1, changed[0].message.replace('\n', '\n\n'), None)
+        merger = SourceMerger([StaticSource([channel_post]), source])
+        stand_in.publish(PAGE.replace('14-16', '18-20') + ' ')
+        merged = await merger.fetch()
+        assert [m.id for m in merged] == [1], merged
+        assert merger.duplicates == 1
+
+        print(source.format_status())
+        print(f"Заглушка: 200 — {stand_in.ok}, 304 — {stand_in.not_modified}")
+        print("OK")
+    finally:
+        stand_in.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,172 @@
+import bisect
+import itertools
+import json
+import os
+import threading
+import time
+from logger import logger
+import constants
+
+# этапы пути «пост в канале → доставленное напоминание»
+STAGE_POSTED = 'posted'        # дата сообщения в канале
+STAGE_FETCHED = 'fetched'      # получено get_recent_messages
+STAGE_PARSED = 'parsed'        # parse_date + parse
+STAGE_PLANNED = 'planned'      # process_plan
+STAGE_FIRED = 'fired'          # сработал таймер schedule_delayed_alert
+STAGE_DELIVERED = 'delivered'  # HTTP-запрос send_alert завершён
+
+# интервалы, для которых ведутся гистограммы: имя -> (от этапа, до этапа)
+SPANS = {
+    'poll_delay': (STAGE_POSTED, STAGE_FETCHED),
+    'parse': (STAGE_FETCHED, STAGE_PARSED),
+    'plan': (STAGE_PARSED, STAGE_PLANNED),
+    'fire_lateness': ('due', STAGE_FIRED),
+    'send': (STAGE_FIRED, STAGE_DELIVERED),
+    'due_to_delivered': ('due', STAGE_DELIVERED),
+}
+
+HISTOGRAM_BOUNDS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+LINK_TTL = 2 * 86400  # секунды: связи с давно прошедшими напоминаниями забываются
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными границами корзин (секунды)."""
+
+    def __init__(self, bounds=HISTOGRAM_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, value: float):
+        value = max(value, 0.0)
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины."""
+        if not self.total:
+            return 0.0
+        rank = q * self.total
+        for idx, count in enumerate(itertools.accumulate(self.counts)):
+            if count >= rank:
+                return min(self.bounds[idx], self.max) if idx < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.total,
+            'mean': self.sum / self.total if self.total else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'max': self.max,
+            'buckets': dict(zip([f"<={b}" for b in self.bounds] + ['inf'], self.counts)),
+        }
+
+
+class Tracer:
+    """
+    Сквозная трассировка: запись на каждую ревизию графика и на каждое
+    напоминание, с отметками времени этапов. Завершённые записи пишутся
+    JSON-строками в файл, задержки этапов копятся в гистограммах.
+    Доставка отмечается из потока очереди доставки, поэтому связи и
+    гистограммы защищены блокировкой.
+    """
+
+    def __init__(self, path: str = constants.TRACE_PATH):
+        self.path = path
+        self.traces = {}  # trace_id -> {stage: ts}
+        self.links = {}   # alert_key -> (trace_id, due_ts, {stage: ts})
+        self.histograms = {name: LatencyHistogram() for name in SPANS}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def begin(self, message_id, posted_ts: float | None, fetched_ts: float | None) -> str:
+        """Начинает трассу ревизии графика. Возвращает trace_id."""
+        trace_id = f"{int(time.time())}-{message_id}-{next(self._ids)}"
+        stages = {}
+        if posted_ts is not None:
+            stages[STAGE_POSTED] = posted_ts
+        if fetched_ts is not None:
+            stages[STAGE_FETCHED] = fetched_ts
+        self.traces[trace_id] = stages
+        return trace_id
+
+    def mark(self, trace_id: str | None, stage: str, ts: float = None):
+        if trace_id is None or trace_id not in self.traces:
+            return
+        self.traces[trace_id][stage] = ts or time.time()
+
+    def finish(self, trace_id: str | None, **fields):
+        """Завершает трассу ревизии и пишет её в файл."""
+        stages = self.traces.pop(trace_id, None) if trace_id else None
+        if stages is None:
+            return
+        with self._lock:
+            self._observe(stages)
+        self._write({'kind': 'schedule', 'trace_id': trace_id, **fields, 'stages': stages})
+
+    def link(self, alert_key: str, trace_id: str | None, due_ts: float):
+        """Связывает запланированное напоминание с трассой ревизии."""
+        if trace_id is None:
+            return
+        with self._lock:
+            self.links[alert_key] = (trace_id, due_ts, {})
+            self._prune_links()
+
+    def mark_alert(self, alert_key: str | None, stage: str, ts: float = None):
+        """Отмечает этап напоминания; после доставки пишет запись в файл."""
+        if not alert_key:
+            return
+        with self._lock:
+            link = self.links.get(alert_key)
+            if link is None:
+                return
+            trace_id, due_ts, stages = link
+            # доставка засчитывается только для сработавшего таймера, а не для
+            # первичного объявления с тем же ключом
+            if stage == STAGE_DELIVERED and STAGE_FIRED not in stages:
+                return
+            stages[stage] = ts or time.time()
+            if stage != STAGE_DELIVERED:
+                return
+            del self.links[alert_key]
+            stages['due'] = due_ts
+            self._observe(stages)
+        self._write({'kind': 'reminder', 'trace_id': trace_id,
+                     'alert_key': alert_key, 'stages': stages})
+
+    def _observe(self, stages: dict):
+        for name, (start, end) in SPANS.items():
+            if start in stages and end in stages:
+                self.histograms[name].record(stages[end] - stages[start])
+
+    def _prune_links(self):
+        cutoff = time.time() - LINK_TTL
+        for key in [k for k, (_, due, _) in self.links.items() if due < cutoff]:
+            del self.links[key]
+
+    def _write(self, record: dict):
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.error(f"Ошибка записи трассы: {e}")
+
+    def format_histograms(self) -> str:
+        """Текстовая сводка задержек по этапам (для /latency)."""
+        lines = ["Задержки по этапам (сек): n / p50 / p95 / max"]
+        with self._lock:
+            data_by_name = {name: histogram.to_dict() for name, histogram in self.histograms.items()}
+        for name, data in data_by_name.items():
+            lines.append(f"- {name}: {data['count']} / {data['p50']:g} / "
+                         f"{data['p95']:g} / {data['max']:.1f}")
+        return "\n".join(lines)
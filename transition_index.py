@@ -0,0 +1,112 @@
+import bisect
+from datetime import date, datetime
+from schedule_store import period_bounds
+from logger import logger
+
+
+def _format_left(seconds: float) -> str:
+    minutes = max(int(seconds // 60), 0)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} ч {minutes} мин" if hours else f"{minutes} мин"
+
+
+class TransitionIndex:
+    """
+    Индекс ближайших переключений (отключение/включение) по всем очередям.
+
+    Для каждой очереди хранится отсортированный список моментов (epoch)
+    переключения: чётные позиции — начало отключения, нечётные — включение.
+    Смежные и перекрывающиеся периоды (в том числе через полночь) склеиваются
+    при построении. Индекс пересобирается только для очередей, график которых
+    изменился; запрос — один bisect без разбора текста.
+    """
+
+    def __init__(self, tz):
+        self.tz = tz
+        self.intervals = {}  # queue -> {date: [(начало, конец), ...]} в epoch
+        self.times = {}      # queue -> [начало, конец, начало, конец, ...]
+        self.rebuilds = 0
+
+    @staticmethod
+    def _as_date(schedule_date) -> date:
+        if isinstance(schedule_date, datetime):
+            return schedule_date.date()
+        return schedule_date
+
+    def _epoch(self, dt: datetime) -> int:
+        return int(dt.replace(tzinfo=self.tz).timestamp())
+
+    def update(self, schedule_date, queue_periods: dict[str, list]):
+        """Применяет изменившиеся графики очередей на дату (см. ScheduleStore.update)."""
+        day = self._as_date(schedule_date)
+        for queue, periods in queue_periods.items():
+            intervals = []
+            for period_start, period_end, *_ in periods:
+                start_dt, end_dt = period_bounds(period_start, period_end, day)
+                intervals.append((self._epoch(start_dt), self._epoch(end_dt)))
+            self.intervals.setdefault(queue, {})[day] = sorted(intervals)
+            self._rebuild(queue)
+        if queue_periods:
+            logger.debug(f"Индекс переключений обновлён: {sorted(queue_periods)} на {day:%d.%m.%Y}")
+
+    def _rebuild(self, queue: str):
+        merged = []
+        days = self.intervals.get(queue, {})
+        for day in sorted(days):
+            for start, end in days[day]:
+                if merged and start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+        self.times[queue] = [ts for interval in merged for ts in interval]
+        self.rebuilds += 1
+
+    def prune(self, today: date = None):
+        """Забывает графики прошедших дат."""
+        today = today or date.today()
+        for queue, days in self.intervals.items():
+            stale = [day for day in days if day < today]
+            if not stale:
+                continue
+            for day in stale:
+                del days[day]
+            self._rebuild(queue)
+
+    def queues(self) -> list[str]:
+        return sorted(self.times)
+
+    def lookup(self, queue: str, now_ts: float) -> tuple[bool, int | None, int | None] | None:
+        """
+        Состояние очереди на момент now_ts: (отключено ли сейчас,
+        ближайшее переключение, следующее за ним). None — графика очереди нет.
+        """
+        times = self.times.get(queue)
+        if times is None:
+            return None
+        idx = bisect.bisect_right(times, now_ts)
+        next_ts = times[idx] if idx < len(times) else None
+        after_ts = times[idx + 1] if idx + 1 < len(times) else None
+        return idx % 2 == 1, next_ts, after_ts
+
+    def _label(self, ts: int, now_ts: float) -> str:
+        moment = datetime.fromtimestamp(ts, self.tz)
+        today = datetime.fromtimestamp(now_ts, self.tz).date()
+        suffix = " завтра" if moment.date() > today else ""
+        return f"{moment:%H:%M}{suffix}"
+
+    def format_next(self, queue: str, now_ts: float) -> str:
+        """Текстовый ответ для /next и inline-запросов."""
+        state = self.lookup(queue, now_ts)
+        if state is None:
+            return f"Нет данных о графике очереди {queue}."
+        off_now, next_ts, after_ts = state
+        if off_now:
+            text = (f"Очередь {queue}: сейчас отключено. Включение в "
+                    f"{self._label(next_ts, now_ts)} (через {_format_left(next_ts - now_ts)}).")
+            if after_ts is not None:
+                text += f"\nСледующее отключение: {self._label(after_ts, now_ts)}."
+            return text
+        if next_ts is None:
+            return f"Очередь {queue}: отключений на сегодня и завтра не запланировано."
+        return (f"Очередь {queue}: свет есть. Отключение в {self._label(next_ts, now_ts)} "
+                f"(через {_format_left(next_ts - now_ts)}) до {self._label(after_ts, now_ts)}.")
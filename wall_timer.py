@@ -0,0 +1,63 @@
+import asyncio
+import time
+from collections import deque
+from logger import logger
+import constants
+
+# что делать с напоминанием, которое проспали (suspend хоста, скачок часов)
+MISSED_POLICY_LATE = 'late'  # отправить с пометкой об опоздании
+MISSED_POLICY_SKIP = 'skip'  # не отправлять
+MISSED_POLICIES = (MISSED_POLICY_LATE, MISSED_POLICY_SKIP)
+
+
+class FiringStats:
+    """Точность срабатывания напоминаний: опоздание относительно due_ts."""
+
+    def __init__(self, samples: int = constants.FIRING_SAMPLES):
+        self.lateness = deque(maxlen=samples)  # секунды, последние срабатывания
+        self.fired = 0
+        self.late = 0     # отправлены с пометкой об опоздании
+        self.skipped = 0  # пропущены по политике или после события
+        self.clock_jumps = 0
+
+    def record(self, lateness: float):
+        self.fired += 1
+        self.lateness.append(lateness)
+
+    def _percentile(self, values: list, p: float) -> float:
+        return values[min(int(len(values) * p), len(values) - 1)]
+
+    def format_status(self) -> str:
+        text = (f"Напоминания: сработало {self.fired}, с опозданием {self.late}, "
+                f"пропущено {self.skipped}, скачков часов {self.clock_jumps}")
+        if self.lateness:
+            values = sorted(self.lateness)
+            text += (f"\nТочность срабатывания: p50 {self._percentile(values, 0.5):.1f} с, "
+                     f"p95 {self._percentile(values, 0.95):.1f} с, макс. {values[-1]:.1f} с")
+        return text
+
+
+async def sleep_until(due_ts: float, stats: FiringStats = None, label: str = '',
+                      max_chunk: float = constants.TIMER_MAX_SLEEP) -> float:
+    """
+    Спит до момента due_ts по настенным часам (epoch). Сон идёт короткими
+    отрезками, после каждого остаток пересчитывается по time.time(): после
+    suspend хоста или коррекции часов NTP монотонное время asyncio.sleep
+    расходится с настенным, и один длинный sleep сработал бы не вовремя.
+    Возвращает опоздание в секундах (0 или больше).
+    """
+    while True:
+        wall_before = time.time()
+        left = due_ts - wall_before
+        if left <= 0:
+            return -left
+        chunk = min(left, max_chunk)
+        mono_before = time.monotonic()
+        await asyncio.sleep(chunk)
+        # настенное время ушло дальше монотонного — хост спал или часы перевели
+        jump = (time.time() - wall_before) - (time.monotonic() - mono_before)
+        if abs(jump) > constants.CLOCK_JUMP_THRESHOLD:
+            if stats is not None:
+                stats.clock_jumps += 1
+            logger.warning(f"Скачок настенного времени на {jump:+.0f} с "
+                           f"при ожидании {label or 'напоминания'}")